@@ -0,0 +1,162 @@
+"""
+Analytics Module
+Write-behind pipeline for protocol views and access logs.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.db import close_old_connections
+from .database import DatabaseManager
+from .config import (
+    ANALYTICS_QUEUE_SIZE,
+    ANALYTICS_BATCH_SIZE,
+    ANALYTICS_FLUSH_INTERVAL,
+    ANALYTICS_ENQUEUE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsPipeline:
+    """
+    Buffers analytics writes off the response path.
+
+    Tool calls enqueue events on a bounded in-process queue. A background
+    thread drains it in batches: ProtocolView and AccessLog rows are
+    bulk-created, and view_count deltas are aggregated and applied with
+    F() expressions (DailyUsage is maintained by UsageCounters). When the
+    queue is full, the caller writes its own event synchronously
+    (backpressure) rather than dropping it. Remaining events are flushed
+    on shutdown.
+    """
+
+    PROTOCOL_VIEW = 'protocol_view'
+    ACCESS_LOG = 'access_log'
+
+    def __init__(self, max_queue: int = ANALYTICS_QUEUE_SIZE,
+                 batch_size: int = ANALYTICS_BATCH_SIZE,
+                 flush_interval: float = ANALYTICS_FLUSH_INTERVAL,
+                 enqueue_timeout: float = ANALYTICS_ENQUEUE_TIMEOUT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._registered_atexit = False
+
+    def start(self):
+        """Start the background flusher if it is not running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name='analytics-flusher',
+                daemon=True
+            )
+            self._thread.start()
+            if not self._registered_atexit:
+                atexit.register(self.stop)
+                self._registered_atexit = True
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the flusher and write everything still queued."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def flush(self):
+        """Drain the queue synchronously in the calling thread."""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(events) >= self.batch_size:
+                self._write(events)
+                events = []
+        if events:
+            self._write(events)
+
+    def record_protocol_view(self, user_id: str, protocol_id: str):
+        """Queue a protocol view (ProtocolView row and view_count)."""
+        self._enqueue((self.PROTOCOL_VIEW, {
+            'user_id': str(user_id),
+            'protocol_id': str(protocol_id),
+        }))
+
+    def record_access_log(self, **fields):
+        """Queue an AccessLog row. Takes AccessLog field values (user_id, api_key_id, ...)."""
+        self._enqueue((self.ACCESS_LOG, fields))
+
+    def _enqueue(self, event: tuple):
+        """Queue an event, writing it inline if the queue stays full."""
+        self.start()
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+        except queue.Full:
+            logger.warning("Analytics queue full, writing event synchronously")
+            self._write([event])
+
+    def _run(self):
+        """Flusher loop: write a batch when full or when the interval elapses."""
+        events = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while not self._stop.is_set():
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                events.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+
+            if len(events) >= self.batch_size or time.monotonic() >= deadline:
+                if events:
+                    self._write(events)
+                    events = []
+                deadline = time.monotonic() + self.flush_interval
+
+        if events:
+            self._write(events)
+
+    def _write(self, events: list):
+        """Aggregate a batch of events and write it to the database."""
+        views = []
+        access_logs = []
+        view_counts = {}
+
+        for kind, data in events:
+            if kind == self.ACCESS_LOG:
+                access_logs.append(data)
+                continue
+
+            views.append(data)
+            view_counts[data['protocol_id']] = view_counts.get(data['protocol_id'], 0) + 1
+
+        close_old_connections()
+        try:
+            if views:
+                DatabaseManager.bulk_create_protocol_views(views)
+                DatabaseManager.apply_view_count_deltas(view_counts)
+            if access_logs:
+                DatabaseManager.bulk_create_access_logs(access_logs)
+        except Exception as e:
+            logger.error(
+                f"Failed to write analytics batch ({len(views)} views, "
+                f"{len(access_logs)} access logs): {e}",
+                exc_info=True
+            )
+        finally:
+            close_old_connections()
+
+
+# Global analytics pipeline instance
+analytics = AnalyticsPipeline()
@@ -3,9 +3,21 @@ Authentication Module
 Handles API key validation and user authorization.
 """
 import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional, Tuple
+from django.utils import timezone
 from .database import DatabaseManager
 from .rate_limiter import rate_limiter
+from .cache import cache
+from .breaker import CircuitBreaker
+from .context import RequestContext
+from .policy import tier_policy
+from .config import CACHE_TTL, AUTH_CACHE_MAX_ENTRIES, AUTH_REVOCATION_CHANNEL
+
+logger = logging.getLogger(__name__)
 
 
 class AuthenticationError(Exception):
@@ -23,6 +35,144 @@ class RateLimitError(Exception):
     pass
 
 
+class APIKeyCache:
+    """
+    Bounded in-process cache of key_hash -> (user, api_key).
+    
+    Entries expire after a short TTL. Revocations and user deactivations
+    are broadcast over the cache backend's pub/sub so every node evicts
+    them immediately. Broadcasts missed while the backend was unavailable
+    are covered by clearing the cache when its circuit breaker closes.
+    """
+    
+    # Seconds to wait before retrying a failed pub/sub subscription
+    LISTENER_RETRY_INTERVAL = 30
+    
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES,
+                 ttl: int = CACHE_TTL['api_key']):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listener_retry_at = 0.0
+        if cache.backend.breaker is not None:
+            cache.backend.breaker.add_listener(self._on_breaker_change)
+    
+    def _on_breaker_change(self, old_state: str, state: str):
+        if state == CircuitBreaker.CLOSED:
+            self.clear()
+            self._listener_retry_at = 0.0
+    
+    def get(self, key_hash: str) -> Optional[Tuple[object, object]]:
+        """Get cached (user, api_key) or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None:
+                return None
+            
+            expires_at, user, api_key = entry
+            if expires_at < time.monotonic():
+                del self._entries[key_hash]
+                return None
+            
+            self._entries.move_to_end(key_hash)
+        
+        # The key itself may have expired while cached
+        if api_key.expires_at and api_key.expires_at < timezone.now():
+            self.evict(key_hash)
+            return None
+        
+        return user, api_key
+    
+    def set(self, key_hash: str, user, api_key):
+        """Cache an authenticated (user, api_key) pair."""
+        with self._lock:
+            self._entries[key_hash] = (time.monotonic() + self.ttl, user, api_key)
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def evict(self, key_hash: str):
+        """Evict a single key hash."""
+        with self._lock:
+            self._entries.pop(key_hash, None)
+    
+    def evict_user(self, user_id: str):
+        """Evict every cached key belonging to a user."""
+        with self._lock:
+            stale = [
+                key_hash for key_hash, (_, user, _) in self._entries.items()
+                if str(user.id) == user_id
+            ]
+            for key_hash in stale:
+                del self._entries[key_hash]
+    
+    def clear(self):
+        """Evict all entries."""
+        with self._lock:
+            self._entries.clear()
+    
+    def handle_message(self, message: dict):
+        """
+        Apply a revocation broadcast.
+        
+        Payloads:
+            "<key_hash>"    - a single key was revoked or deactivated
+            "user:<id>"     - a user was deactivated, evict all their keys
+            "*"             - evict everything
+        """
+        data = message.get('data')
+        if isinstance(data, bytes):
+            data = data.decode()
+        if not data:
+            return
+        
+        if data == '*':
+            self.clear()
+        elif data.startswith('user:'):
+            self.evict_user(data[len('user:'):])
+        else:
+            self.evict(data)
+    
+    def ensure_listener(self):
+        """Subscribe to the revocation channel if not already listening."""
+        if self._listener is not None and self._listener.is_alive():
+            return
+        if cache.backend.breaker is not None and cache.backend.breaker.is_open:
+            return
+        
+        now = time.monotonic()
+        if now < self._listener_retry_at:
+            return
+        self._listener_retry_at = now + self.LISTENER_RETRY_INTERVAL
+        
+        try:
+            self._listener = cache.backend.subscribe(AUTH_REVOCATION_CHANNEL, self.handle_message)
+        except Exception as e:
+            # Without the listener, entries still expire after the TTL
+            logger.warning(f"API key revocation listener unavailable: {e}")
+            self._listener = None
+    
+    @staticmethod
+    def publish_revocation(payload: str):
+        """
+        Broadcast a revocation to every node.
+        
+        Args:
+            payload: Key hash, "user:<id>" or "*" (see handle_message)
+        """
+        api_key_cache.handle_message({'data': payload})
+        try:
+            cache.backend.publish(AUTH_REVOCATION_CHANNEL, payload)
+        except Exception as e:
+            logger.error(f"Failed to publish API key revocation: {e}")
+
+
+# Global API key cache instance
+api_key_cache = APIKeyCache()
+
+
 class AuthManager:
     """
     Manages authentication and authorization for MCP server.
@@ -50,11 +200,16 @@ class AuthManager:
         # Hash the API key
         key_hash = AuthManager.hash_api_key(api_key)
         
-        # Get user and API key from database
-        result = DatabaseManager.get_user_by_api_key(key_hash)
-        
+        # Serve from the in-process cache, falling back to the database
+        api_key_cache.ensure_listener()
+        result = api_key_cache.get(key_hash)
         if not result:
-            raise AuthenticationError("Invalid or expired API key")
+            result = DatabaseManager.get_user_by_api_key(key_hash)
+            
+            if not result:
+                raise AuthenticationError("Invalid or expired API key")
+            
+            api_key_cache.set(key_hash, *result)
         
         user, api_key_obj = result
         
@@ -65,30 +220,85 @@ class AuthManager:
         return user, api_key_obj
     
     @staticmethod
-    def check_rate_limit(user, tier: str):
+    def revoke_api_key(key_hash: str):
         """
-        Check rate limit for user.
+        Evict a revoked or deactivated API key on every node.
+        Call after the APIKey row has been updated.
+        """
+        APIKeyCache.publish_revocation(key_hash)
+    
+    @staticmethod
+    def deactivate_user(user_id: str):
+        """
+        Evict all cached API keys of a deactivated user on every node.
+        Call after the User row has been updated.
+        """
+        APIKeyCache.publish_revocation(f"user:{user_id}")
+    
+    @staticmethod
+    def build_context(api_key: str) -> RequestContext:
+        """
+        Authenticate and resolve the subscription for a tool call.
+        
+        Returns:
+            RequestContext shared by the rest of the call
+        
+        Raises:
+            AuthenticationError: If authentication fails
+        """
+        user, api_key_obj = AuthManager.authenticate(api_key)
+        subscription = DatabaseManager.get_user_subscription(user)
+        return RequestContext(user, api_key_obj, subscription)
+    
+    @staticmethod
+    def check_rate_limit(context: RequestContext, cost: int = 1):
+        """
+        Check rate limit for the caller and consume the call's cost.
+        
+        Args:
+            cost: Rate limit units (see RateLimiter.tool_cost)
         
         Raises:
             RateLimitError: If rate limit exceeded
         """
-        allowed, info = rate_limiter.check_rate_limit(str(user.id), tier)
+        allowed, info = rate_limiter.check_rate_limit(context.user_id, context.tier, cost)
         
         if not allowed:
-            error_msg = "Rate limit exceeded. "
-            if info['remaining_minute'] is not None and info['remaining_minute'] <= 0:
-                error_msg += f"Per-minute limit reached. Reset in {info['reset_minute']} seconds. "
-            if info['remaining_day'] is not None and info['remaining_day'] <= 0:
-                error_msg += f"Daily limit reached. Reset in {info['reset_day']} seconds."
+            error_msg = f"Rate limit exceeded (this call costs {cost} units). "
+            if info['remaining_minute'] is not None and info['remaining_minute'] < cost:
+                error_msg += "Per-minute limit reached. "
+            if info['remaining_day'] is not None and info['remaining_day'] < cost:
+                error_msg += "Daily limit reached. "
+            error_msg += f"Retry in {info['retry_after']} seconds."
             
             raise RateLimitError(error_msg)
         
         return info
     
     @staticmethod
-    def authorize_technology_access(user, technology) -> bool:
+    def _authorize_tier(context: RequestContext, technology_name: str,
+                        technology_tier: str):
         """
-        Check if user has access to a technology.
+        Check subscription and technology tier.
+        
+        Raises:
+            AuthorizationError: If user doesn't have access
+        """
+        if not context.has_subscription:
+            raise AuthorizationError(
+                f"No active subscription. Please subscribe to access {technology_name}."
+            )
+        
+        if not tier_policy.can_access(context.tier, technology_tier):
+            raise AuthorizationError(
+                f"Your {context.tier} plan doesn't include access to {technology_name}. "
+                f"Upgrade to {technology_tier} or higher."
+            )
+    
+    @staticmethod
+    def authorize_technology_access(context: RequestContext, technology) -> bool:
+        """
+        Check if the caller has access to a technology.
         
         Returns:
             bool: True if user has access
@@ -96,27 +306,17 @@ class AuthManager:
         Raises:
             AuthorizationError: If user doesn't have access
         """
-        has_access = DatabaseManager.check_user_has_access(user, technology)
-        
-        if not has_access:
-            subscription = DatabaseManager.get_user_subscription(user)
-            if subscription:
-                tier = subscription.plan.tier
-                raise AuthorizationError(
-                    f"Your {tier} plan doesn't include access to {technology.name}. "
-                    f"Upgrade to {technology.tier_required} or higher."
-                )
-            else:
-                raise AuthorizationError(
-                    f"No active subscription. Please subscribe to access {technology.name}."
-                )
-        
+        AuthManager._authorize_tier(context, technology.name, technology.tier_required)
         return True
     
     @staticmethod
-    def authorize_protocol_access(user, protocol) -> bool:
+    def authorize_protocol_access(context: RequestContext, record: dict) -> bool:
         """
-        Check if user has access to a protocol.
+        Check if the caller has access to a protocol.
+        
+        Args:
+            context: Request context
+            record: Cached protocol record (see MCPTools.build_protocol_record)
         
         Returns:
             bool: True if user has access
@@ -124,32 +324,28 @@ class AuthManager:
         Raises:
             AuthorizationError: If user doesn't have access
         """
+        metadata = record['metadata']
+        technology = record['technology']
+        
         # First check technology access
-        AuthManager.authorize_technology_access(user, protocol.technology)
+        AuthManager._authorize_tier(context, technology['name'], technology['tier_required'])
         
         # Then check protocol tier
-        subscription = DatabaseManager.get_user_subscription(user)
-        if not subscription:
-            raise AuthorizationError("No active subscription")
-        
-        tier_hierarchy = {'free': 0, 'starter': 1, 'pro': 2, 'enterprise': 3}
-        user_tier_level = tier_hierarchy.get(subscription.plan.tier, 0)
-        protocol_tier_level = tier_hierarchy.get(protocol.tier_required, 0)
-        
-        if user_tier_level < protocol_tier_level:
+        if not tier_policy.can_access(context.tier, metadata['tier_required']):
             raise AuthorizationError(
-                f"This protocol requires {protocol.tier_required} tier or higher. "
-                f"Your current tier: {subscription.plan.tier}"
+                f"This protocol requires {metadata['tier_required']} tier or higher. "
+                f"Your current tier: {context.tier}"
             )
         
         return True
     
     @staticmethod
-    def get_user_context(user) -> dict:
+    def get_user_context(context: RequestContext) -> dict:
         """
         Get user context including subscription and limits.
         """
-        subscription = DatabaseManager.get_user_subscription(user)
+        user = context.user
+        subscription = context.subscription
         
         if not subscription:
             return {
@@ -0,0 +1,843 @@
+"""
+Backends Module
+Storage backends for the cache and the rate limiter: Redis, or in-process
+memory for single-node deployments, benchmarks and load tests.
+"""
+import fnmatch
+import logging
+import math
+import threading
+import time
+from typing import Callable, Optional
+from .config import CACHE_BACKEND, RATE_LIMIT_BACKEND
+from .connections import Pipeline, redis_connections
+
+logger = logging.getLogger(__name__)
+
+
+# Cache backends
+
+class CacheBackend:
+    """
+    Key-value storage behind CacheManager.
+
+    Keys are strings and values bytes. Tags are sets of keys that expire
+    with their newest member (see CacheManager.invalidate_tag).
+    """
+
+    name = None
+    # CircuitBreaker guarding the backend, if it can fail (see breaker.py)
+    breaker = None
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def get_with_ttl(self, key: str) -> tuple[Optional[bytes], Optional[float]]:
+        """Returns (value, seconds left); seconds left is None without an expiry."""
+        raise NotImplementedError
+
+    def get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        raise NotImplementedError
+
+    def set_many(self, items: dict[str, bytes], ttl: int = None,
+                 tags: dict[str, list[str]] = None):
+        """
+        Store values and add keys to tag sets.
+
+        Args:
+            ttl: Lifetime in seconds, None for no expiry
+            tags: Optional {tag key: [keys]}
+        """
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def delete_pattern(self, pattern: str):
+        """Delete every key matching a glob-style pattern."""
+        raise NotImplementedError
+
+    def pop_tag(self, tag_key: str) -> list[str]:
+        """Atomically read and delete a tag set; returns its members."""
+        raise NotImplementedError
+
+    def acquire_lock(self, key: str, token: str, ttl: float) -> bool:
+        """Set key to token if it does not exist, expiring after ttl seconds."""
+        raise NotImplementedError
+
+    def release_lock(self, key: str, token: str):
+        """Delete key only if it still holds token."""
+        raise NotImplementedError
+
+    def update_counters(self, increments: dict[str, dict[str, int]] = None,
+                        members: dict[str, list[str]] = None,
+                        expire: dict[str, int] = None):
+        """
+        Increment hash fields, add set members and refresh expiries in one
+        round trip (like HINCRBY, SADD and EXPIRE).
+
+        Args:
+            increments: {hash key: {field: amount}}
+            members: {set key: [members]}
+            expire: {key: ttl seconds}
+        """
+        raise NotImplementedError
+
+    def get_counters(self, hash_keys: list[str],
+                     set_keys: list[str]) -> tuple[list[dict[str, int]], list[int]]:
+        """Read counter hashes and set sizes in one round trip ({} / 0 if missing)."""
+        raise NotImplementedError
+
+    def spop(self, key: str, count: int) -> list[str]:
+        """Remove and return up to count members of a set."""
+        raise NotImplementedError
+
+    def publish(self, channel: str, message: str):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+        """
+        Call handler with {'data': message} for every message on a channel.
+        Returns a listener with is_alive() and stop().
+        """
+        raise NotImplementedError
+
+
+def _text(value) -> str:
+    """Decode a reply from the bytes client."""
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class RedisCacheBackend(CacheBackend):
+    """Cache storage in Redis, shared by every node."""
+
+    name = 'redis'
+
+    # Keys per SCAN step and per UNLINK batch
+    SCAN_COUNT = 500
+
+    # Deletes a lock only if we still own it
+    RELEASE_LOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client=None):
+        # The rate limiter shares this connection pool (see connections.py)
+        self.client = client or redis_connections.client()
+        self.breaker = getattr(self.client, 'breaker', None)
+        self._release_lock = self.client.register_script(self.RELEASE_LOCK_SCRIPT)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def get_with_ttl(self, key: str) -> tuple[Optional[bytes], Optional[float]]:
+        with Pipeline(self.client) as pipeline:
+            raw = pipeline.call('get', key)
+            remaining = pipeline.call(
+                'pttl', key, parse=lambda pttl: pttl / 1000 if pttl and pttl > 0 else None
+            )
+        return raw.value, remaining.value
+
+    def get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        return self.client.mget(keys)
+
+    def set_many(self, items: dict[str, bytes], ttl: int = None,
+                 tags: dict[str, list[str]] = None):
+        if len(items) == 1 and not tags:
+            key, raw = next(iter(items.items()))
+            self.client.set(key, raw, ex=ttl or None)
+            return
+
+        pipe = self.client.pipeline(transaction=False)
+        for key, raw in items.items():
+            pipe.set(key, raw, ex=ttl or None)
+        for tag_key, keys in (tags or {}).items():
+            if not keys:
+                continue
+            pipe.sadd(tag_key, *keys)
+            if ttl:
+                pipe.expire(tag_key, ttl)
+        pipe.execute()
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+    def exists(self, key: str) -> bool:
+        return bool(self.client.exists(key))
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*keys)
+
+    def _unlink(self, keys: list):
+        for i in range(0, len(keys), self.SCAN_COUNT):
+            self.client.unlink(*keys[i:i + self.SCAN_COUNT])
+
+    def delete_pattern(self, pattern: str):
+        # Incremental SCAN rather than KEYS, so Redis is never blocked
+        batch = []
+        for key in self.client.scan_iter(match=pattern, count=self.SCAN_COUNT):
+            batch.append(key)
+            if len(batch) >= self.SCAN_COUNT:
+                self._unlink(batch)
+                batch = []
+        if batch:
+            self._unlink(batch)
+
+    def pop_tag(self, tag_key: str) -> list[str]:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.smembers(tag_key)
+        pipe.delete(tag_key)
+        members, _ = pipe.execute()
+        keys = [_text(key) for key in members]
+        self._unlink(keys)
+        return keys
+
+    def acquire_lock(self, key: str, token: str, ttl: float) -> bool:
+        return bool(self.client.set(key, token, nx=True, px=int(ttl * 1000)))
+
+    def release_lock(self, key: str, token: str):
+        self._release_lock(keys=[key], args=[token])
+
+    def update_counters(self, increments: dict[str, dict[str, int]] = None,
+                        members: dict[str, list[str]] = None,
+                        expire: dict[str, int] = None):
+        pipe = self.client.pipeline(transaction=False)
+        for key, fields in (increments or {}).items():
+            for field, amount in fields.items():
+                pipe.hincrby(key, field, amount)
+        for key, values in (members or {}).items():
+            if values:
+                pipe.sadd(key, *values)
+        for key, ttl in (expire or {}).items():
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def get_counters(self, hash_keys: list[str],
+                     set_keys: list[str]) -> tuple[list[dict[str, int]], list[int]]:
+        with Pipeline(self.client) as pipeline:
+            hashes = [
+                pipeline.call('hgetall', key, parse=lambda counters: {
+                    _text(field): int(value) for field, value in counters.items()
+                })
+                for key in hash_keys
+            ]
+            sizes = [pipeline.call('scard', key) for key in set_keys]
+        return [h.value for h in hashes], [size.value for size in sizes]
+
+    def spop(self, key: str, count: int) -> list[str]:
+        return [_text(member) for member in self.client.spop(key, count) or []]
+
+    def publish(self, channel: str, message: str):
+        self.client.publish(channel, message)
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: handler})
+        return pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+
+class _MemoryStore:
+    """
+    Dict of key -> value with per-key expiry, like a single Redis database.
+
+    Expired keys are dropped when read and by a sweep every
+    SWEEP_INTERVAL seconds of writes. Callers hold `lock` around
+    multi-step operations to make them atomic.
+    """
+
+    SWEEP_INTERVAL = 60
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._data = {}
+        self._expires = {}
+        self._swept_at = time.monotonic()
+
+    def get(self, key: str, default=None):
+        with self.lock:
+            expires_at = self._expires.get(key)
+            if expires_at is not None and expires_at <= time.monotonic():
+                self.delete(key)
+            return self._data.get(key, default)
+
+    def ttl(self, key: str) -> Optional[float]:
+        """Seconds left, or None if the key has no expiry or does not exist."""
+        with self.lock:
+            expires_at = self._expires.get(key)
+            if expires_at is None or key not in self._data:
+                return None
+            return max(0.0, expires_at - time.monotonic())
+
+    def set(self, key: str, value, ttl: float = None, keep_ttl: bool = False):
+        with self.lock:
+            self._data[key] = value
+            if ttl:
+                self._expires[key] = time.monotonic() + ttl
+            elif not keep_ttl:
+                self._expires.pop(key, None)
+            self._maybe_sweep()
+
+    def expire(self, key: str, ttl: float, only_extend: bool = False):
+        with self.lock:
+            if key not in self._data:
+                return
+            expires_at = time.monotonic() + ttl
+            current = self._expires.get(key)
+            if only_extend and current is not None and current > expires_at:
+                return
+            self._expires[key] = expires_at
+
+    def delete(self, key: str) -> bool:
+        with self.lock:
+            self._expires.pop(key, None)
+            return self._data.pop(key, None) is not None
+
+    def keys(self) -> list[str]:
+        with self.lock:
+            self._sweep()
+            return list(self._data)
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._swept_at >= self.SWEEP_INTERVAL:
+            self._sweep()
+
+    def _sweep(self):
+        now = time.monotonic()
+        self._swept_at = now
+        for key in [key for key, expires_at in self._expires.items() if expires_at <= now]:
+            self.delete(key)
+
+
+class _MemorySubscription:
+    """Handle returned by MemoryCacheBackend.subscribe()."""
+
+    def __init__(self, backend: 'MemoryCacheBackend', channel: str, handler: Callable[[dict], None]):
+        self._backend = backend
+        self.channel = channel
+        self.handler = handler
+        self._alive = True
+
+    def is_alive(self) -> bool:
+        return self._alive
+
+    def stop(self):
+        self._alive = False
+        self._backend.unsubscribe(self)
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Cache storage in this process only.
+
+    Same semantics as RedisCacheBackend (TTLs, INCR, NX locks, tags,
+    counter hashes and sets); pub/sub messages are delivered to this
+    process's subscribers.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self.store = _MemoryStore()
+        self._subscriptions = []
+        self._subscriptions_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.store.get(key)
+        return value if isinstance(value, bytes) else None
+
+    def get_with_ttl(self, key: str) -> tuple[Optional[bytes], Optional[float]]:
+        with self.store.lock:
+            return self.get(key), self.store.ttl(key)
+
+    def get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        with self.store.lock:
+            return [self.get(key) for key in keys]
+
+    def set_many(self, items: dict[str, bytes], ttl: int = None,
+                 tags: dict[str, list[str]] = None):
+        with self.store.lock:
+            for key, raw in items.items():
+                self.store.set(key, raw, ttl)
+            for tag_key, keys in (tags or {}).items():
+                if not keys:
+                    continue
+                members = self.store.get(tag_key)
+                if not isinstance(members, set):
+                    members = set()
+                members.update(keys)
+                self.store.set(tag_key, members, keep_ttl=True)
+                if ttl:
+                    self.store.expire(tag_key, ttl)
+
+    def incr(self, key: str) -> int:
+        with self.store.lock:
+            value = int(self.store.get(key) or 0) + 1
+            # Stored as digits like Redis, so get() and the codec read it back
+            self.store.set(key, str(value).encode(), keep_ttl=True)
+            return value
+
+    def exists(self, key: str) -> bool:
+        return self.store.get(key) is not None
+
+    def delete(self, *keys: str):
+        with self.store.lock:
+            for key in keys:
+                self.store.delete(key)
+
+    def delete_pattern(self, pattern: str):
+        with self.store.lock:
+            for key in self.store.keys():
+                if fnmatch.fnmatchcase(key, pattern):
+                    self.store.delete(key)
+
+    def pop_tag(self, tag_key: str) -> list[str]:
+        with self.store.lock:
+            members = self.store.get(tag_key)
+            self.store.delete(tag_key)
+            if not isinstance(members, set):
+                return []
+            for key in members:
+                self.store.delete(key)
+            return list(members)
+
+    def acquire_lock(self, key: str, token: str, ttl: float) -> bool:
+        with self.store.lock:
+            if self.store.get(key) is not None:
+                return False
+            self.store.set(key, token.encode(), ttl)
+            return True
+
+    def release_lock(self, key: str, token: str):
+        with self.store.lock:
+            if self.store.get(key) == token.encode():
+                self.store.delete(key)
+
+    def update_counters(self, increments: dict[str, dict[str, int]] = None,
+                        members: dict[str, list[str]] = None,
+                        expire: dict[str, int] = None):
+        with self.store.lock:
+            for key, fields in (increments or {}).items():
+                counters = self.store.get(key)
+                if not isinstance(counters, dict):
+                    counters = {}
+                for field, amount in fields.items():
+                    counters[field] = counters.get(field, 0) + amount
+                self.store.set(key, counters, keep_ttl=True)
+            for key, values in (members or {}).items():
+                if not values:
+                    continue
+                current = self.store.get(key)
+                if not isinstance(current, set):
+                    current = set()
+                current.update(values)
+                self.store.set(key, current, keep_ttl=True)
+            for key, ttl in (expire or {}).items():
+                self.store.expire(key, ttl)
+
+    def get_counters(self, hash_keys: list[str],
+                     set_keys: list[str]) -> tuple[list[dict[str, int]], list[int]]:
+        with self.store.lock:
+            hashes = [self.store.get(key) for key in hash_keys]
+            sets = [self.store.get(key) for key in set_keys]
+            return (
+                [dict(h) if isinstance(h, dict) else {} for h in hashes],
+                [len(s) if isinstance(s, set) else 0 for s in sets]
+            )
+
+    def spop(self, key: str, count: int) -> list[str]:
+        with self.store.lock:
+            members = self.store.get(key)
+            if not isinstance(members, set):
+                return []
+            popped = [members.pop() for _ in range(min(count, len(members)))]
+            if not members:
+                # Like Redis, an empty set does not exist
+                self.store.delete(key)
+            return popped
+
+    def publish(self, channel: str, message: str):
+        with self._subscriptions_lock:
+            handlers = [s.handler for s in self._subscriptions if s.channel == channel]
+        for handler in handlers:
+            try:
+                handler({'type': 'message', 'channel': channel, 'data': message})
+            except Exception as e:
+                logger.error(f"Subscriber to {channel} failed: {e}")
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]) -> _MemorySubscription:
+        subscription = _MemorySubscription(self, channel, handler)
+        with self._subscriptions_lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: _MemorySubscription):
+        with self._subscriptions_lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+
+# Rate limit backends
+
+class RateLimitBackend:
+    """
+    Atomic check-and-consume storage behind RateLimiter.
+
+    A call either consumes `cost` from every window or from none of them.
+    Cost 0 only reports the current state; a negative cost returns unused
+    leased requests.
+    """
+
+    name = None
+    # CircuitBreaker guarding the backend, if it can fail (see breaker.py)
+    breaker = None
+
+    def check_fixed_window(self, minute_key: str, day_key: str,
+                           minute_limit: Optional[int], day_limit: Optional[int],
+                           cost: int, minute_ttl: int, day_ttl: int) -> tuple[bool, int, int]:
+        """
+        Check and consume calendar window counters (limit None = unlimited).
+
+        Returns:
+            (allowed, minute count, day count)
+        """
+        raise NotImplementedError
+
+    def check_gcra(self, key: str, cost: int,
+                   windows: list[tuple[str, int, int]]) -> tuple[bool, int, list[tuple[int, int]]]:
+        """
+        Check and consume GCRA windows.
+
+        Args:
+            windows: [(field, period seconds, limit)]
+
+        Returns:
+            (allowed, retry after ms, [(remaining, reset ms)] per window)
+        """
+        raise NotImplementedError
+
+    def refund(self, fixed_window: list[tuple[str, str, int]],
+               gcra: list[tuple[str, int, list[tuple[str, int, int]]]]):
+        """
+        Return unused leased requests in one batch.
+
+        Args:
+            fixed_window: [(minute key, day key, tokens)]
+            gcra: [(key, tokens, windows)]
+        """
+        raise NotImplementedError
+
+    def get_count(self, key: str) -> int:
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Rate limit state in Redis, shared by every node.
+
+    Each check is one Lua script, so a call costs a single round trip and
+    concurrent calls cannot all pass the check before any of them is counted.
+    """
+
+    name = 'redis'
+
+    # KEYS: minute key, day key
+    # ARGV: minute limit, day limit (-1 = unlimited), cost, minute TTL, day TTL
+    # Returns {allowed, minute count, day count}. Cost 0 only peeks; a
+    # negative cost returns leased requests; a rejected call is not counted.
+    CHECK_AND_CONSUME_SCRIPT = """
+    local minute_limit = tonumber(ARGV[1])
+    local day_limit = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+
+    -- Negative cost returns unused leased requests
+    if cost < 0 then
+        for i = 1, 2 do
+            if redis.call('EXISTS', KEYS[i]) == 1 then
+                local count = redis.call('INCRBY', KEYS[i], cost)
+                if count < 0 then
+                    redis.call('INCRBY', KEYS[i], -count)
+                end
+            end
+        end
+        return {1, 0, 0}
+    end
+
+    local minute_count = tonumber(redis.call('GET', KEYS[1]) or '0')
+    local day_count = tonumber(redis.call('GET', KEYS[2]) or '0')
+
+    local needed = math.max(cost, 1)
+    local allowed = 1
+    if minute_limit >= 0 and minute_count + needed > minute_limit then
+        allowed = 0
+    end
+    if day_limit >= 0 and day_count + needed > day_limit then
+        allowed = 0
+    end
+
+    if allowed == 1 and cost > 0 then
+        minute_count = redis.call('INCRBY', KEYS[1], cost)
+        if minute_count == cost then
+            redis.call('EXPIRE', KEYS[1], ARGV[4])
+        end
+        day_count = redis.call('INCRBY', KEYS[2], cost)
+        if day_count == cost then
+            redis.call('EXPIRE', KEYS[2], ARGV[5])
+        end
+    end
+
+    return {allowed, minute_count, day_count}
+    """
+
+    # KEYS: GCRA state hash
+    # ARGV: cost (negative returns leased requests), then (field, period
+    # seconds, limit) per limited window
+    # Returns {allowed, retry after ms, then remaining and reset ms per window}.
+    # Uses the Redis server clock so all nodes agree (needs Redis >= 5 for
+    # TIME before writes).
+    GCRA_SCRIPT = """
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local cost = tonumber(ARGV[1])
+    local needed = math.max(cost, 1)
+
+    local allowed = 1
+    local retry_after = 0
+    local windows = {}
+    for i = 2, #ARGV, 3 do
+        local period = tonumber(ARGV[i + 1])
+        local interval = period / tonumber(ARGV[i + 2])
+        local tat = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+        if tat < now then
+            tat = now
+        end
+        local allow_at = tat + needed * interval - period
+        if cost >= 0 and allow_at > now then
+            allowed = 0
+            retry_after = math.max(retry_after, allow_at - now)
+        end
+        windows[#windows + 1] = {ARGV[i], period, interval, tat}
+    end
+
+    local consume = allowed == 1 and cost ~= 0
+    local result = {allowed, math.ceil(retry_after * 1000)}
+    local ttl = 0
+    for _, window in ipairs(windows) do
+        local tat = window[4]
+        if consume then
+            tat = math.max(now, tat + cost * window[3])
+            redis.call('HSET', KEYS[1], window[1], string.format('%.6f', tat))
+        end
+        ttl = math.max(ttl, tat - now)
+        result[#result + 1] = math.max(0, math.floor((window[2] - (tat - now)) / window[3] + 0.000001))
+        result[#result + 1] = math.ceil((tat - now) * 1000)
+    end
+    if consume then
+        -- Never shorten the expiry (fields of other windows may need it)
+        local ttl_ms = math.max(math.ceil(ttl * 1000), redis.call('PTTL', KEYS[1]))
+        redis.call('PEXPIRE', KEYS[1], ttl_ms)
+    end
+    return result
+    """
+
+    def __init__(self, client=None):
+        self.client = client or redis_connections.client()
+        self.breaker = getattr(self.client, 'breaker', None)
+        # Loaded lazily and then called with EVALSHA
+        self._check_and_consume = self.client.register_script(self.CHECK_AND_CONSUME_SCRIPT)
+        self._gcra = self.client.register_script(self.GCRA_SCRIPT)
+
+    @staticmethod
+    def _fixed_window_args(minute_limit, day_limit, cost, minute_ttl, day_ttl) -> list:
+        return [
+            -1 if minute_limit is None else minute_limit,
+            -1 if day_limit is None else day_limit,
+            cost,
+            minute_ttl,
+            day_ttl
+        ]
+
+    @staticmethod
+    def _gcra_args(cost: int, windows: list) -> list:
+        args = [cost]
+        for field, period, limit in windows:
+            args.extend([field, period, limit])
+        return args
+
+    def check_fixed_window(self, minute_key, day_key, minute_limit, day_limit,
+                           cost, minute_ttl, day_ttl) -> tuple[bool, int, int]:
+        allowed, minute_count, day_count = self._check_and_consume(
+            keys=[minute_key, day_key],
+            args=self._fixed_window_args(minute_limit, day_limit, cost, minute_ttl, day_ttl)
+        )
+        return bool(allowed), int(minute_count), int(day_count)
+
+    def check_gcra(self, key, cost, windows) -> tuple[bool, int, list[tuple[int, int]]]:
+        result = self._gcra(keys=[key], args=self._gcra_args(cost, windows))
+        return bool(int(result[0])), int(result[1]), [
+            (int(result[2 + 2 * i]), int(result[3 + 2 * i])) for i in range(len(windows))
+        ]
+
+    def refund(self, fixed_window, gcra):
+        pipeline = Pipeline(self.client)
+        for minute_key, day_key, tokens in fixed_window:
+            pipeline.script(
+                self._check_and_consume,
+                [minute_key, day_key],
+                self._fixed_window_args(None, None, -tokens, 60, 1)
+            )
+        for key, tokens, windows in gcra:
+            pipeline.script(self._gcra, [key], self._gcra_args(-tokens, windows))
+        failed = [reply for reply in pipeline.execute() if isinstance(reply, Exception)]
+        if failed:
+            raise failed[0]
+
+    def get_count(self, key: str) -> int:
+        count = self.client.get(key)
+        return int(count) if count else 0
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*keys)
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Rate limit state in this process only.
+
+    Implements the same algorithms as the Redis scripts under one lock, so
+    limits hold across threads but not across processes.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self.store = _MemoryStore()
+
+    def check_fixed_window(self, minute_key, day_key, minute_limit, day_limit,
+                           cost, minute_ttl, day_ttl) -> tuple[bool, int, int]:
+        with self.store.lock:
+            minute_count = self.store.get(minute_key, 0)
+            day_count = self.store.get(day_key, 0)
+
+            if cost < 0:
+                for key, count in ((minute_key, minute_count), (day_key, day_count)):
+                    if self.store.get(key) is not None:
+                        self.store.set(key, max(0, count + cost), keep_ttl=True)
+                return True, 0, 0
+
+            needed = max(cost, 1)
+            allowed = (
+                (minute_limit is None or minute_count + needed <= minute_limit)
+                and (day_limit is None or day_count + needed <= day_limit)
+            )
+            if allowed and cost > 0:
+                minute_count = self._incr(minute_key, minute_count, cost, minute_ttl)
+                day_count = self._incr(day_key, day_count, cost, day_ttl)
+            return allowed, minute_count, day_count
+
+    def _incr(self, key: str, count: int, cost: int, ttl: int) -> int:
+        count += cost
+        if count == cost:
+            self.store.set(key, count, ttl)
+        else:
+            self.store.set(key, count, keep_ttl=True)
+        return count
+
+    def check_gcra(self, key, cost, windows) -> tuple[bool, int, list[tuple[int, int]]]:
+        now = time.time()
+        needed = max(cost, 1)
+        with self.store.lock:
+            state = dict(self.store.get(key) or {})
+
+            allowed = True
+            retry_after = 0.0
+            tats = []
+            for field, period, limit in windows:
+                interval = period / limit
+                tat = max(state.get(field, 0.0), now)
+                allow_at = tat + needed * interval - period
+                if cost >= 0 and allow_at > now:
+                    allowed = False
+                    retry_after = max(retry_after, allow_at - now)
+                tats.append(tat)
+
+            consume = allowed and cost != 0
+            results = []
+            ttl = 0.0
+            for (field, period, limit), tat in zip(windows, tats):
+                interval = period / limit
+                if consume:
+                    tat = max(now, tat + cost * interval)
+                    state[field] = tat
+                ttl = max(ttl, tat - now)
+                results.append((
+                    max(0, math.floor((period - (tat - now)) / interval + 0.000001)),
+                    math.ceil((tat - now) * 1000)
+                ))
+            if consume:
+                # Never shorten the expiry (fields of other windows may need it)
+                self.store.set(key, state, keep_ttl=True)
+                self.store.expire(key, ttl, only_extend=True)
+        return allowed, math.ceil(retry_after * 1000), results
+
+    def refund(self, fixed_window, gcra):
+        for minute_key, day_key, tokens in fixed_window:
+            self.check_fixed_window(minute_key, day_key, None, None, -tokens, 60, 1)
+        for key, tokens, windows in gcra:
+            self.check_gcra(key, -tokens, windows)
+
+    def get_count(self, key: str) -> int:
+        return self.store.get(key, 0)
+
+    def delete(self, *keys: str):
+        with self.store.lock:
+            for key in keys:
+                self.store.delete(key)
+
+
+CACHE_BACKENDS = {
+    'redis': RedisCacheBackend,
+    'memory': MemoryCacheBackend,
+}
+
+RATE_LIMIT_BACKENDS = {
+    'redis': RedisRateLimitBackend,
+    'memory': MemoryRateLimitBackend,
+}
+
+
+def create_cache_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    """
+    Create the configured cache backend.
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    if name not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown cache backend: {name}")
+    return CACHE_BACKENDS[name]()
+
+
+def create_rate_limit_backend(name: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    """
+    Create the configured rate limit backend.
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    if name not in RATE_LIMIT_BACKENDS:
+        raise ValueError(f"Unknown rate limit backend: {name}")
+    return RATE_LIMIT_BACKENDS[name]()
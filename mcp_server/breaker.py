@@ -0,0 +1,200 @@
+"""
+Circuit Breaker Module
+Fails fast while a dependency (Redis) is down instead of waiting on every call.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable
+from .config import REDIS_BREAKER_FAILURE_THRESHOLD, REDIS_BREAKER_RESET_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreakerOpen(Exception):
+    """Raised instead of calling a dependency while its breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker.
+
+    Closed: calls go through; `failure_threshold` consecutive failures of
+    one of `failure_types` open the breaker.
+    Open: calls fail immediately with CircuitBreakerOpen for
+    `reset_timeout` seconds.
+    Half-open: one probe call goes through (others still fail fast); its
+    success closes the breaker, its failure opens it again.
+
+    Other exceptions (e.g. a script error) count as successes: the
+    dependency answered. Exceptions in `rejection_types` (e.g. no pooled
+    connection free in time) mean the call never reached the dependency:
+    they are counted as `overloaded` and neither open nor close the
+    breaker. Listeners are called with the new state on every transition.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = REDIS_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = REDIS_BREAKER_RESET_TIMEOUT,
+                 failure_types: tuple = (Exception,), rejection_types: tuple = ()):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_types = failure_types
+        self.rejection_types = rejection_types
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._listeners = []
+
+        # Metrics
+        self.calls = 0
+        self.failures_total = 0
+        self.rejected_total = 0
+        self.overloaded_total = 0
+        self.opened_total = 0
+        self.last_error = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open, or half-open with a probe in flight)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+            if self._state == self.OPEN:
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            return self._probing
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed (0 if calls go through)."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def add_listener(self, listener: Callable[[str, str], None]):
+        """Call listener(old_state, new_state) on every transition."""
+        self._listeners.append(listener)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call fn through the breaker.
+
+        Raises:
+            CircuitBreakerOpen: If the breaker is open
+            Whatever fn raises
+        """
+        probe = self._before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except self.rejection_types:
+            self._record_rejection(probe)
+            raise
+        except self.failure_types as e:
+            self._record_failure(e, probe)
+            raise
+        except BaseException:
+            self._record_success(probe)
+            raise
+        self._record_success(probe)
+        return result
+
+    def _before_call(self) -> bool:
+        """Admit or reject a call; returns whether it is the half-open probe."""
+        with self._lock:
+            self.calls += 1
+            if self._state == self.CLOSED:
+                return False
+            if (self._state == self.OPEN
+                    and time.monotonic() - self._opened_at >= self.reset_timeout):
+                transition = self._transition_locked(self.HALF_OPEN)
+            elif self._state == self.HALF_OPEN and not self._probing:
+                transition = None
+            else:
+                self.rejected_total += 1
+                raise CircuitBreakerOpen(f"{self.name} circuit breaker is open")
+            self._probing = True
+        self._notify(transition)
+        return True
+
+    def _record_success(self, probe: bool):
+        with self._lock:
+            self._failures = 0
+            transition = None
+            if probe:
+                self._probing = False
+                transition = self._transition_locked(self.CLOSED)
+        self._notify(transition)
+
+    def _record_rejection(self, probe: bool):
+        with self._lock:
+            self.overloaded_total += 1
+            if probe:
+                # Inconclusive: let the next call probe
+                self._probing = False
+
+    def _record_failure(self, error: Exception, probe: bool):
+        with self._lock:
+            self.failures_total += 1
+            self.last_error = str(error)
+            self._failures += 1
+            transition = None
+            if probe:
+                self._probing = False
+            if probe or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                if self._state != self.OPEN:
+                    self.opened_total += 1
+                transition = self._transition_locked(self.OPEN)
+        self._notify(transition)
+
+    def _transition_locked(self, state: str):
+        if state == self._state:
+            return None
+        old_state, self._state = self._state, state
+        return old_state, state
+
+    def _notify(self, transition):
+        if transition is None:
+            return
+        old_state, state = transition
+        if state == self.OPEN:
+            logger.warning(
+                f"{self.name} circuit breaker opened after {self._failures} failures "
+                f"(last error: {self.last_error}); retrying in {self.reset_timeout}s"
+            )
+        elif state == self.CLOSED:
+            logger.warning(f"{self.name} circuit breaker closed, {self.name} is available again")
+        else:
+            logger.info(f"{self.name} circuit breaker half-open, probing")
+        for listener in self._listeners:
+            try:
+                listener(old_state, state)
+            except Exception as e:
+                logger.error(f"{self.name} circuit breaker listener failed: {e}")
+
+    def stats(self) -> dict:
+        """State and counters for metrics."""
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'calls': self.calls,
+                'failures': self.failures_total,
+                'rejected': self.rejected_total,
+                'overloaded': self.overloaded_total,
+                'opened': self.opened_total,
+                'open_for': time.monotonic() - self._opened_at if self._state != self.CLOSED else 0.0,
+                'last_error': self.last_error
+            }
@@ -1,76 +1,782 @@
 """
-Redis Cache Module
+Cache Module
 Handles caching for MCP server to improve performance.
 """
+import fnmatch
+import hashlib
 import json
-import redis
-from typing import Any, Optional
-from .config import REDIS_URL, CACHE_TTL
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from django.db import close_old_connections
+from .config import (
+    CACHE_TTL,
+    CACHE_SOFT_TTL,
+    CACHE_REFRESH_WORKERS,
+    CACHE_L1_MAX_ENTRIES,
+    CACHE_L1_MAX_BYTES,
+    CACHE_L1_MAX_TTL,
+    CACHE_INVALIDATION_CHANNEL,
+    CACHE_FILL_LOCK_ENABLED,
+    CACHE_FILL_LOCK_TTL,
+    CACHE_FILL_WAIT_TIMEOUT,
+    CACHE_FILL_POLL_INTERVAL,
+    CACHE_DEGRADED_L1_TTL,
+)
+from .backends import CacheBackend, create_cache_backend
+from .breaker import CircuitBreaker, CircuitBreakerOpen
+from .codec import codec, CodecError
+from .metrics import metrics
+from .search import search_engine
 
+logger = logging.getLogger(__name__)
 
-class CacheManager:
+
+class LocalCache:
     """
-    Manages Redis caching for MCP server.
+    Bounded in-process LRU cache of decoded values.
+    
+    Bounded by entry count and by the total size of the entries'
+    uncompressed encodings. Entries expire after their namespace TTL. Every eviction
+    bumps a version counter so a value read from the backend concurrently with
+    an invalidation is not put back (see set()).
     """
     
+    def __init__(self, max_entries: int = CACHE_L1_MAX_ENTRIES,
+                 max_bytes: int = CACHE_L1_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> tuple[bool, Any, bool]:
+        """Returns (found, value, stale); stale once past the entry's refresh time."""
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and entry[0] < now:
+                self._remove_locked(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None, False
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            refresh_at = entry[3]
+            return True, entry[2], refresh_at is not None and refresh_at <= now
+    
+    def set(self, key: str, value: Any, size: int, ttl: float, version: int = None,
+            refresh_in: float = None):
+        """
+        Cache a value.
+        
+        Args:
+            size: Size of the value's encoding in bytes
+            ttl: Lifetime in seconds
+            version: self.version read before the value was loaded; the value
+                is dropped if anything was invalidated since
+            refresh_in: Seconds until the value should be refreshed (soft TTL)
+        """
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._remove_locked(key)
+            now = time.monotonic()
+            refresh_at = now + refresh_in if refresh_in is not None else None
+            self._entries[key] = (now + ttl, size, value, refresh_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+    
+    def evict(self, key: str):
+        """Evict a single key."""
+        with self._lock:
+            self.version += 1
+            self._remove_locked(key)
+    
+    def evict_pattern(self, pattern: str):
+        """Evict every key matching a glob-style pattern."""
+        with self._lock:
+            self.version += 1
+            for key in [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]:
+                self._remove_locked(key)
+    
+    def clear(self):
+        """Evict all entries."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._bytes = 0
+    
+    def _remove_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+    
+    def stats(self) -> dict:
+        """Entry count, size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+class _Flight:
+    """A cache fill in progress; other callers for the same key wait on it."""
+    
+    __slots__ = ('done', 'value', 'error')
+    
     def __init__(self):
-        """Initialize Redis connection."""
-        self.redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CacheManager:
+    """
+    Manages caching for MCP server.
+    
+    Shared (L2) storage is a CacheBackend: Redis, or process memory with
+    CACHE_BACKEND=memory (see backends.py).
+    
+    Reads go through an in-process L1 cache (LocalCache) first for the
+    namespaces in L1_NAMESPACES, so hot keys such as technologies:all and
+    steering:<slug> rarely leave the process. Deletes are broadcast over
+    the backend's pub/sub so every node evicts its L1 copy. Values returned
+    from the cache are shared and must be treated as read-only.
+    
+    Values are stored as codec-encoded bytes (binary body, compressed
+    above a size threshold); see codec.py.
+    
+    Degraded mode: when the backend fails, or its circuit breaker is open,
+    the cache is L1-only. Reads are served from L1, and values written in
+    that time are kept in L1 for at most CACHE_DEGRADED_L1_TTL, because
+    invalidations from other nodes cannot arrive. L1 is cleared when the
+    breaker closes again. Backend errors never propagate to callers.
+    """
+    
+    # Key prefix -> CACHE_TTL entry for keys that are also cached in-process.
+    # Search generations and results are never cached in-process: generations are
+    # bumped with INCR and must be read fresh.
+    L1_NAMESPACES = {
+        'protocol': 'protocol',
+        'protocol_slug': 'protocol',
+        'protocol_summary': 'protocol',
+        'steering': 'steering_rules',
+        'user': 'user_info',
+        'technologies': 'technology_list',
+    }
+    
+    # Seconds to wait before retrying a failed pub/sub subscription
+    LISTENER_RETRY_INTERVAL = 30
+    
+    def __init__(self, backend: CacheBackend = None):
+        """Initialize the storage backend (CACHE_BACKEND unless given)."""
+        self.backend = backend or create_cache_backend()
+        self.local = LocalCache()
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self._listener = None
+        self._listener_retry_at = 0.0
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_executor = None
+        self.backend_errors = 0
+        if self.backend.breaker is not None:
+            self.backend.breaker.add_listener(self._on_breaker_change)
+    
+    # In-process (L1) cache
+    
+    def _namespace(self, key: str) -> Optional[str]:
+        """CACHE_TTL entry for a key cached in-process, or None."""
+        return self.L1_NAMESPACES.get(key.split(':', 1)[0])
+    
+    def _l1_ttl(self, key: str) -> Optional[int]:
+        """L1 lifetime for a key, or None if its namespace is not cached in-process."""
+        namespace = self._namespace(key)
+        if namespace is None:
+            return None
+        return min(CACHE_TTL[namespace], CACHE_L1_MAX_TTL)
+    
+    def handle_invalidation(self, message: dict):
+        """
+        Apply an invalidation broadcast.
+        
+        Payloads:
+            "key:<key>"         - evict one key
+            "pattern:<glob>"    - evict keys matching a pattern
+            "keys:<json list>"  - evict several keys (e.g. an invalidated tag)
+            "protocol:<id>"     - evict a protocol's keys and re-index it for search
+            "*"                 - evict everything
+        """
+        data = message.get('data')
+        if isinstance(data, bytes):
+            data = data.decode()
+        if not data:
+            return
+        
+        if data == '*':
+            self.local.clear()
+        elif data.startswith('keys:'):
+            for key in json.loads(data[len('keys:'):]):
+                self.local.evict(key)
+        elif data.startswith('pattern:'):
+            self.local.evict_pattern(data[len('pattern:'):])
+        elif data.startswith('key:'):
+            self.local.evict(data[len('key:'):])
+        elif data.startswith('protocol:'):
+            self._apply_protocol_invalidation(data[len('protocol:'):])
+    
+    def _apply_protocol_invalidation(self, protocol_id: str):
+        """Evict a protocol's L1 entries and refresh it in the BM25 index (if built)."""
+        for key in self._protocol_keys(protocol_id):
+            self.local.evict(key)
+        try:
+            search_engine.upsert_protocol(protocol_id)
+        except Exception as e:
+            logger.error(f"Failed to re-index protocol {protocol_id}: {e}")
+    
+    def ensure_listener(self):
+        """Subscribe to the invalidation channel if not already listening."""
+        if self._listener is not None and self._listener.is_alive():
+            return
+        if self.backend.breaker is not None and self.backend.breaker.is_open:
+            return
+        
+        now = time.monotonic()
+        if now < self._listener_retry_at:
+            return
+        self._listener_retry_at = now + self.LISTENER_RETRY_INTERVAL
+        
+        try:
+            self._listener = self.backend.subscribe(
+                CACHE_INVALIDATION_CHANNEL, self.handle_invalidation
+            )
+        except Exception as e:
+            # Without the listener, L1 entries still expire after CACHE_L1_MAX_TTL
+            logger.warning(f"Cache invalidation listener unavailable: {e}")
+            self._listener = None
+    
+    def publish_invalidation(self, payload: str):
+        """
+        Evict locally and broadcast to every node.
+        
+        Args:
+            payload: See handle_invalidation
+        """
+        self.handle_invalidation({'data': payload})
+        try:
+            self.backend.publish(CACHE_INVALIDATION_CHANNEL, payload)
+        except Exception as e:
+            self._backend_error('publish invalidation', e)
+    
+    def stats(self) -> dict:
+        """L1 and backend (L2) hit/miss counters, and the backend's breaker state."""
+        breaker = self.backend.breaker
+        return {
+            'l1': self.local.stats(),
+            'l2': {
+                'backend': self.backend.name,
+                'hits': self.l2_hits,
+                'misses': self.l2_misses,
+                'errors': self.backend_errors
+            },
+            'breaker': breaker.stats() if breaker is not None else None
+        }
+    
+    # Degraded mode
+    
+    def _backend_error(self, operation: str, error: Exception):
+        """Count and log a failed backend call (calls rejected by an open breaker are expected)."""
+        self.backend_errors += 1
+        if isinstance(error, CircuitBreakerOpen):
+            logger.debug(f"Cache {operation} skipped: {error}")
+        else:
+            logger.error(f"Cache {operation} error: {error}")
+    
+    def _on_breaker_change(self, old_state: str, state: str):
+        """Drop L1 once the backend is back: invalidations sent meanwhile were lost."""
+        if state == CircuitBreaker.CLOSED:
+            self.local.clear()
+            self._listener_retry_at = 0.0
+    
+    # Shared (L2) cache
+    
+    @staticmethod
+    def _decode(raw: bytes) -> Optional[Any]:
+        """Decode a stored value; undecodable values are treated as misses."""
+        try:
+            return codec.decode(raw)
+        except CodecError as e:
+            logger.warning(f"Discarding undecodable cache value: {e}")
+            return None
     
     def get(self, key: str) -> Optional[Any]:
         """
         Get value from cache.
         Returns None if key doesn't exist.
         """
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl is not None:
+            self.ensure_listener()
+            found, value, _ = self.local.get(key)
+            if found:
+                return value
+            version = self.local.version
+        
         try:
-            value = self.redis_client.get(key)
-            if value:
-                return json.loads(value)
-            return None
+            raw = self.backend.get(key)
+            value = self._decode(raw) if raw else None
+            if value is None:
+                self.l2_misses += 1
+                return None
+            
+            self.l2_hits += 1
+            if l1_ttl is not None:
+                self.local.set(key, value, codec.size(raw), l1_ttl, version)
+            return value
         except Exception as e:
             # Log error but don't fail
-            print(f"Cache get error: {e}")
+            self._backend_error('get', e)
             return None
     
-    def set(self, key: str, value: Any, ttl: int = None):
+    def set(self, key: str, value: Any, ttl: int = None, tags: list[str] = None):
         """
         Set value in cache with optional TTL.
+        Tagged keys are deleted together by invalidate_tag().
         """
+        serialized = codec.encode(value)
+        l1_ttl = self._l1_ttl(key)
+        grace = self._grace(key)
+        refresh_in = max(0, ttl - grace) if ttl and grace is not None else None
         try:
-            serialized = json.dumps(value)
-            if ttl:
-                self.redis_client.setex(key, ttl, serialized)
-            else:
-                self.redis_client.set(key, serialized)
+            self.backend.set_many(
+                {key: serialized}, ttl, self._tag_keys({tag: [key] for tag in tags or ()})
+            )
         except Exception as e:
-            # Log error but don't fail
-            print(f"Cache set error: {e}")
+            # Log error but don't fail; keep the value in L1 for a short time
+            self._backend_error('set', e)
+            if l1_ttl is not None:
+                l1_ttl = min(l1_ttl, CACHE_DEGRADED_L1_TTL)
+                refresh_in = None
+        
+        if l1_ttl is not None:
+            self.local.set(key, value, codec.size(serialized), l1_ttl, refresh_in=refresh_in)
+    
+    def get_many(self, keys: list[str]) -> list[Optional[Any]]:
+        """
+        Get several values in one round trip.
+        Keys cached in-process are served locally; missing keys come back as None.
+        """
+        if not keys:
+            return []
+        
+        values = [None] * len(keys)
+        remote = []
+        for i, key in enumerate(keys):
+            if self._l1_ttl(key) is not None:
+                self.ensure_listener()
+                found, value, _ = self.local.get(key)
+                if found:
+                    values[i] = value
+                    continue
+            remote.append(i)
+        if not remote:
+            return values
+        
+        version = self.local.version
+        try:
+            raws = self.backend.get_many([keys[i] for i in remote])
+        except Exception as e:
+            self._backend_error('get many', e)
+            return values
+        
+        for i, raw in zip(remote, raws):
+            value = self._decode(raw) if raw else None
+            if value is None:
+                self.l2_misses += 1
+                continue
+            self.l2_hits += 1
+            values[i] = value
+            l1_ttl = self._l1_ttl(keys[i])
+            if l1_ttl is not None:
+                self.local.set(keys[i], value, codec.size(raw), l1_ttl, version)
+        return values
+    
+    def set_many(self, values: dict[str, Any], ttl: int = None,
+                 tags: dict[str, list[str]] = None):
+        """
+        Set several values in one round trip.
+        
+        Args:
+            tags: Optional {tag: [keys]} to register with invalidate_tag()
+        """
+        if not values:
+            return
+        serialized = {key: codec.encode(value) for key, value in values.items()}
+        degraded = False
+        try:
+            self.backend.set_many(serialized, ttl, self._tag_keys(tags or {}))
+        except Exception as e:
+            self._backend_error('set many', e)
+            degraded = True
+        
+        for key, raw in serialized.items():
+            l1_ttl = self._l1_ttl(key)
+            if l1_ttl is not None:
+                if degraded:
+                    l1_ttl = min(l1_ttl, CACHE_DEGRADED_L1_TTL)
+                self.local.set(key, values[key], codec.size(raw), l1_ttl)
+    
+    # Single-flight fills
+    
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: int = None,
+                    tags: list[str] = None, store: Callable[[Any], None] = None) -> Optional[Any]:
+        """
+        Get a value, running `loader` on a miss.
+        
+        Only one caller per key and process runs the loader; concurrent
+        callers wait for its result. With CACHE_FILL_LOCK_ENABLED, the
+        loading process also holds a short backend lock so other processes
+        poll for the stored value instead of loading it too. A None result
+        is returned but not cached.
+        
+        For namespaces in CACHE_SOFT_TTL, an entry past its soft TTL is
+        returned as is and refreshed in the background (once per key). If
+        the refresh loads None (e.g. the protocol was deactivated), the
+        entry is deleted from the backend and every node's L1.
+        
+        Args:
+            loader: Loads the value (e.g. from the database)
+            ttl, tags: Passed to set()
+            store: Caches the loaded value instead of set(key, value, ttl, tags)
+        
+        Raises:
+            Whatever the loader raises
+        """
+        store = store or (lambda value: self.set(key, value, ttl, tags))
+        
+        value, stale = self._lookup(key)
+        if value is not None:
+            if stale:
+                self._schedule_refresh(key, loader, store)
+            return value
+        
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        
+        if not leader:
+            if not flight.done.wait(CACHE_FILL_WAIT_TIMEOUT):
+                # The fill is taking too long; don't queue behind it
+                return loader()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        
+        try:
+            flight.value = self._fill(key, loader, store)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+    
+    def _grace(self, key: str) -> Optional[int]:
+        """Seconds between the soft and hard TTL of a key's namespace, if it has one."""
+        namespace = self._namespace(key)
+        if namespace not in CACHE_SOFT_TTL:
+            return None
+        return max(0, CACHE_TTL[namespace] - CACHE_SOFT_TTL[namespace])
+    
+    def _lookup(self, key: str) -> tuple[Optional[Any], bool]:
+        """Get (value, stale) from L1, then the backend."""
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl is not None:
+            self.ensure_listener()
+            found, value, stale = self.local.get(key)
+            if found:
+                return value, stale
+        return self._fetch(key)
+    
+    def _fetch(self, key: str) -> tuple[Optional[Any], bool]:
+        """
+        Get (value, stale) from the backend, bypassing L1.
+        Staleness comes from the remaining TTL: an entry is stale once less
+        than the namespace's grace period (hard - soft TTL) is left.
+        """
+        version = self.local.version
+        try:
+            raw, remaining = self.backend.get_with_ttl(key)
+        except Exception as e:
+            self._backend_error('get', e)
+            return None, False
+        
+        value = self._decode(raw) if raw else None
+        if value is None:
+            self.l2_misses += 1
+            return None, False
+        self.l2_hits += 1
+        
+        grace = self._grace(key)
+        stale = grace is not None and remaining is not None and remaining < grace
+        
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl is not None:
+            refresh_in = None
+            if grace is not None and remaining is not None:
+                refresh_in = max(0.0, remaining - grace)
+            if remaining is not None:
+                # Never keep a copy past the shared entry's hard expiry
+                l1_ttl = min(l1_ttl, remaining)
+            self.local.set(key, value, codec.size(raw), l1_ttl, version, refresh_in)
+        return value, stale
+    
+    def _schedule_refresh(self, key: str, loader: Callable[[], Any], store: Callable[[Any], None]):
+        """Refresh a stale entry in the background, at most once at a time per key."""
+        with self._flights_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(
+                    max_workers=CACHE_REFRESH_WORKERS,
+                    thread_name_prefix='cache-refresh'
+                )
+        try:
+            self._refresh_executor.submit(self._refresh, key, loader, store)
+        except RuntimeError:
+            # Executor shut down (interpreter exit)
+            with self._flights_lock:
+                self._refreshing.discard(key)
+    
+    def _refresh(self, key: str, loader: Callable[[], Any], store: Callable[[Any], None]):
+        try:
+            close_old_connections()
+            
+            # Another node may have refreshed it already
+            value, stale = self._fetch(key)
+            if value is not None and not stale:
+                return
+            
+            if not CACHE_FILL_LOCK_ENABLED:
+                self._reload(key, loader, store)
+                return
+            
+            lock_key = f"lock:fill:{key}"
+            token = self._acquire_fill_lock(lock_key)
+            if token is None:
+                # Someone else is loading it
+                return
+            try:
+                self._reload(key, loader, store)
+            finally:
+                self._release_fill_lock(lock_key, token)
+        except Exception as e:
+            logger.error(f"Background refresh of {key} failed: {e}")
+        finally:
+            with self._flights_lock:
+                self._refreshing.discard(key)
+            close_old_connections()
+    
+    def _reload(self, key: str, loader: Callable[[], Any], store: Callable[[Any], None]):
+        """Reload a stale entry, evicting it everywhere if it no longer exists."""
+        if self._load_and_store(loader, store) is None:
+            self.delete(key)
+    
+    def _fill(self, key: str, loader: Callable[[], Any], store: Callable[[Any], None]) -> Optional[Any]:
+        """Load and store a value, coordinating with other processes if enabled."""
+        if not CACHE_FILL_LOCK_ENABLED:
+            return self._load_and_store(loader, store)
+        
+        lock_key = f"lock:fill:{key}"
+        try:
+            token = self._acquire_fill_lock(lock_key)
+        except Exception as e:
+            self._backend_error('fill lock', e)
+            return self._load_and_store(loader, store)
+        
+        if token is None:
+            # Another process is loading: wait for its value, or for the lock to go away
+            deadline = time.monotonic() + CACHE_FILL_WAIT_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(CACHE_FILL_POLL_INTERVAL)
+                value = self.get(key)
+                if value is not None:
+                    return value
+                try:
+                    if not self.backend.exists(lock_key):
+                        break
+                except Exception:
+                    break
+            return self._load_and_store(loader, store)
+        
+        try:
+            return self._load_and_store(loader, store)
+        finally:
+            self._release_fill_lock(lock_key, token)
+    
+    def _acquire_fill_lock(self, lock_key: str) -> Optional[str]:
+        """Take a fill lock; returns the owner token, or None if it is held."""
+        token = uuid.uuid4().hex
+        acquired = self.backend.acquire_lock(lock_key, token, CACHE_FILL_LOCK_TTL)
+        return token if acquired else None
+    
+    def _release_fill_lock(self, lock_key: str, token: str):
+        try:
+            self.backend.release_lock(lock_key, token)
+        except Exception as e:
+            # The lock expires on its own
+            self._backend_error('fill unlock', e)
+    
+    @staticmethod
+    def _load_and_store(loader: Callable[[], Any], store: Callable[[Any], None]) -> Optional[Any]:
+        value = loader()
+        if value is not None:
+            store(value)
+        return value
+    
+    def incr(self, key: str):
+        """Increment a counter key."""
+        try:
+            self.backend.incr(key)
+        except Exception as e:
+            self._backend_error('incr', e)
     
     def delete(self, key: str):
-        """Delete key from cache."""
+        """Delete key from cache (and from every node's L1 cache)."""
         try:
-            self.redis_client.delete(key)
+            self.backend.delete(key)
         except Exception as e:
-            print(f"Cache delete error: {e}")
+            self._backend_error('delete', e)
+        if self._l1_ttl(key) is not None:
+            self.publish_invalidation(f"key:{key}")
     
     def clear_pattern(self, pattern: str):
-        """Delete all keys matching pattern."""
+        """
+        Delete all keys matching pattern.
+        Walks the whole keyspace; prefer invalidate_tag() or generation
+        counters on the request path.
+        """
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                self.redis_client.delete(*keys)
+            self.backend.delete_pattern(pattern)
         except Exception as e:
-            print(f"Cache clear pattern error: {e}")
+            self._backend_error('clear pattern', e)
+        self.publish_invalidation(f"pattern:{pattern}")
+    
+    # Tags
+    
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"tag:{tag}"
+    
+    @staticmethod
+    def technology_tag(technology_slug: str) -> str:
+        """Tag for every cached key derived from a technology's protocols."""
+        return f"tech:{technology_slug}"
+    
+    def _tag_keys(self, tags: dict[str, list[str]]) -> dict[str, list[str]]:
+        """
+        Map {tag: [keys]} to tag set keys. Tag sets live as long as their
+        newest member, so they expire once every member has.
+        """
+        return {self._tag_key(tag): keys for tag, keys in tags.items() if keys}
+    
+    def invalidate_tag(self, tag: str):
+        """Delete every key registered under a tag, in O(members)."""
+        try:
+            keys = self.backend.pop_tag(self._tag_key(tag))
+        except Exception as e:
+            self._backend_error('invalidate tag', e)
+            keys = []
+        
+        # A single broadcast rather than one per key
+        local_keys = [key for key in keys if self._l1_ttl(key) is not None]
+        if local_keys:
+            self.publish_invalidation("keys:" + json.dumps(local_keys))
     
     # Convenience methods for specific cache types
     
     def get_protocol(self, protocol_id: str) -> Optional[dict]:
-        """Get cached protocol."""
-        return self.get(f"protocol:{protocol_id}")
+        """
+        Get cached protocol record (content, metadata and technology).
+        Entries written before technology metadata was cached are ignored.
+        """
+        record = self.get(f"protocol:{protocol_id}")
+        if record and 'technology' not in record:
+            return None
+        return record
     
     def set_protocol(self, protocol_id: str, protocol_data: dict):
         """Cache protocol."""
-        self.set(f"protocol:{protocol_id}", protocol_data, CACHE_TTL['protocol'])
+        self.set(
+            f"protocol:{protocol_id}",
+            protocol_data,
+            CACHE_TTL['protocol'],
+            tags=[self.technology_tag(protocol_data['technology']['slug'])]
+        )
+    
+    def load_protocol(self, protocol_id: str, loader: Callable[[], Optional[dict]]) -> Optional[dict]:
+        """Get a protocol record, loading it once on a miss (see get_or_load)."""
+        record = self.get_or_load(
+            f"protocol:{protocol_id}",
+            loader,
+            store=lambda record: self.set_protocol(protocol_id, record)
+        )
+        if record and 'technology' not in record:
+            # Entry written before technology metadata was cached
+            record = loader()
+            if record:
+                self.set_protocol(protocol_id, record)
+        return record
+    
+    def get_protocol_id(self, technology_slug: str, protocol_slug: str) -> Optional[str]:
+        """Resolve a protocol ID from the cached slug index."""
+        return self.get(f"protocol_slug:{technology_slug}:{protocol_slug}")
+    
+    def load_protocol_id(self, technology_slug: str, protocol_slug: str,
+                         loader: Callable[[], Optional[str]]) -> Optional[str]:
+        """Resolve a protocol ID, loading it once on a miss (see get_or_load)."""
+        return self.get_or_load(
+            f"protocol_slug:{technology_slug}:{protocol_slug}",
+            loader,
+            store=lambda protocol_id: self.set_protocol_id(technology_slug, protocol_slug, protocol_id)
+        )
+    
+    def set_protocol_id(self, technology_slug: str, protocol_slug: str, protocol_id: str):
+        """Cache a slug -> protocol ID mapping."""
+        self.set(
+            f"protocol_slug:{technology_slug}:{protocol_slug}",
+            protocol_id,
+            CACHE_TTL['protocol'],
+            tags=[self.technology_tag(technology_slug)]
+        )
     
     def get_steering_rules(self, technology_slug: str) -> Optional[list]:
         """Get cached steering rules."""
@@ -80,6 +786,12 @@ class CacheManager:
         """Cache steering rules."""
         self.set(f"steering:{technology_slug}", rules, CACHE_TTL['steering_rules'])
     
+    def load_steering_rules(self, technology_slug: str, loader: Callable[[], list]) -> list:
+        """Get steering rules, loading them once on a miss (see get_or_load)."""
+        return self.get_or_load(
+            f"steering:{technology_slug}", loader, CACHE_TTL['steering_rules']
+        )
+    
     def get_user_info(self, user_id: str) -> Optional[dict]:
         """Get cached user info."""
         return self.get(f"user:{user_id}")
@@ -96,15 +808,109 @@ class CacheManager:
         """Cache technology list."""
         self.set("technologies:all", technologies, CACHE_TTL['technology_list'])
     
+    def load_technologies(self, loader: Callable[[], list]) -> list:
+        """Get the technology list, loading it once on a miss (see get_or_load)."""
+        return self.get_or_load("technologies:all", loader, CACHE_TTL['technology_list'])
+    
+    def get_protocol_summaries(self, protocol_ids: list[str]) -> dict[str, dict]:
+        """Get cached protocol summaries (listing/search fields) by ID."""
+        keys = [f"protocol_summary:{protocol_id}" for protocol_id in protocol_ids]
+        return {
+            protocol_id: summary
+            for protocol_id, summary in zip(protocol_ids, self.get_many(keys))
+            if summary is not None
+        }
+    
+    def set_protocol_summaries(self, summaries: dict[str, dict]):
+        """Cache protocol summaries keyed by ID."""
+        values = {}
+        tags = {}
+        for protocol_id, summary in summaries.items():
+            key = f"protocol_summary:{protocol_id}"
+            values[key] = summary
+            tags.setdefault(self.technology_tag(summary['technology']['slug']), []).append(key)
+        self.set_many(values, CACHE_TTL['protocol'], tags=tags)
+    
+    # Search results
+    
+    @staticmethod
+    def normalize_search_query(query: str) -> str:
+        """
+        Normalize a query for cache keys.
+        Only case and whitespace are ignored: stopwords and stemming differ
+        between the search backends, so anything more could give queries
+        with different results the same key.
+        """
+        return ' '.join((query or '').casefold().split())
+    
+    @staticmethod
+    def _search_generation_key(technology_slug: str = None) -> str:
+        """Generation counter for a technology, or for unfiltered searches."""
+        return f"search:gen:{technology_slug}" if technology_slug else "search:gen"
+    
+    @staticmethod
+    def _search_key(query: str, tier: str, technology_slug: str = None) -> Optional[str]:
+        """Result key for a normalized query, tier and technology filter (None if blank)."""
+        normalized = CacheManager.normalize_search_query(query)
+        if not normalized:
+            return None
+        digest = hashlib.sha1(normalized.encode()).hexdigest()
+        return f"search:{tier}:{technology_slug or '*'}:{digest}"
+    
+    def get_search_results(self, query: str, tier: str,
+                           technology_slug: str = None) -> Optional[list]:
+        """
+        Get cached ranked search hits as [[protocol_id, score], ...].
+        Entries from an older generation (see invalidate_technology) are misses,
+        and blank queries are never cached.
+        """
+        key = self._search_key(query, tier, technology_slug)
+        if key is None:
+            return None
+        generation, entry = self.get_many([self._search_generation_key(technology_slug), key])
+        if not entry or entry.get('generation') != (generation or 0):
+            return None
+        return entry['hits']
+    
+    def get_search_generation(self, technology_slug: str = None) -> int:
+        """Current search generation; read it before ranking and pass to set_search_results."""
+        return self.get(self._search_generation_key(technology_slug)) or 0
+    
+    def set_search_results(self, query: str, tier: str, technology_slug: str,
+                           hits: list, generation: int):
+        """Cache ranked search hits (IDs and scores only)."""
+        key = self._search_key(query, tier, technology_slug)
+        if key is None:
+            return
+        self.set(key, {'generation': generation, 'hits': hits}, CACHE_TTL['search'])
+    
+    @staticmethod
+    def _protocol_keys(protocol_id: str) -> list[str]:
+        return [f"protocol:{protocol_id}", f"protocol_summary:{protocol_id}"]
+    
     def invalidate_protocol(self, protocol_id: str):
-        """Invalidate protocol cache."""
-        self.delete(f"protocol:{protocol_id}")
+        """Invalidate protocol cache and re-index the protocol on every node."""
+        try:
+            self.backend.delete(*self._protocol_keys(protocol_id))
+        except Exception as e:
+            self._backend_error('delete', e)
+        self.publish_invalidation(f"protocol:{protocol_id}")
     
     def invalidate_technology(self, technology_slug: str):
-        """Invalidate all caches for a technology."""
+        """
+        Invalidate all caches for a technology: its steering rules, the
+        technology list, every protocol record, slug mapping and summary
+        tagged with it, and (by generation) its search results.
+        """
         self.delete(f"steering:{technology_slug}")
-        self.clear_pattern(f"protocol:*:{technology_slug}:*")
+        self.delete("technologies:all")
+        self.invalidate_tag(self.technology_tag(technology_slug))
+        
+        # Stale search results for this technology and unfiltered searches
+        self.incr(self._search_generation_key(technology_slug))
+        self.incr(self._search_generation_key())
 
 
 # Global cache instance
 cache = CacheManager()
+metrics.register('cache', cache.stats)
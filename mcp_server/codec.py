@@ -0,0 +1,235 @@
+"""
+Cache Codec Module
+Binary encoding and compression for values stored in Redis.
+"""
+import json
+import logging
+import struct
+import zlib
+from pathlib import Path
+from typing import Any
+from .config import (
+    CACHE_CODEC_FORMAT,
+    CACHE_COMPRESSION,
+    CACHE_COMPRESSION_THRESHOLD,
+    CACHE_COMPRESSION_LEVEL,
+    CACHE_ZSTD_DICT_PATH,
+)
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+class CodecError(Exception):
+    """Raised when a cached value cannot be decoded."""
+    pass
+
+
+class Codec:
+    """
+    Encodes cache values as a small versioned header plus a body.
+
+    Header (big-endian): magic byte, header version, flags, and the
+    uncompressed body length. The flags select the body format (JSON or
+    MessagePack) and compression (none, zlib, zstd, or zstd with the shared
+    dictionary). Bodies below `threshold` bytes are stored uncompressed.
+
+    Values without the magic byte are legacy JSON text written before the
+    codec existed and are decoded as such, so old entries stay readable
+    during a rollout. 0xC1 cannot start a JSON document (or valid UTF-8).
+
+    msgpack and zstandard are optional (`pip install vizpilot-mcp[cache]`).
+    Without them the codec falls back to JSON and zlib, and logs the
+    fallback once, on the first encode.
+    """
+
+    MAGIC = 0xC1
+    VERSION = 1
+    HEADER = struct.Struct('>BBBI')
+
+    # Body formats (low nibble of flags)
+    FORMAT_JSON = 0
+    FORMAT_MSGPACK = 1
+
+    # Compression (high nibble of flags)
+    COMPRESSION_NONE = 0
+    COMPRESSION_ZLIB = 1
+    COMPRESSION_ZSTD = 2
+    COMPRESSION_ZSTD_DICT = 3
+
+    def __init__(self, body_format: str = CACHE_CODEC_FORMAT,
+                 compression: str = CACHE_COMPRESSION,
+                 threshold: int = CACHE_COMPRESSION_THRESHOLD,
+                 level: int = CACHE_COMPRESSION_LEVEL,
+                 dictionary_path: str = CACHE_ZSTD_DICT_PATH):
+        # Logged on first use: the global codec is created at import,
+        # before the server has configured logging
+        self._fallbacks = []
+        if body_format == 'msgpack' and msgpack is None:
+            self._fallbacks.append(
+                "msgpack is not installed, encoding cache values as JSON"
+            )
+            body_format = 'json'
+        if compression == 'zstd' and zstandard is None:
+            self._fallbacks.append(
+                "zstandard is not installed, compressing cache values "
+                "with zlib"
+            )
+            compression = 'zlib'
+
+        if body_format == 'msgpack':
+            self.format = self.FORMAT_MSGPACK
+        else:
+            self.format = self.FORMAT_JSON
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+
+        self._dictionary = None
+        if compression == 'zstd' and dictionary_path:
+            self._dictionary = self.load_dictionary(dictionary_path)
+            if self._dictionary is not None:
+                self._dictionary.precompute_compress(level=level)
+
+    @staticmethod
+    def load_dictionary(path: str):
+        """Load a trained zstd dictionary, or None if it is missing."""
+        if zstandard is None:
+            return None
+        try:
+            return zstandard.ZstdCompressionDict(Path(path).read_bytes())
+        except OSError as e:
+            logger.warning(
+                f"zstd dictionary unavailable, compressing without it: {e}"
+            )
+            return None
+
+    @staticmethod
+    def train_dictionary(samples: list[bytes], size: int = 112640) -> bytes:
+        """
+        Train a zstd dictionary from sample bodies (e.g. protocol markdown).
+        Write the result to CACHE_ZSTD_DICT_PATH on every node.
+        """
+        if zstandard is None:
+            raise ImportError("Training a dictionary requires zstandard")
+        return zstandard.train_dictionary(size, samples).as_bytes()
+
+    # Encoding
+
+    def _dump_body(self, value: Any) -> bytes:
+        if self.format == self.FORMAT_MSGPACK:
+            return msgpack.packb(value, use_bin_type=True)
+        return json.dumps(value, separators=(',', ':')).encode()
+
+    def _compress(self, body: bytes) -> tuple[int, bytes]:
+        if len(body) < self.threshold or self.compression == 'none':
+            return self.COMPRESSION_NONE, body
+        if self.compression == 'zstd':
+            compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self._dictionary
+            )
+            if self._dictionary:
+                kind = self.COMPRESSION_ZSTD_DICT
+            else:
+                kind = self.COMPRESSION_ZSTD
+            return kind, compressor.compress(body)
+        return self.COMPRESSION_ZLIB, zlib.compress(body, self.level)
+
+    def encode(self, value: Any) -> bytes:
+        """Encode a JSON-compatible value."""
+        if self._fallbacks:
+            fallbacks, self._fallbacks = self._fallbacks, []
+            for message in fallbacks:
+                logger.warning(message)
+
+        body = self._dump_body(value)
+        compression, payload = self._compress(body)
+        flags = (compression << 4) | self.format
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, flags, len(body))
+        return header + payload
+
+    # Decoding
+
+    def _decompress(self, compression: int, payload: bytes,
+                    length: int) -> bytes:
+        if compression == self.COMPRESSION_NONE:
+            return payload
+        if compression == self.COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        if zstandard is None:
+            raise CodecError(
+                "zstd-compressed value but zstandard is not installed"
+            )
+        if compression == self.COMPRESSION_ZSTD_DICT:
+            if self._dictionary is None:
+                raise CodecError(
+                    "zstd dictionary value but no dictionary is loaded"
+                )
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=self._dictionary
+            )
+        else:
+            decompressor = zstandard.ZstdDecompressor()
+        return decompressor.decompress(payload, max_output_size=length)
+
+    def decode(self, data: bytes) -> Any:
+        """
+        Decode a value written by encode(), or a legacy JSON value.
+
+        Raises:
+            CodecError: If the value is corrupt or uses an unknown version,
+                format or compression
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        if not data or data[0] != self.MAGIC:
+            try:
+                return json.loads(data)
+            except ValueError as e:
+                raise CodecError(
+                    f"Invalid legacy cache value: {e}"
+                ) from e
+
+        if len(data) < self.HEADER.size:
+            raise CodecError("Truncated cache value header")
+        _, version, flags, length = self.HEADER.unpack_from(data)
+        if version != self.VERSION:
+            raise CodecError(f"Unknown cache codec version {version}")
+
+        body_format, compression = flags & 0x0F, flags >> 4
+        try:
+            payload = data[self.HEADER.size:]
+            body = self._decompress(compression, payload, length)
+            if body_format == self.FORMAT_MSGPACK:
+                if msgpack is None:
+                    raise CodecError(
+                        "msgpack value but msgpack is not installed"
+                    )
+                return msgpack.unpackb(body, raw=False)
+            if body_format == self.FORMAT_JSON:
+                return json.loads(body)
+        except CodecError:
+            raise
+        except Exception as e:
+            raise CodecError(f"Corrupt cache value: {e}") from e
+        raise CodecError(f"Unknown cache body format {body_format}")
+
+    def size(self, data: bytes) -> int:
+        """Uncompressed body size of an encoded value (cache accounting)."""
+        if (data and data[0] == self.MAGIC
+                and len(data) >= self.HEADER.size):
+            return self.HEADER.unpack_from(data)[3]
+        return len(data)
+
+
+# Global codec instance
+codec = Codec()
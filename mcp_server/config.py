@@ -27,16 +27,70 @@ else:
     redis_db = os.getenv('REDIS_DB', '0')
     REDIS_URL = f'redis://{redis_host}:{redis_port}/{redis_db}'
 
+# Shared Redis connection pools (see connections.py)
+# Connect over a unix socket instead of TCP (database and credentials still
+# come from REDIS_URL)
+REDIS_UNIX_SOCKET = os.getenv('REDIS_UNIX_SOCKET', '')
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))  # per pool
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '1.0'))  # seconds to wait for a free connection
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '0.5'))  # seconds
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', '0.5'))  # seconds
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', '30'))  # seconds idle before a PING
+REDIS_RETRY_ATTEMPTS = int(os.getenv('REDIS_RETRY_ATTEMPTS', '2'))
+REDIS_RETRY_BACKOFF_BASE = float(os.getenv('REDIS_RETRY_BACKOFF_BASE', '0.01'))  # seconds
+REDIS_RETRY_BACKOFF_CAP = float(os.getenv('REDIS_RETRY_BACKOFF_CAP', '0.1'))  # seconds
+
+# Circuit breaker around Redis (see breaker.py): after this many consecutive
+# connection failures or timeouts, Redis calls fail fast for the reset
+# timeout, then a single probe call decides whether to close it again
+REDIS_BREAKER_FAILURE_THRESHOLD = int(os.getenv('REDIS_BREAKER_FAILURE_THRESHOLD', '5'))
+REDIS_BREAKER_RESET_TIMEOUT = float(os.getenv('REDIS_BREAKER_RESET_TIMEOUT', '5.0'))  # seconds
+# Rate limiting while the backend is unavailable: 'local' (per-process
+# in-memory limits), 'allow' (no limits) or 'deny' (reject every call)
+RATE_LIMIT_DEGRADED_MODE = os.getenv('RATE_LIMIT_DEGRADED_MODE', 'local')
+# While the backend is unavailable the cache is L1-only; values cached then
+# live this long, since invalidations from other nodes are not received
+CACHE_DEGRADED_L1_TTL = int(os.getenv('CACHE_DEGRADED_L1_TTL', '60'))  # seconds
+
+# Storage backends (see backends.py): 'redis', or 'memory' to keep cache and
+# rate limit state in-process (single-node deployments, benchmarks, load tests)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis')
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'redis')
+
 # API Settings
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://localhost:8004')
 
-# Rate Limiting (requests per minute, requests per day)
+# Subscription tiers, lowest to highest. Each tier can access content
+# requiring its own tier or any tier before it.
+TIERS = ('free', 'starter', 'pro', 'enterprise')
+
+# Rate Limiting (cost units per minute, cost units per day; see RATE_LIMIT_COSTS)
+# algorithm: 'fixed_window' (calendar minute/day counters, daily quota resets
+# at midnight) or 'gcra' (smooth rolling limits, one key per user)
+# lease_size: units leased from the backend at a time and consumed in-process;
+# tiers without it are checked against the backend on every call (strict)
+# Limits are the former request limits times the get_protocol cost, so every
+# plan still allows the same number of get_protocol calls.
 RATE_LIMITS = {
-    'free': {'per_minute': 5, 'per_day': 100},
-    'starter': {'per_minute': 20, 'per_day': 1000},
-    'pro': {'per_minute': 100, 'per_day': None},  # None = unlimited
-    'enterprise': {'per_minute': None, 'per_day': None},  # None = unlimited
+    'free': {'per_minute': 25, 'per_day': 500, 'algorithm': 'fixed_window'},
+    'starter': {'per_minute': 100, 'per_day': 5000, 'algorithm': 'fixed_window'},
+    'pro': {'per_minute': 500, 'per_day': None, 'algorithm': 'gcra', 'lease_size': 50},  # None = unlimited
+    'enterprise': {'per_minute': None, 'per_day': None, 'lease_size': 250},  # None = unlimited
+}
+# Cost of each tool call in rate limit units, roughly proportional to the
+# backend work it does. Tools not listed cost RATE_LIMIT_DEFAULT_COST;
+# get_user_info is free (it only reports the remaining budget).
+RATE_LIMIT_COSTS = {
+    'list_technologies': 1,  # cached list
+    'get_steering_rules': 1,  # cached rules
+    'list_protocols': 2,  # one page of summaries
+    'search_protocols': 3,  # ranking plus hydration of one page
+    'get_protocol': 5,  # full markdown, access log and usage counters
 }
+RATE_LIMIT_DEFAULT_COST = 1
+# Seconds a lease may be used before unused units are returned to the backend
+RATE_LIMIT_LEASE_TTL = float(os.getenv('RATE_LIMIT_LEASE_TTL', '2.0'))
+RATE_LIMIT_RECONCILE_INTERVAL = float(os.getenv('RATE_LIMIT_RECONCILE_INTERVAL', '1.0'))
 
 # Cache TTL (in seconds)
 CACHE_TTL = {
@@ -44,8 +98,84 @@ CACHE_TTL = {
     'steering_rules': 86400,  # 24 hours
     'user_info': 300,  # 5 minutes
     'technology_list': 3600,  # 1 hour
+    'api_key': 60,  # 1 minute (in-process authentication cache)
+    'search': 600,  # 10 minutes (ranked search results)
 }
 
+# Soft TTLs (in seconds) for stale-while-revalidate. CACHE_TTL stays the hard
+# TTL; once an entry is older than its soft TTL it is still served, but a
+# background refresh is started (CacheManager.get_or_load).
+CACHE_SOFT_TTL = {
+    'protocol': 3000,  # 50 minutes
+    'steering_rules': 72000,  # 20 hours
+    'technology_list': 3000,  # 50 minutes
+}
+CACHE_REFRESH_WORKERS = int(os.getenv('CACHE_REFRESH_WORKERS', '4'))
+
+# In-process (L1) cache in front of Redis
+CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', '10000'))
+CACHE_L1_MAX_BYTES = int(os.getenv('CACHE_L1_MAX_BYTES', str(64 * 1024 * 1024)))
+# Upper bound on L1 lifetimes; CACHE_TTL applies when shorter
+CACHE_L1_MAX_TTL = int(os.getenv('CACHE_L1_MAX_TTL', '300'))
+CACHE_INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'vizpilot:cache:invalidations')
+
+# Single-flight cache fills (CacheManager.get_or_load)
+# Also take a short Redis lock so only one process per cluster runs the loader
+CACHE_FILL_LOCK_ENABLED = os.getenv('CACHE_FILL_LOCK_ENABLED', 'true').lower() == 'true'
+CACHE_FILL_LOCK_TTL = float(os.getenv('CACHE_FILL_LOCK_TTL', '5.0'))  # seconds
+CACHE_FILL_WAIT_TIMEOUT = float(os.getenv('CACHE_FILL_WAIT_TIMEOUT', '5.0'))  # seconds
+CACHE_FILL_POLL_INTERVAL = float(os.getenv('CACHE_FILL_POLL_INTERVAL', '0.05'))  # seconds
+
+# Cache value encoding (see codec.py)
+# 'msgpack' (needs msgpack) or 'json'
+CACHE_CODEC_FORMAT = os.getenv('CACHE_CODEC_FORMAT', 'msgpack')
+# 'zstd' (needs zstandard), 'zlib' or 'none'
+CACHE_COMPRESSION = os.getenv('CACHE_COMPRESSION', 'zstd')
+CACHE_COMPRESSION_THRESHOLD = int(os.getenv('CACHE_COMPRESSION_THRESHOLD', '1024'))  # bytes
+CACHE_COMPRESSION_LEVEL = int(os.getenv('CACHE_COMPRESSION_LEVEL', '3'))
+# Optional shared zstd dictionary trained on protocol markdown (Codec.train_dictionary)
+CACHE_ZSTD_DICT_PATH = os.getenv('CACHE_ZSTD_DICT_PATH', '')
+
+# In-process API key cache
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', '10000'))
+AUTH_REVOCATION_CHANNEL = os.getenv('AUTH_REVOCATION_CHANNEL', 'vizpilot:auth:revocations')
+
+# Full-text search
+# Text search configuration for the stored protocol search document
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'english')
+# 'postgres' (full-text search in the database) or 'bm25' (in-process index, needs numpy)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'postgres')
+SEARCH_INDEX_REFRESH_INTERVAL = float(os.getenv('SEARCH_INDEX_REFRESH_INTERVAL', '30'))  # seconds
+SEARCH_INDEX_REBUILD_INTERVAL = float(os.getenv('SEARCH_INDEX_REBUILD_INTERVAL', '3600'))  # seconds
+# How often to look again for a missing stored search document (postgres backend)
+SEARCH_DOCUMENT_RECHECK_INTERVAL = float(os.getenv('SEARCH_DOCUMENT_RECHECK_INTERVAL', '300'))  # seconds
+
+# Pagination (list_protocols and search_protocols)
+PAGINATION_DEFAULT_LIMIT = int(os.getenv('PAGINATION_DEFAULT_LIMIT', '50'))
+PAGINATION_MAX_LIMIT = int(os.getenv('PAGINATION_MAX_LIMIT', '100'))
+# Ranked results cached per search; later pages continue with keyset queries
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '200'))
+
+# Write-behind analytics (protocol views and access logs)
+ANALYTICS_QUEUE_SIZE = int(os.getenv('ANALYTICS_QUEUE_SIZE', '10000'))
+ANALYTICS_BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', '500'))
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv('ANALYTICS_FLUSH_INTERVAL', '2.0'))  # seconds
+ANALYTICS_ENQUEUE_TIMEOUT = float(os.getenv('ANALYTICS_ENQUEUE_TIMEOUT', '0.05'))  # seconds
+
+# Redis usage counters, rolled up into DailyUsage
+USAGE_COUNTER_TTL = int(os.getenv('USAGE_COUNTER_TTL', str(2 * 86400)))  # keep yesterday for late rollups
+USAGE_ROLLUP_INTERVAL = float(os.getenv('USAGE_ROLLUP_INTERVAL', '60'))  # seconds
+USAGE_ROLLUP_BATCH_SIZE = int(os.getenv('USAGE_ROLLUP_BATCH_SIZE', '500'))
+
+# Durable access log spool
+SPOOL_DIR = os.getenv('MCP_SPOOL_DIR', str(BASE_DIR / 'spool' / 'access_log'))
+SPOOL_SEGMENT_BYTES = int(os.getenv('SPOOL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+SPOOL_FSYNC_BATCH = int(os.getenv('SPOOL_FSYNC_BATCH', '64'))  # records
+SPOOL_FSYNC_INTERVAL = float(os.getenv('SPOOL_FSYNC_INTERVAL', '0.2'))  # seconds
+SPOOL_SHIP_INTERVAL = float(os.getenv('SPOOL_SHIP_INTERVAL', '2.0'))  # seconds
+SPOOL_SHIP_BATCH_SIZE = int(os.getenv('SPOOL_SHIP_BATCH_SIZE', '500'))
+SPOOL_MAX_SHIP_ATTEMPTS = int(os.getenv('SPOOL_MAX_SHIP_ATTEMPTS', '5'))  # before salvaging record by record
+
 # Watermark Settings
 WATERMARK_ENABLED = os.getenv('WATERMARK_ENABLED', 'true').lower() == 'true'
 WATERMARK_FORMAT = "<!-- VIZPILOT - Licensed to: {email} | Key: {key_prefix} | ID: {watermark_id} -->"
@@ -54,5 +184,8 @@ WATERMARK_FORMAT = "<!-- VIZPILOT - Licensed to: {email} | Key: {key_prefix} | I
 LOG_FILE = os.getenv('MCP_LOG_FILE', str(BASE_DIR / 'logs' / 'mcp_server.log'))
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
+# Metrics: cache hit/miss counters and the like, logged as one JSON line
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', '60'))  # seconds, 0 disables
+
 # Django Settings Module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vizpilot_config.settings')
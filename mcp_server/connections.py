@@ -0,0 +1,289 @@
+"""
+Connections Module
+Shared Redis connection pools for the cache, rate limiter and usage counters.
+"""
+import logging
+import threading
+from typing import Any, Callable, Optional
+from .breaker import CircuitBreaker
+from .config import (
+    REDIS_URL,
+    REDIS_UNIX_SOCKET,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_CONNECT_TIMEOUT,
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_RETRY_ATTEMPTS,
+    REDIS_RETRY_BACKOFF_BASE,
+    REDIS_RETRY_BACKOFF_CAP,
+)
+
+try:
+    import redis
+    from redis.backoff import ExponentialBackoff
+    from redis.connection import parse_url
+    from redis.retry import Retry
+except ImportError:  # pragma: no cover - optional with the memory backends
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+if redis is not None:
+    class PoolExhaustedError(redis.ConnectionError):
+        """No pooled connection became free within REDIS_POOL_TIMEOUT."""
+        pass
+
+    class GuardedConnectionPool(redis.BlockingConnectionPool):
+        """
+        Blocking pool that raises PoolExhaustedError when it runs out of
+        connections, so a load spike is not mistaken for a Redis outage.
+        """
+
+        # Message of the ConnectionError BlockingConnectionPool raises on timeout
+        EXHAUSTED_MESSAGE = "No connection available"
+
+        def get_connection(self, *args, **kwargs):
+            try:
+                return super().get_connection(*args, **kwargs)
+            except redis.ConnectionError as e:
+                if str(e).startswith(self.EXHAUSTED_MESSAGE):
+                    raise PoolExhaustedError(str(e)) from e
+                raise
+
+    class GuardedPipeline(redis.client.Pipeline):
+        """Pipeline whose execute() goes through the client's circuit breaker."""
+
+        breaker = None
+
+        def execute(self, raise_on_error: bool = True) -> list:
+            return self.breaker.call(super().execute, raise_on_error)
+
+    class GuardedRedis(redis.Redis):
+        """
+        Client whose commands (including scripts and pipelines) go through a
+        circuit breaker. Pub/sub connections are not guarded.
+        """
+
+        def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.breaker = breaker
+
+        def execute_command(self, *args, **options):
+            return self.breaker.call(super().execute_command, *args, **options)
+
+        def pipeline(self, transaction: bool = True, shard_hint=None) -> GuardedPipeline:
+            pipe = GuardedPipeline(
+                self.connection_pool, self.response_callbacks, transaction, shard_hint
+            )
+            pipe.breaker = self.breaker
+            return pipe
+
+
+class _Deferred:
+    """Result of a command queued on a Pipeline, available after execute()."""
+
+    __slots__ = ('_parse', '_value', '_error', '_done')
+
+    def __init__(self, parse: Optional[Callable[[Any], Any]] = None):
+        self._parse = parse
+        self._value = None
+        self._error = None
+        self._done = False
+
+    def _resolve(self, result: Any):
+        self._done = True
+        if isinstance(result, Exception):
+            self._error = result
+        else:
+            self._value = self._parse(result) if self._parse else result
+
+    @property
+    def value(self) -> Any:
+        """
+        The command's (parsed) reply.
+
+        Raises:
+            RuntimeError: If the pipeline has not been executed
+            redis.RedisError: If this command failed
+        """
+        if not self._done:
+            raise RuntimeError("Pipeline has not been executed")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class Pipeline:
+    """
+    Commands from several components sent in one round trip.
+
+    Each queued command returns a deferred result whose .value is set by
+    execute(), so callers can queue work (e.g. a rate limit script and
+    cache reads for one request) without knowing what else is queued.
+    One failed command does not fail the others. Used as a context
+    manager, the pipeline executes on a clean exit.
+    """
+
+    def __init__(self, client, transaction: bool = False):
+        self._pipe = client.pipeline(transaction=transaction)
+        self._pending = []
+
+    def call(self, command: str, *args, parse: Callable[[Any], Any] = None,
+             **kwargs) -> _Deferred:
+        """Queue a client command by name (e.g. 'get', 'mget', 'pttl')."""
+        getattr(self._pipe, command)(*args, **kwargs)
+        return self._queued(parse)
+
+    def script(self, script, keys: list, args: list,
+               parse: Callable[[Any], Any] = None) -> _Deferred:
+        """Queue a registered Lua script (loaded with SCRIPT LOAD if needed)."""
+        script(keys=keys, args=args, client=self._pipe)
+        return self._queued(parse)
+
+    def _queued(self, parse) -> _Deferred:
+        deferred = _Deferred(parse)
+        self._pending.append(deferred)
+        return deferred
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def execute(self) -> list:
+        """
+        Send every queued command and resolve their results.
+
+        Returns:
+            The parsed replies in queue order (exceptions for failed commands)
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        try:
+            results = self._pipe.execute(raise_on_error=False)
+        except Exception as e:
+            # Connection-level failure: every command failed
+            results = [e] * len(pending)
+        replies = []
+        for deferred, result in zip(pending, results):
+            deferred._resolve(result)
+            replies.append(deferred._error or deferred._value)
+        return replies
+
+    def __enter__(self) -> 'Pipeline':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.execute()
+        else:
+            self._pipe.reset()
+
+
+class RedisConnections:
+    """
+    Process-wide Redis connection pools.
+
+    Every component gets its client from here, so the process holds at
+    most `max_connections` connections per pool instead of one default
+    pool per component. Pools block for up to REDIS_POOL_TIMEOUT seconds
+    when exhausted rather than opening more connections, and connections
+    have socket and connect timeouts, TCP keepalive, periodic health
+    checks and retries with exponential backoff on connection errors and
+    timeouts, so a Redis blip costs a bounded stall instead of hanging
+    requests. Retried writes can be applied twice if the first reply was
+    lost; for rate limits that only over-counts.
+
+    Clients share one circuit breaker (`breaker`): once Redis keeps
+    failing, commands raise CircuitBreakerOpen immediately instead of
+    waiting for timeouts, and callers switch to their degraded mode. An
+    exhausted pool (PoolExhaustedError) fails only the calls that found no
+    connection and is counted as `overloaded`; it does not open the breaker.
+
+    One pool exists per decode_responses setting (connections return
+    either bytes or str).
+    """
+
+    def __init__(self, url: str = REDIS_URL, unix_socket: str = REDIS_UNIX_SOCKET,
+                 max_connections: int = REDIS_MAX_CONNECTIONS):
+        self.url = url
+        self.unix_socket = unix_socket
+        self.max_connections = max_connections
+        self.breaker = CircuitBreaker(
+            'redis',
+            failure_types=(
+                (redis.ConnectionError, redis.TimeoutError, redis.exceptions.ReadOnlyError)
+                if redis is not None else (Exception,)
+            ),
+            rejection_types=(PoolExhaustedError,) if redis is not None else ()
+        )
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool_kwargs(self, decode_responses: bool) -> dict:
+        kwargs = parse_url(self.url)
+        if self.unix_socket:
+            # Same database and credentials, over a local socket
+            for option in ('host', 'port', 'connection_class', 'ssl_cert_reqs'):
+                kwargs.pop(option, None)
+            kwargs['path'] = self.unix_socket
+            kwargs['connection_class'] = redis.UnixDomainSocketConnection
+        else:
+            kwargs['socket_keepalive'] = True
+
+        kwargs.update(
+            max_connections=self.max_connections,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            retry=Retry(
+                ExponentialBackoff(cap=REDIS_RETRY_BACKOFF_CAP, base=REDIS_RETRY_BACKOFF_BASE),
+                REDIS_RETRY_ATTEMPTS
+            ),
+            retry_on_error=[redis.ConnectionError, redis.TimeoutError],
+            decode_responses=decode_responses,
+        )
+        return kwargs
+
+    def pool(self, decode_responses: bool = False):
+        """
+        The shared pool, created on first use.
+
+        Raises:
+            ImportError: If redis is not installed
+        """
+        pool = self._pools.get(decode_responses)
+        if pool is not None:
+            return pool
+        if redis is None:
+            raise ImportError("Redis connections require the redis package")
+        with self._lock:
+            pool = self._pools.get(decode_responses)
+            if pool is None:
+                pool = GuardedConnectionPool(**self._pool_kwargs(decode_responses))
+                self._pools[decode_responses] = pool
+            return pool
+
+    def client(self, decode_responses: bool = False):
+        """A client on the shared pool (clients are cheap; the pool is shared)."""
+        return GuardedRedis(connection_pool=self.pool(decode_responses), breaker=self.breaker)
+
+    def pipeline(self, decode_responses: bool = False, transaction: bool = False) -> Pipeline:
+        """A Pipeline on the shared pool (see Pipeline)."""
+        return Pipeline(self.client(decode_responses), transaction)
+
+    def close(self):
+        """Disconnect every pool (e.g. after fork or at shutdown)."""
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            try:
+                pool.disconnect()
+            except Exception as e:
+                logger.warning(f"Failed to close Redis pool: {e}")
+
+
+# Global connection pools
+redis_connections = RedisConnections()
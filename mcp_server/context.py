@@ -0,0 +1,30 @@
+"""
+Request Context Module
+Holds per-call authentication state shared by every stage of a tool call.
+"""
+
+
+class RequestContext:
+    """
+    Resolved caller state for a single tool call.
+
+    Built once by AuthManager.build_context() so that rate limiting,
+    authorization and tracking reuse the same user, API key and
+    subscription instead of querying them again.
+    """
+
+    def __init__(self, user, api_key, subscription=None):
+        self.user = user
+        self.api_key = api_key
+        self.subscription = subscription
+        self.tier = subscription.plan.tier if subscription else 'free'
+
+    @property
+    def user_id(self) -> str:
+        """User ID as used for rate limit and cache keys."""
+        return str(self.user.id)
+
+    @property
+    def has_subscription(self) -> bool:
+        """True if the user has an active or trialing subscription."""
+        return self.subscription is not None
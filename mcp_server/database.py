@@ -4,6 +4,7 @@ Handles Django ORM connection for MCP server.
 """
 import os
 import sys
+import time
 import django
 from pathlib import Path
 
@@ -20,8 +21,13 @@ from protocols.models import Technology, Protocol, SteeringRule, ProtocolView
 from api.models import APIKey, AccessLog, DailyUsage
 from subscriptions.models import Subscription, Plan
 from accounts.models import User
-from django.db.models import Q, Count
+from django.db import connection, transaction
+from django.db.models import Q, Count, F, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
+from .policy import tier_policy
+from .pagination import exact_rank, after_rank_filter
+from .config import SEARCH_CONFIG, SEARCH_BACKEND, SEARCH_DOCUMENT_RECHECK_INTERVAL
 
 
 class DatabaseManager:
@@ -29,6 +35,16 @@ class DatabaseManager:
     Manages database queries for MCP server.
     """
     
+    # Projections for listings and search results (never content_markdown)
+    LISTING_FIELDS = (
+        'id', 'slug', 'title', 'description', 'tier_required', 'difficulty',
+        'estimated_read_time', 'tags', 'is_featured', 'view_count'
+    )
+    SUMMARY_FIELDS = (
+        'id', 'slug', 'title', 'description', 'tier_required', 'difficulty',
+        'tags', 'technology__slug', 'technology__name'
+    )
+    
     @staticmethod
     def get_user_by_api_key(key_hash: str) -> tuple[User, APIKey] | None:
         """
@@ -71,11 +87,7 @@ class DatabaseManager:
         
         if tier:
             # Get technologies accessible by this tier
-            tier_hierarchy = {'free': 0, 'starter': 1, 'pro': 2, 'enterprise': 3}
-            user_tier_level = tier_hierarchy.get(tier, 0)
-            
-            accessible_tiers = [t for t, level in tier_hierarchy.items() if level <= user_tier_level]
-            query = query.filter(tier_required__in=accessible_tiers)
+            query = query.filter(tier_policy.tier_filter(tier))
         
         return list(query.order_by('display_order', 'name'))
     
@@ -88,26 +100,73 @@ class DatabaseManager:
             return None
     
     @staticmethod
-    def get_protocols(technology_slug: str, tier: str = None) -> list[Protocol]:
+    def get_protocols(technology_slug: str, tier: str = None, limit: int = None,
+                      after: list = None) -> list[dict]:
         """
-        Get protocols for a technology.
+        Get protocol listing rows for a technology.
+        Only the listing fields are selected; content is never loaded.
         Filter by tier if provided.
+        
+        Rows are ordered by (is_featured desc, published_at desc, id asc).
+        Pass the [is_featured, published_at, id] of the last row seen as
+        `after` to continue from it (keyset pagination).
         """
         query = Protocol.objects.filter(
             technology__slug=technology_slug,
             is_active=True,
             published_at__isnull=False
-        ).select_related('technology')
+        )
         
         if tier:
             # Get protocols accessible by this tier
-            tier_hierarchy = {'free': 0, 'starter': 1, 'pro': 2, 'enterprise': 3}
-            user_tier_level = tier_hierarchy.get(tier, 0)
-            
-            accessible_tiers = [t for t, level in tier_hierarchy.items() if level <= user_tier_level]
-            query = query.filter(tier_required__in=accessible_tiers)
+            query = query.filter(tier_policy.tier_filter(tier))
+        
+        if after is not None:
+            is_featured, published_at, last_id = after
+            query = query.filter(
+                Q(is_featured__lt=is_featured)
+                | Q(is_featured=is_featured, published_at__lt=published_at)
+                | Q(is_featured=is_featured, published_at=published_at, id__gt=last_id)
+            )
+        
+        rows = query.order_by('-is_featured', '-published_at', 'id').values(
+            *DatabaseManager.LISTING_FIELDS, 'published_at'
+        )
+        if limit is not None:
+            rows = rows[:limit]
+        
+        return [
+            {**row, 'id': str(row['id']), 'published_at': row['published_at'].isoformat()}
+            for row in rows
+        ]
+    
+    @staticmethod
+    def protocol_summary(row: dict) -> dict:
+        """Build a search/summary dict from a row with SUMMARY_FIELDS."""
+        return {
+            'id': str(row['id']),
+            'slug': row['slug'],
+            'title': row['title'],
+            'description': row['description'],
+            'technology': {
+                'slug': row['technology__slug'],
+                'name': row['technology__name']
+            },
+            'tier_required': row['tier_required'],
+            'difficulty': row['difficulty'],
+            'tags': row['tags']
+        }
+    
+    @staticmethod
+    def get_protocol_summaries(protocol_ids: list[str]) -> dict[str, dict]:
+        """Get summary dicts for protocols by ID, without content."""
+        rows = Protocol.objects.filter(
+            id__in=protocol_ids,
+            is_active=True,
+            published_at__isnull=False
+        ).values(*DatabaseManager.SUMMARY_FIELDS)
         
-        return list(query.order_by('-is_featured', '-published_at'))
+        return {str(row['id']): DatabaseManager.protocol_summary(row) for row in rows}
     
     @staticmethod
     def get_protocol_by_id(protocol_id: str) -> Protocol | None:
@@ -147,33 +206,133 @@ class DatabaseManager:
         
         if tier:
             # Get steering rules accessible by this tier
-            tier_hierarchy = {'free': 0, 'starter': 1, 'pro': 2, 'enterprise': 3}
-            user_tier_level = tier_hierarchy.get(tier, 0)
-            
-            accessible_tiers = [t for t, level in tier_hierarchy.items() if level <= user_tier_level]
-            query = query.filter(tier_required__in=accessible_tiers)
+            query = query.filter(tier_policy.tier_filter(tier))
         
         return list(query.order_by('priority', 'display_order'))
     
+    # Stored, weighted search document maintained by Postgres
+    SEARCH_DOCUMENT_COLUMN = 'search_document'
+    _has_search_document = False
+    _search_document_checked_at = None
+    
+    @staticmethod
+    def ensure_search_document():
+        """
+        Add the weighted search document column and its GIN index.
+        
+        The column is a generated tsvector (title A, description B,
+        content C), so Postgres keeps it up to date whenever a protocol is
+        saved. Idempotent; run once per deployment with
+        `python -m mcp_server.migrate` (requires PostgreSQL 12+).
+        """
+        if not SEARCH_CONFIG.replace('_', '').replace('.', '').isalnum():
+            raise ValueError(f"Invalid SEARCH_CONFIG: {SEARCH_CONFIG!r}")
+        
+        qn = connection.ops.quote_name
+        table = Protocol._meta.db_table
+        column = DatabaseManager.SEARCH_DOCUMENT_COLUMN
+        
+        def weighted(field_name, weight):
+            field_column = qn(Protocol._meta.get_field(field_name).column)
+            return (
+                f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, "
+                f"coalesce({field_column}, '')), '{weight}')"
+            )
+        
+        document = ' || '.join([
+            weighted('title', 'A'),
+            weighted('description', 'B'),
+            weighted('content_markdown', 'C'),
+        ])
+        
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ADD COLUMN IF NOT EXISTS {qn(column)} tsvector "
+                f"GENERATED ALWAYS AS ({document}) STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {qn(f'{table}_{column}_gin')} "
+                f"ON {qn(table)} USING GIN ({qn(column)})"
+            )
+        
+        DatabaseManager._has_search_document = True
+    
+    @staticmethod
+    def has_search_document() -> bool:
+        """
+        Check whether the stored search document exists.
+        
+        Once found it is remembered for the life of the process. While it is
+        missing, the check is repeated at most every
+        SEARCH_DOCUMENT_RECHECK_INTERVAL seconds, so running the migration
+        takes effect without a restart.
+        """
+        if DatabaseManager._has_search_document:
+            return True
+        
+        now = time.monotonic()
+        checked_at = DatabaseManager._search_document_checked_at
+        if checked_at is not None and now - checked_at < SEARCH_DOCUMENT_RECHECK_INTERVAL:
+            return False
+        
+        table = Protocol._meta.db_table
+        with connection.cursor() as cursor:
+            columns = connection.introspection.get_table_description(cursor, table)
+        DatabaseManager._search_document_checked_at = now
+        DatabaseManager._has_search_document = any(
+            column.name == DatabaseManager.SEARCH_DOCUMENT_COLUMN for column in columns
+        )
+        return DatabaseManager._has_search_document
+    
     @staticmethod
-    def search_protocols(query: str, technology_slug: str = None, tier: str = None) -> list[Protocol]:
+    def search_protocols(query: str, technology_slug: str = None, tier: str = None,
+                         limit: int = 50, after: list = None) -> list[tuple[dict, float]]:
         """
         Search protocols by query string.
-        Uses PostgreSQL full-text search.
+        Returns (summary, rank) pairs ordered by (rank desc, id asc); content
+        is never loaded. Pass the [rank, id] of the last result seen as
+        `after` to continue from it (keyset pagination).
+        Uses PostgreSQL full-text search against the stored, GIN-indexed
+        search document, or builds the vector on the fly if the column has
+        not been created (run `python -m mcp_server.migrate`). With
+        SEARCH_BACKEND = 'bm25' the in-process index ranks instead.
         """
-        from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+        from django.contrib.postgres.search import (
+            SearchVector, SearchVectorField, SearchQuery, SearchRank
+        )
+        from django.db.models.expressions import RawSQL
         
-        # Build search query
-        search_query = SearchQuery(query)
-        search_vector = SearchVector('title', weight='A') + SearchVector('description', weight='B') + SearchVector('content_markdown', weight='C')
+        if SEARCH_BACKEND == 'bm25':
+            return DatabaseManager._search_protocols_bm25(query, technology_slug, tier, limit, after)
         
-        protocols = Protocol.objects.annotate(
-            rank=SearchRank(search_vector, search_query)
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        if DatabaseManager.has_search_document():
+            # Match through the GIN index, rank from the stored vector
+            qn = connection.ops.quote_name
+            search_vector = RawSQL(
+                f"{qn(Protocol._meta.db_table)}."
+                f"{qn(DatabaseManager.SEARCH_DOCUMENT_COLUMN)}",
+                [],
+                output_field=SearchVectorField()
+            )
+            protocols = Protocol.objects.alias(
+                search_document=search_vector
+            ).filter(search_document=search_query)
+        else:
+            search_vector = (
+                SearchVector('title', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+                + SearchVector('content_markdown', weight='C', config=SEARCH_CONFIG)
+            )
+            protocols = Protocol.objects.all()
+        
+        protocols = protocols.annotate(
+            rank=exact_rank(SearchRank(search_vector, search_query))
         ).filter(
             rank__gte=0.1,
             is_active=True,
             published_at__isnull=False
-        ).select_related('technology')
+        )
         
         # Filter by technology if provided
         if technology_slug:
@@ -181,78 +340,161 @@ class DatabaseManager:
         
         # Filter by tier if provided
         if tier:
-            tier_hierarchy = {'free': 0, 'starter': 1, 'pro': 2, 'enterprise': 3}
-            user_tier_level = tier_hierarchy.get(tier, 0)
-            accessible_tiers = [t for t, level in tier_hierarchy.items() if level <= user_tier_level]
-            protocols = protocols.filter(tier_required__in=accessible_tiers)
+            protocols = protocols.filter(tier_policy.tier_filter(tier))
+        
+        if after is not None:
+            protocols = protocols.filter(after_rank_filter(after))
         
-        return list(protocols.order_by('-rank', '-is_featured')[:50])
+        rows = protocols.order_by('-rank', 'id').values(
+            *DatabaseManager.SUMMARY_FIELDS, 'rank'
+        )[:limit]
+        return [(DatabaseManager.protocol_summary(row), row['rank']) for row in rows]
     
     @staticmethod
-    def track_protocol_view(user: User, protocol: Protocol, api_key: APIKey = None):
-        """Track protocol view for analytics."""
-        # Create protocol view record
-        ProtocolView.objects.create(
-            user=user,
-            protocol=protocol
-        )
-        
-        # Update protocol view count
-        protocol.view_count += 1
-        protocol.save(update_fields=['view_count'])
+    def _search_protocols_bm25(query: str, technology_slug: str = None, tier: str = None,
+                               limit: int = 50, after: list = None) -> list[tuple[dict, float]]:
+        """Rank with the in-process BM25 index; summaries come from the index too."""
+        from .search import search_engine
         
-        # Update daily usage
-        today = timezone.now().date()
-        daily_usage, created = DailyUsage.objects.get_or_create(
-            user=user,
-            date=today,
-            defaults={
-                'protocol_views': 0,
-                'api_requests': 0,
-                'usage_by_technology': {},
-                'usage_by_ide': {}
-            }
-        )
+        if after is None:
+            return search_engine.search(query, tier, technology_slug, limit=limit)
         
-        daily_usage.protocol_views += 1
-        daily_usage.api_requests += 1
+        last_score, last_id = after
+        ranked = search_engine.search(query, tier, technology_slug, limit=None)
+        return [
+            (summary, score) for summary, score in ranked
+            if score < last_score or (score == last_score and summary['id'] > last_id)
+        ][:limit]
+    
+    @staticmethod
+    def get_search_corpus(updated_since=None, protocol_id: str = None) -> list[dict]:
+        """
+        Load protocol rows for the in-process search index.
         
-        # Update technology usage
-        tech_slug = protocol.technology.slug
-        if tech_slug not in daily_usage.usage_by_technology:
-            daily_usage.usage_by_technology[tech_slug] = 0
-        daily_usage.usage_by_technology[tech_slug] += 1
+        Args:
+            updated_since: Only protocols updated at or after this time,
+                including ones since deactivated (so they can be removed)
+            protocol_id: Only this protocol
         
-        # Update IDE usage if API key provided
-        if api_key:
-            ide_type = api_key.ide_type
-            if ide_type not in daily_usage.usage_by_ide:
-                daily_usage.usage_by_ide[ide_type] = 0
-            daily_usage.usage_by_ide[ide_type] += 1
+        Returns:
+            Full catalog (active and published only) unless filtered
+        """
+        query = Protocol.objects.all()
+        if updated_since is not None:
+            query = query.filter(updated_at__gte=updated_since)
+        elif protocol_id is not None:
+            query = query.filter(id=protocol_id)
+        else:
+            query = query.filter(
+                is_active=True,
+                published_at__isnull=False,
+                technology__is_active=True
+            )
         
-        daily_usage.save()
+        return list(query.values(
+            *DatabaseManager.SUMMARY_FIELDS, 'content_markdown', 'is_active',
+            'published_at', 'technology__tier_required', 'technology__is_active'
+        ))
     
     @staticmethod
-    def track_access_log(user: User, api_key: APIKey, content_type: str, content_id: str, 
-                        technology_id: str, watermark_id: str, ip_address: str, 
-                        user_agent: str = '', response_time_ms: int = None):
-        """Track access log for audit and watermark tracking."""
-        AccessLog.objects.create(
-            user=user,
-            api_key=api_key,
-            content_type=content_type,
-            content_id=content_id,
-            technology_id=technology_id,
-            watermark_id=watermark_id,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            ide_type=api_key.ide_type if api_key else '',
-            response_time_ms=response_time_ms
+    def bulk_create_protocol_views(views: list[dict]):
+        """
+        Insert protocol view records in one query.
+        Each dict holds 'user_id' and 'protocol_id'.
+        """
+        ProtocolView.objects.bulk_create(
+            [ProtocolView(user_id=v['user_id'], protocol_id=v['protocol_id']) for v in views]
         )
     
+    @staticmethod
+    def bulk_create_access_logs(records: list[dict]):
+        """
+        Insert access log records in one query.
+        Each dict holds AccessLog field values, using user_id/api_key_id.
+        """
+        AccessLog.objects.bulk_create([AccessLog(**record) for record in records])
+    
+    @staticmethod
+    def apply_view_count_deltas(deltas: dict[str, int]):
+        """
+        Add view count deltas to protocols.
+        Protocols sharing the same delta are updated in one query.
+        """
+        by_delta = {}
+        for protocol_id, delta in deltas.items():
+            by_delta.setdefault(delta, []).append(protocol_id)
+        
+        for delta, protocol_ids in by_delta.items():
+            Protocol.objects.filter(id__in=protocol_ids).update(
+                view_count=F('view_count') + delta
+            )
+    
+    @staticmethod
+    def set_daily_usage_totals(totals: dict[tuple, dict]):
+        """
+        Write rolled-up usage totals to DailyUsage rows.
+        Counters never move backwards, so an older snapshot written late
+        cannot undo a newer one.
+        
+        Args:
+            totals: {(user_id, date): usage dict as returned by get_user_daily_usage}
+        """
+        if not totals:
+            return
+        
+        user_ids = {user_id for user_id, _ in totals}
+        dates = {date for _, date in totals}
+        
+        with transaction.atomic():
+            DailyUsage.objects.bulk_create(
+                [
+                    DailyUsage(
+                        user_id=user_id,
+                        date=date,
+                        protocol_views=0,
+                        api_requests=0,
+                        usage_by_technology={},
+                        usage_by_ide={}
+                    )
+                    for user_id, date in totals
+                ],
+                ignore_conflicts=True
+            )
+            rows = DailyUsage.objects.filter(user_id__in=user_ids, date__in=dates)
+            
+            updated = []
+            for row in rows:
+                usage = totals.get((str(row.user_id), row.date))
+                if not usage:
+                    continue
+                
+                row.protocol_views = Greatest(F('protocol_views'), Value(usage['protocol_views']))
+                row.api_requests = Greatest(F('api_requests'), Value(usage['api_requests']))
+                row.unique_protocols = Greatest(F('unique_protocols'), Value(usage['unique_protocols']))
+                row.usage_by_technology = usage['usage_by_technology']
+                row.usage_by_ide = usage['usage_by_ide']
+                updated.append(row)
+            
+            DailyUsage.objects.bulk_update(
+                updated,
+                ['protocol_views', 'api_requests', 'unique_protocols',
+                 'usage_by_technology', 'usage_by_ide']
+            )
+    
     @staticmethod
     def get_user_daily_usage(user: User) -> dict:
-        """Get user's usage for today."""
+        """
+        Get user's usage for today.
+        Reads the live usage counters, falling back to the rolled-up row.
+        """
+        from .usage import usage_counters
+        try:
+            live = usage_counters.get_daily_usage(str(user.id))
+        except Exception:
+            live = None
+        if live is not None:
+            return live
+        
         today = timezone.now().date()
         try:
             usage = DailyUsage.objects.get(user=user, date=today)
@@ -275,15 +517,28 @@ class DatabaseManager:
             }
     
     @staticmethod
-    def check_user_has_access(user: User, technology: Technology) -> bool:
-        """Check if user has access to a technology based on subscription."""
-        subscription = DatabaseManager.get_user_subscription(user)
-        if not subscription:
-            return False
+    def tier_has_access(tier: str, tier_required: str) -> bool:
+        """Check if a subscription tier satisfies a required tier."""
+        return tier_policy.can_access(tier, tier_required)
+    
+    @staticmethod
+    def get_technology_access(technologies: list[dict], tier: str | None) -> dict[str, bool]:
+        """
+        Compute access for many technologies in a single pass.
+        Works on technology dicts (e.g. the cached technology list) and
+        never touches the database.
+        
+        Args:
+            technologies: Dicts with 'slug' and 'tier_required'
+            tier: Subscription tier, or None if there is no active subscription
         
-        # Check tier access
-        tier_hierarchy = {'free': 0, 'starter': 1, 'pro': 2, 'enterprise': 3}
-        user_tier_level = tier_hierarchy.get(subscription.plan.tier, 0)
-        tech_tier_level = tier_hierarchy.get(technology.tier_required, 0)
+        Returns:
+            {slug: has_access}
+        """
+        if tier is None:
+            return {tech['slug']: False for tech in technologies}
         
-        return user_tier_level >= tech_tier_level
+        return {
+            tech['slug']: DatabaseManager.tier_has_access(tier, tech['tier_required'])
+            for tech in technologies
+        }
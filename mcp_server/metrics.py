@@ -0,0 +1,84 @@
+"""
+Metrics Module
+Periodic metrics log line built from the components' stats().
+"""
+import atexit
+import json
+import logging
+import threading
+from typing import Callable
+from .config import METRICS_LOG_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsReporter:
+    """
+    Logs every registered stats source as one JSON line.
+
+    Components register a callable returning a dict (e.g. cache.stats);
+    every `interval` seconds, and once more on shutdown, the reporter logs
+    "metrics {...}" at INFO so counters can be scraped from the logs. A
+    failing source is reported as {'error': ...} instead of dropping the
+    line. The cache and rate limiter stats include the Redis circuit
+    breaker's state and counters.
+    """
+
+    def __init__(self, interval: float = METRICS_LOG_INTERVAL):
+        self.interval = interval
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name: str, source: Callable[[], dict]):
+        """Add a stats source under a name (replacing any previous one)."""
+        self._sources[name] = source
+
+    def snapshot(self) -> dict:
+        """Current stats of every source."""
+        snapshot = {}
+        for name, source in list(self._sources.items()):
+            try:
+                snapshot[name] = source()
+            except Exception as e:
+                snapshot[name] = {'error': str(e)}
+        return snapshot
+
+    def report(self):
+        """Log the current snapshot."""
+        logger.info("metrics " + json.dumps(self.snapshot(), default=str, sort_keys=True))
+
+    def start(self):
+        """Start the reporter thread if it is enabled and not running."""
+        if self.interval <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            first_start = self._thread is None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+            self._thread.start()
+            if first_start:
+                atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the reporter thread and log a final snapshot."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        if thread.is_alive():
+            thread.join(timeout)
+            self.report()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+
+# Global metrics reporter instance
+metrics = MetricsReporter()
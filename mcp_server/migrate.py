@@ -0,0 +1,39 @@
+"""
+Migrate Module
+Schema changes the MCP server needs on top of the Django models.
+
+Run once per deployment, after the Django migrations:
+
+    python -m mcp_server.migrate
+"""
+import logging
+import sys
+from .database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+def migrate():
+    """
+    Apply every MCP server schema change. Each step is idempotent.
+
+    Raises:
+        Exception: If a step fails (e.g. PostgreSQL older than 12)
+    """
+    logger.info("Creating the stored protocol search document and its GIN index")
+    DatabaseManager.ensure_search_document()
+
+
+def main():
+    """Command line entry point."""
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    try:
+        migrate()
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        sys.exit(1)
+    logger.info("Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Pagination Module
+Opaque keyset cursors for list_protocols and search_protocols.
+"""
+import base64
+import json
+from typing import Optional
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast
+from .config import PAGINATION_DEFAULT_LIMIT, PAGINATION_MAX_LIMIT
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+    pass
+
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last returned item as an opaque token."""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, length: int) -> list:
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Raises:
+        InvalidCursorError: If the token is malformed or has the wrong shape
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursorError("Invalid cursor")
+    return values
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    """Apply the default page size and cap it at the maximum."""
+    if limit is None:
+        return PAGINATION_DEFAULT_LIMIT
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return PAGINATION_DEFAULT_LIMIT
+    return max(1, min(limit, PAGINATION_MAX_LIMIT))
+
+
+def after_ranked(hits: list, after: Optional[list]) -> list:
+    """
+    Hits that sort after a (score, id) cursor.
+
+    Args:
+        hits: [[protocol_id, score], ...] ordered by score desc, then id asc
+        after: [score, protocol_id] of the last item already returned
+    """
+    if after is None:
+        return hits
+
+    score, protocol_id = after
+    return [
+        hit for hit in hits
+        if hit[1] < score or (hit[1] == score and hit[0] > protocol_id)
+    ]
+
+
+def exact_rank(rank):
+    """
+    Rank expression that survives a cursor round trip.
+
+    ts_rank returns a float4, which Python reads back as a double that no
+    longer compares equal to the database value. Casting to double
+    precision in the query makes the returned value the exact one that
+    is ordered and compared on.
+    """
+    return Cast(rank, FloatField())
+
+
+def after_rank_filter(after: list) -> Q:
+    """
+    Queryset counterpart of after_ranked(): rows annotated with `rank`
+    that sort after a [rank, id] cursor under order_by('-rank', 'id').
+    """
+    rank, last_id = after
+    return Q(rank__lt=rank) | Q(rank=rank, id__gt=last_id)
@@ -0,0 +1,54 @@
+"""
+Tier Policy Module
+Precomputed subscription tier entitlements shared by database, auth and tools.
+"""
+from typing import Iterable
+from django.db.models import Q
+from .config import TIERS
+
+
+class TierPolicy:
+    """
+    Compiled tier hierarchy.
+
+    Tier levels, accessible-tier tuples and queryset filters are computed
+    once at startup, so authorization checks are constant-time lookups.
+    """
+
+    def __init__(self, tiers: Iterable[str] = TIERS):
+        self.tiers = tuple(tiers)
+        self.levels = {tier: level for level, tier in enumerate(self.tiers)}
+        self.accessible_tiers = {
+            tier: self.tiers[:level + 1]
+            for tier, level in self.levels.items()
+        }
+        self._filters = {}
+
+    def level(self, tier: str) -> int:
+        """Integer level of a tier. Unknown tiers rank as the lowest tier."""
+        return self.levels.get(tier, 0)
+
+    def _known_tier(self, tier: str) -> str:
+        """Map unknown tiers to the lowest tier."""
+        return tier if tier in self.levels else self.tiers[0]
+
+    def tiers_for(self, tier: str) -> tuple:
+        """Tiers whose content is accessible to the given tier."""
+        return self.accessible_tiers[self._known_tier(tier)]
+
+    def can_access(self, tier: str, tier_required: str) -> bool:
+        """Check if a tier satisfies a required tier."""
+        return self.level(tier) >= self.level(tier_required)
+
+    def tier_filter(self, tier: str, field: str = 'tier_required') -> Q:
+        """Queryset filter restricting `field` to tiers accessible by `tier`."""
+        key = (tier, field)
+        q = self._filters.get(key)
+        if q is None:
+            q = Q(**{f'{field}__in': self.tiers_for(tier)})
+            self._filters[key] = q
+        return q
+
+
+# Global tier policy instance
+tier_policy = TierPolicy()
@@ -1,128 +1,407 @@
 """
 Rate Limiter Module
-Implements tier-based rate limiting using Redis.
+Implements tier-based rate limiting on a pluggable backend (Redis or memory).
 """
-import redis
+import atexit
+import logging
+import math
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Tuple
-from .config import REDIS_URL, RATE_LIMITS
+from .backends import RateLimitBackend, MemoryRateLimitBackend, create_rate_limit_backend
+from .breaker import CircuitBreaker, CircuitBreakerOpen
+from .metrics import metrics
+from .config import (
+    RATE_LIMITS,
+    RATE_LIMIT_COSTS,
+    RATE_LIMIT_DEFAULT_COST,
+    RATE_LIMIT_LEASE_TTL,
+    RATE_LIMIT_RECONCILE_INTERVAL,
+    RATE_LIMIT_DEGRADED_MODE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Lease:
+    """Requests leased from the backend for one user, consumed in-process."""
+    
+    __slots__ = ('tier', 'tokens', 'expires_at', 'taken_at', 'info')
+    
+    def __init__(self, tier: str, tokens: int, taken_at: datetime, info: dict):
+        self.tier = tier
+        self.tokens = tokens
+        self.expires_at = time.monotonic() + RATE_LIMIT_LEASE_TTL
+        self.taken_at = taken_at
+        self.info = info
+    
+    def snapshot(self) -> dict:
+        """Rate limit info as of the lease, counting unused leased requests as remaining."""
+        info = dict(self.info, retry_after=0)
+        for window in ('minute', 'day'):
+            if info[f'remaining_{window}'] is not None:
+                info[f'remaining_{window}'] += self.tokens
+        return info
 
 
 class RateLimiter:
     """
     Implements rate limiting per subscription tier.
-    Uses Redis for distributed rate limiting.
+    State lives in a RateLimitBackend: Redis for distributed rate limiting,
+    or process memory with RATE_LIMIT_BACKEND=memory (see backends.py).
+    
+    Limits are in cost units: each tool call consumes its cost from
+    RATE_LIMIT_COSTS, so quota tracks backend load rather than call count.
+    
+    Both windows (per minute and per day) are checked and consumed in one
+    atomic backend call (a Lua script on Redis), so concurrent calls
+    cannot all pass the check before any of them is counted.
+    
+    Each tier picks an algorithm in RATE_LIMITS:
+        fixed_window    Counters per calendar minute and day. Simple, but a
+                        user can send twice the per-minute limit across a
+                        minute boundary.
+        gcra            Generic cell rate algorithm. One hash per user holds
+                        each window's theoretical arrival time (TAT); requests
+                        are spaced by period / limit with a burst of up to
+                        `limit`, and retry-after is exact. Windows roll
+                        (the daily limit covers any 24 hours).
+    
+    Tiers with a `lease_size` (high or unlimited limits) lease that many
+    requests from the backend at once and consume them in-process, so most
+    of their calls never touch it. Leased requests are already counted,
+    so limits are never exceeded; requests left when a lease expires are
+    returned by a background reconciler. Near the limit, where a full
+    slice no longer fits, calls fall back to strict per-call checks.
+    Tiers without `lease_size` (e.g. free) are always strict.
+    
+    If the backend fails or its circuit breaker is open, checks never
+    raise; they follow RATE_LIMIT_DEGRADED_MODE instead:
+        local   Same algorithms against in-process state (limits apply
+                per process rather than cluster-wide; no leases)
+        allow   Every call is allowed
+        deny    Every call is rejected until the backend is back
+    Info from a degraded check has 'degraded': True.
     """
     
-    def __init__(self):
-        """Initialize Redis connection."""
-        self.redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+    # GCRA windows: (field, period in seconds, RATE_LIMITS key)
+    GCRA_WINDOWS = (
+        ('minute', 60, 'per_minute'),
+        ('day', 86400, 'per_day'),
+    )
+    
+    def __init__(self, backend: RateLimitBackend = None):
+        """Initialize the storage backend (RATE_LIMIT_BACKEND unless given)."""
+        self.backend = backend or create_rate_limit_backend()
+        self.degraded_checks = 0
+        self._fallback = None
+        if self.backend.breaker is not None:
+            self.backend.breaker.add_listener(self._on_breaker_change)
+        
+        # Quota leases (tiers with lease_size)
+        self._leases = {}
+        self._refunds = []
+        self._lease_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._registered_atexit = False
+    
+    @staticmethod
+    def _gcra_key(user_id: str) -> str:
+        return f"ratelimit:gcra:{user_id}"
     
-    def check_rate_limit(self, user_id: str, tier: str) -> Tuple[bool, dict]:
+    @staticmethod
+    def _window_keys(user_id: str, now: datetime) -> Tuple[str, str]:
+        """Current minute and day counter keys."""
+        return (
+            f"ratelimit:minute:{user_id}:{now.strftime('%Y%m%d%H%M')}",
+            f"ratelimit:day:{user_id}:{now.strftime('%Y%m%d')}"
+        )
+    
+    @staticmethod
+    def _seconds_until_midnight(now: datetime) -> int:
+        return max(1, (
+            datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) - now
+        ).seconds)
+    
+    @staticmethod
+    def tool_cost(tool: str) -> int:
+        """Rate limit units a call to a tool consumes."""
+        return RATE_LIMIT_COSTS.get(tool, RATE_LIMIT_DEFAULT_COST)
+    
+    def check_rate_limit(self, user_id: str, tier: str, cost: int = 1) -> Tuple[bool, dict]:
         """
-        Check if user has exceeded rate limit.
+        Check the user's limits and, if allowed, consume `cost` units.
+        
+        Args:
+            cost: Units to consume (see tool_cost); 0 only reports the
+                current state
         
         Returns:
             (allowed: bool, info: dict)
-            info contains: remaining_minute, remaining_day, reset_minute, reset_day
+            info contains: remaining_minute, remaining_day (in units), reset_minute,
+            reset_day (seconds until the window is fully available again)
+            and retry_after (seconds until the next request is allowed, 0
+            if it is allowed now)
         """
         limits = RATE_LIMITS.get(tier, RATE_LIMITS['free'])
+        lease_size = limits.get('lease_size')
+        if lease_size and not self._degraded():
+            if cost > 0:
+                return self._check_leased(user_id, tier, limits, cost, lease_size)
+            return self._peek_leased(user_id, tier, limits)
+        return self._check_remote(user_id, tier, limits, cost)
+    
+    def _check_remote(self, user_id: str, tier: str, limits: dict, cost: int,
+                      now: datetime = None) -> Tuple[bool, dict]:
+        """Check and consume against the backend, or in degraded mode if it fails."""
+        try:
+            return self._check_with(self.backend, user_id, tier, limits, cost, now)
+        except Exception as e:
+            return self._check_degraded(user_id, tier, limits, cost, now, e)
+    
+    def _check_with(self, backend: RateLimitBackend, user_id: str, tier: str,
+                    limits: dict, cost: int, now: datetime = None) -> Tuple[bool, dict]:
+        """Check and consume against a backend with the tier's algorithm."""
+        if limits.get('algorithm', 'fixed_window') == 'gcra':
+            return self._check_gcra(backend, user_id, tier, limits, cost)
+        return self._check_fixed_window(backend, user_id, tier, limits, cost, now)
+    
+    def _check_fixed_window(self, backend: RateLimitBackend, user_id: str, tier: str,
+                            limits: dict, cost: int, now: datetime = None) -> Tuple[bool, dict]:
+        """Check and consume calendar minute/day counters (in the windows of `now`)."""
+        now = now or datetime.now()
+        minute_key, day_key = self._window_keys(user_id, now)
+        seconds_until_midnight = self._seconds_until_midnight(now)
         
-        # Check per-minute limit
-        minute_allowed = True
-        remaining_minute = None
-        reset_minute = None
+        allowed, minute_count, day_count = backend.check_fixed_window(
+            minute_key, day_key, limits['per_minute'], limits['per_day'],
+            cost, 60, seconds_until_midnight
+        )
         
+        info = {
+            'remaining_minute': None,
+            'remaining_day': None,
+            'reset_minute': None,
+            'reset_day': None,
+            'retry_after': 0,
+            'tier': tier
+        }
         if limits['per_minute'] is not None:
-            minute_key = f"ratelimit:minute:{user_id}:{datetime.now().strftime('%Y%m%d%H%M')}"
-            minute_count = self.redis_client.get(minute_key)
-            
-            if minute_count is None:
-                minute_count = 0
-                self.redis_client.setex(minute_key, 60, 0)
-            else:
-                minute_count = int(minute_count)
-            
-            remaining_minute = limits['per_minute'] - minute_count
-            minute_allowed = minute_count < limits['per_minute']
-            reset_minute = 60 - datetime.now().second
-        
-        # Check per-day limit
-        day_allowed = True
-        remaining_day = None
-        reset_day = None
-        
+            info['remaining_minute'] = max(0, limits['per_minute'] - int(minute_count))
+            info['reset_minute'] = 60 - now.second
         if limits['per_day'] is not None:
-            day_key = f"ratelimit:day:{user_id}:{datetime.now().strftime('%Y%m%d')}"
-            day_count = self.redis_client.get(day_key)
-            
-            if day_count is None:
-                day_count = 0
-                # Set expiry to end of day
-                seconds_until_midnight = (
-                    datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time()) 
-                    - datetime.now()
-                ).seconds
-                self.redis_client.setex(day_key, seconds_until_midnight, 0)
-            else:
-                day_count = int(day_count)
-            
-            remaining_day = limits['per_day'] - day_count
-            day_allowed = day_count < limits['per_day']
-            
-            # Calculate seconds until midnight
-            reset_day = (
-                datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time()) 
-                - datetime.now()
-            ).seconds
-        
-        allowed = minute_allowed and day_allowed
+            info['remaining_day'] = max(0, limits['per_day'] - int(day_count))
+            info['reset_day'] = seconds_until_midnight
         
+        if not allowed:
+            info['retry_after'] = max(
+                info[f'reset_{window}'] for window in ('minute', 'day')
+                if info[f'remaining_{window}'] is not None
+                and info[f'remaining_{window}'] < max(cost, 1)
+            )
+        
+        return bool(allowed), info
+    
+    @classmethod
+    def _gcra_windows(cls, limits: dict) -> list[tuple[str, int, int]]:
+        """(field, period, limit) for each limited window of a tier."""
+        return [
+            (field, period, limits[limit_key])
+            for field, period, limit_key in cls.GCRA_WINDOWS
+            if limits.get(limit_key) is not None
+        ]
+    
+    def _check_gcra(self, backend: RateLimitBackend, user_id: str, tier: str,
+                    limits: dict, cost: int) -> Tuple[bool, dict]:
+        """Check and consume GCRA windows."""
+        windows = self._gcra_windows(limits)
         info = {
-            'remaining_minute': remaining_minute,
-            'remaining_day': remaining_day,
-            'reset_minute': reset_minute,
-            'reset_day': reset_day,
+            'remaining_minute': None,
+            'remaining_day': None,
+            'reset_minute': None,
+            'reset_day': None,
+            'retry_after': 0,
             'tier': tier
         }
+        if not windows:
+            return True, info
+        
+        allowed, retry_after_ms, results = backend.check_gcra(
+            self._gcra_key(user_id), cost, windows
+        )
+        info['retry_after'] = math.ceil(retry_after_ms / 1000)
+        for (field, _, _), (remaining, reset_ms) in zip(windows, results):
+            info[f'remaining_{field}'] = remaining
+            info[f'reset_{field}'] = math.ceil(reset_ms / 1000)
+        
+        return bool(allowed), info
+    
+    # Degraded mode
+    
+    def _degraded(self) -> bool:
+        """True while the backend's circuit breaker rejects calls."""
+        breaker = self.backend.breaker
+        return breaker is not None and breaker.is_open
+    
+    def _check_degraded(self, user_id: str, tier: str, limits: dict, cost: int,
+                        now: datetime, error: Exception) -> Tuple[bool, dict]:
+        """Check a call while the backend is unavailable (see RATE_LIMIT_DEGRADED_MODE)."""
+        self.degraded_checks += 1
+        if not isinstance(error, CircuitBreakerOpen):
+            logger.error(
+                f"Rate limit backend failed, checking in '{RATE_LIMIT_DEGRADED_MODE}' mode: {error}"
+            )
         
+        if RATE_LIMIT_DEGRADED_MODE == 'local':
+            if self._fallback is None:
+                self._fallback = MemoryRateLimitBackend()
+            allowed, info = self._check_with(self._fallback, user_id, tier, limits, cost, now)
+        else:
+            allowed = RATE_LIMIT_DEGRADED_MODE == 'allow'
+            breaker = self.backend.breaker
+            info = {
+                'remaining_minute': None,
+                'remaining_day': None,
+                'reset_minute': None,
+                'reset_day': None,
+                'retry_after': 0 if allowed else max(1, math.ceil(breaker.retry_in() if breaker else 0)),
+                'tier': tier
+            }
+        info['degraded'] = True
         return allowed, info
     
-    def increment_usage(self, user_id: str):
-        """
-        Increment usage counters for user.
-        Call this after successful request.
-        """
-        # Increment minute counter
-        minute_key = f"ratelimit:minute:{user_id}:{datetime.now().strftime('%Y%m%d%H%M')}"
-        self.redis_client.incr(minute_key)
-        self.redis_client.expire(minute_key, 60)
-        
-        # Increment day counter
-        day_key = f"ratelimit:day:{user_id}:{datetime.now().strftime('%Y%m%d')}"
-        self.redis_client.incr(day_key)
-        
-        # Set expiry to end of day if not set
-        if self.redis_client.ttl(day_key) == -1:
-            seconds_until_midnight = (
-                datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time()) 
-                - datetime.now()
-            ).seconds
-            self.redis_client.expire(day_key, seconds_until_midnight)
+    def _on_breaker_change(self, old_state: str, state: str):
+        """Drop in-process state once the backend is back."""
+        if state == CircuitBreaker.CLOSED:
+            self._fallback = None
+    
+    def stats(self) -> dict:
+        """Backend, degraded-mode and circuit breaker metrics."""
+        breaker = self.backend.breaker
+        with self._lease_lock:
+            leases = len(self._leases)
+        return {
+            'backend': self.backend.name,
+            'degraded': self._degraded(),
+            'degraded_mode': RATE_LIMIT_DEGRADED_MODE,
+            'degraded_checks': self.degraded_checks,
+            'leases': leases,
+            'breaker': breaker.stats() if breaker is not None else None
+        }
+    
+    # Leases
+    
+    def _check_leased(self, user_id: str, tier: str, limits: dict, cost: int,
+                      lease_size: int) -> Tuple[bool, dict]:
+        """Consume from the user's lease, leasing a new slice when it runs out."""
+        with self._lease_lock:
+            lease = self._leases.get(user_id)
+            if (lease is not None and lease.tier == tier and lease.tokens >= cost
+                    and lease.expires_at > time.monotonic()):
+                lease.tokens -= cost
+                return True, lease.snapshot()
+        
+        self.start()
+        slice_size = max(lease_size, cost)
+        taken_at = datetime.now()
+        allowed, info = self._check_remote(user_id, tier, limits, slice_size, taken_at)
+        if allowed and info.get('degraded'):
+            # The backend failed just now; never lease from in-process state
+            return allowed, info
+        if not allowed:
+            # Not enough left for a full slice: check this call on its own
+            return self._check_remote(user_id, tier, limits, cost)
+        
+        new_lease = _Lease(tier, slice_size - cost, taken_at, info)
+        with self._lease_lock:
+            old_lease = self._leases.get(user_id)
+            self._leases[user_id] = new_lease
+            if old_lease is not None and old_lease.tokens:
+                self._refunds.append((user_id, old_lease))
+        return True, new_lease.snapshot()
+    
+    def _peek_leased(self, user_id: str, tier: str, limits: dict) -> Tuple[bool, dict]:
+        """Report limits for a leased tier, counting the user's unused leased requests."""
+        allowed, info = self._check_remote(user_id, tier, limits, 0)
+        with self._lease_lock:
+            lease = self._leases.get(user_id)
+            if lease is None or lease.tier != tier or lease.expires_at <= time.monotonic():
+                return allowed, info
+            tokens = lease.tokens
+        
+        for window in ('minute', 'day'):
+            if info[f'remaining_{window}'] is not None:
+                info[f'remaining_{window}'] += tokens
+        if tokens:
+            info['retry_after'] = 0
+        return allowed or tokens > 0, info
+    
+    def start(self):
+        """Start the lease reconciler if it is not running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lease_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='rate-limit-reconciler', daemon=True)
+            self._thread.start()
+            if not self._registered_atexit:
+                atexit.register(self.stop)
+                self._registered_atexit = True
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the reconciler and return every outstanding lease."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.reconcile(expire_all=True)
+    
+    def _run(self):
+        while not self._stop.wait(RATE_LIMIT_RECONCILE_INTERVAL):
+            self.reconcile()
+    
+    def reconcile(self, expire_all: bool = False):
+        """Drop expired leases and return their unused requests to the backend in one batch."""
+        now = time.monotonic()
+        with self._lease_lock:
+            for user_id, lease in list(self._leases.items()):
+                if expire_all or lease.expires_at <= now:
+                    del self._leases[user_id]
+                    if lease.tokens:
+                        self._refunds.append((user_id, lease))
+            refunds, self._refunds = self._refunds, []
+        if not refunds:
+            return
+        
+        fixed_window, gcra = [], []
+        for user_id, lease in refunds:
+            limits = RATE_LIMITS.get(lease.tier, RATE_LIMITS['free'])
+            if limits.get('algorithm', 'fixed_window') == 'gcra':
+                gcra.append((self._gcra_key(user_id), lease.tokens, self._gcra_windows(limits)))
+            else:
+                minute_key, day_key = self._window_keys(user_id, lease.taken_at)
+                fixed_window.append((minute_key, day_key, lease.tokens))
+        
+        try:
+            self.backend.refund(fixed_window, gcra)
+        except Exception as e:
+            # Unreturned requests only under-admit until their windows reset
+            log = logger.warning if isinstance(e, CircuitBreakerOpen) else logger.error
+            log(f"Failed to return {len(refunds)} rate limit leases: {e}")
     
     def get_usage(self, user_id: str) -> dict:
         """
         Get current usage for user.
         """
-        minute_key = f"ratelimit:minute:{user_id}:{datetime.now().strftime('%Y%m%d%H%M')}"
-        day_key = f"ratelimit:day:{user_id}:{datetime.now().strftime('%Y%m%d')}"
-        
-        minute_count = self.redis_client.get(minute_key)
-        day_count = self.redis_client.get(day_key)
+        minute_key, day_key = self._window_keys(user_id, datetime.now())
         
         return {
-            'minute_count': int(minute_count) if minute_count else 0,
-            'day_count': int(day_count) if day_count else 0
+            'minute_count': self.backend.get_count(minute_key),
+            'day_count': self.backend.get_count(day_key)
         }
     
     def reset_user_limits(self, user_id: str):
@@ -130,12 +409,13 @@ class RateLimiter:
         Reset all rate limits for a user.
         Use for admin override or testing.
         """
-        # Clear all rate limit keys for user
-        pattern = f"ratelimit:*:{user_id}:*"
-        keys = self.redis_client.keys(pattern)
-        if keys:
-            self.redis_client.delete(*keys)
+        # Only the current windows count; older window keys are expiring anyway
+        self.backend.delete(
+            *self._window_keys(user_id, datetime.now()),
+            self._gcra_key(user_id)
+        )
 
 
 # Global rate limiter instance
 rate_limiter = RateLimiter()
+metrics.register('rate_limiter', rate_limiter.stats)
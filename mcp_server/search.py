@@ -0,0 +1,412 @@
+"""
+Search Module
+Embedded BM25 search engine over the protocol catalog.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from typing import Optional
+from django.db import close_old_connections
+from django.utils import timezone
+from .policy import tier_policy
+from .config import SEARCH_INDEX_REFRESH_INTERVAL, SEARCH_INDEX_REBUILD_INTERVAL
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from how in into is it of on or that the
+this to with what when where which why your you
+""".split())
+
+# Longest suffix first; only stripped if at least 3 characters remain
+SUFFIXES = ('ations', 'ation', 'ings', 'ing', 'ies', 'ers', 'es', 'ed', 'er', 's')
+
+
+def stem(token: str) -> str:
+    """Light English suffix stripping (enough to match plurals and -ing/-ed forms)."""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            if suffix == 'ies':
+                return token[:-3] + 'y'
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem."""
+    if not text:
+        return []
+    return [stem(t) for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory inverted index with BM25 scoring.
+
+    Fields are weighted like the Postgres search document (title > description
+    > content) by scaling term frequencies and lengths per field. Scores are
+    accumulated with NumPy over per-term posting arrays. Tier and technology
+    filters are boolean masks, precomputed per tier and cached per technology
+    until the next change. Documents can be added and removed incrementally;
+    freed slots are reused. Each document can carry an opaque payload (the
+    protocol summary) so results need no database lookup.
+    """
+
+    FIELD_WEIGHTS = {'title': 3.0, 'description': 2.0, 'content': 1.0}
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        if np is None:
+            raise ImportError("The bm25 search backend requires numpy")
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+
+        # Slot bookkeeping
+        self._slots = {}
+        self._free_slots = []
+        self._ids = []
+        self._terms = []
+        self._payloads = []
+        self._lengths = np.zeros(0, dtype=np.float64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._levels = np.zeros(0, dtype=np.int16)
+        self._technologies = []
+        self._total_length = 0.0
+
+        # term -> {slot: weighted tf}, compiled lazily to arrays
+        self._postings = {}
+        self._compiled = {}
+
+        # Filter masks, rebuilt after changes
+        self._tier_masks = {}
+        self._technology_masks = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _allocate(self) -> int:
+        if self._free_slots:
+            return self._free_slots.pop()
+
+        slot = len(self._ids)
+        self._ids.append(None)
+        self._terms.append(())
+        self._payloads.append(None)
+        self._technologies.append(None)
+        if slot >= len(self._alive):
+            capacity = max(64, 2 * len(self._alive))
+            self._lengths = np.resize(self._lengths, capacity)
+            self._alive = np.resize(self._alive, capacity)
+            self._levels = np.resize(self._levels, capacity)
+            self._lengths[slot:] = 0
+            self._alive[slot:] = False
+            self._levels[slot:] = 0
+        return slot
+
+    def _invalidate_masks(self):
+        self._tier_masks = {}
+        self._technology_masks = {}
+
+    def upsert(self, doc: dict, payload=None):
+        """
+        Add or replace a protocol.
+
+        Args:
+            doc: {'id', 'title', 'description', 'content', 'technology_slug',
+                  'tier_required', 'technology_tier_required'}
+            payload: Value returned alongside the ID by payload()
+        """
+        weighted_tf = {}
+        length = 0.0
+        for field, weight in self.FIELD_WEIGHTS.items():
+            tokens = tokenize(doc.get(field) or '')
+            length += weight * len(tokens)
+            for token in tokens:
+                weighted_tf[token] = weighted_tf.get(token, 0.0) + weight
+
+        protocol_id = str(doc['id'])
+        with self._lock:
+            self.remove(protocol_id)
+            slot = self._allocate()
+
+            self._slots[protocol_id] = slot
+            self._ids[slot] = protocol_id
+            self._terms[slot] = tuple(weighted_tf)
+            self._payloads[slot] = payload
+            self._technologies[slot] = doc['technology_slug']
+            self._lengths[slot] = length
+            self._alive[slot] = True
+            self._levels[slot] = max(
+                tier_policy.level(doc['tier_required']),
+                tier_policy.level(doc['technology_tier_required'])
+            )
+            self._total_length += length
+
+            for term, tf in weighted_tf.items():
+                self._postings.setdefault(term, {})[slot] = tf
+                self._compiled.pop(term, None)
+            self._invalidate_masks()
+
+    def remove(self, protocol_id: str):
+        """Remove a protocol if present."""
+        with self._lock:
+            slot = self._slots.pop(str(protocol_id), None)
+            if slot is None:
+                return
+
+            for term in self._terms[slot]:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(slot, None)
+                    if not postings:
+                        del self._postings[term]
+                self._compiled.pop(term, None)
+
+            self._total_length -= self._lengths[slot]
+            self._ids[slot] = None
+            self._terms[slot] = ()
+            self._payloads[slot] = None
+            self._technologies[slot] = None
+            self._lengths[slot] = 0
+            self._alive[slot] = False
+            self._free_slots.append(slot)
+            self._invalidate_masks()
+
+    def payload(self, protocol_id: str):
+        """Payload stored with a protocol, or None."""
+        slot = self._slots.get(str(protocol_id))
+        return None if slot is None else self._payloads[slot]
+
+    def _postings_for(self, term: str) -> Optional[tuple]:
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            compiled = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+    def _mask(self, tier: Optional[str], technology_slug: Optional[str]):
+        size = len(self._ids)
+        mask = self._alive[:size]
+
+        if tier:
+            tier_mask = self._tier_masks.get(tier)
+            if tier_mask is None:
+                tier_mask = self._levels[:size] <= tier_policy.level(tier)
+                self._tier_masks[tier] = tier_mask
+            mask = mask & tier_mask
+
+        if technology_slug:
+            technology_mask = self._technology_masks.get(technology_slug)
+            if technology_mask is None:
+                technology_mask = np.fromiter(
+                    (slug == technology_slug for slug in self._technologies),
+                    dtype=bool,
+                    count=size
+                )
+                self._technology_masks[technology_slug] = technology_mask
+            mask = mask & technology_mask
+
+        return mask
+
+    def search(self, query: str, tier: str = None, technology_slug: str = None,
+               limit: int = 50) -> list[tuple[str, float]]:
+        """
+        Rank protocols for a query.
+
+        Returns:
+            [(protocol_id, score)] ordered by score desc then ID, only
+            documents matching a term; all of them if limit is None
+        """
+        terms = set(tokenize(query))
+
+        with self._lock:
+            count = len(self._slots)
+            size = len(self._ids)
+            if not terms or not count:
+                return []
+
+            average_length = self._total_length / count or 1.0
+            scores = np.zeros(size, dtype=np.float64)
+            norms = self.k1 * (1 - self.b + self.b * self._lengths[:size] / average_length)
+
+            for term in terms:
+                compiled = self._postings_for(term)
+                if compiled is None:
+                    continue
+                slots, tfs = compiled
+                idf = math.log(1 + (count - len(slots) + 0.5) / (len(slots) + 0.5))
+                scores[slots] += idf * tfs * (self.k1 + 1) / (tfs + norms[slots])
+
+            scores[~self._mask(tier, technology_slug)] = 0
+            matched = np.flatnonzero(scores > 0)
+            if not len(matched):
+                return []
+
+            if limit is not None and len(matched) > limit:
+                top = np.argpartition(-scores[matched], limit - 1)[:limit]
+                matched = matched[top]
+            order = sorted(matched.tolist(), key=lambda slot: (-scores[slot], self._ids[slot]))
+
+            return [(self._ids[slot], float(scores[slot])) for slot in order]
+
+
+class SearchEngine:
+    """
+    Keeps a BM25Index in sync with the protocol catalog.
+
+    start() builds the index from DatabaseManager (at server startup, or
+    on the first search otherwise; concurrent callers wait for a single
+    build), then a background thread applies protocols changed since the
+    last sync (by updated_at) and periodically rebuilds it in full to pick
+    up deletions and technology tier changes. Edited protocols are
+    re-indexed right away through CacheManager.invalidate_protocol.
+    """
+
+    def __init__(self, refresh_interval: float = SEARCH_INDEX_REFRESH_INTERVAL,
+                 rebuild_interval: float = SEARCH_INDEX_REBUILD_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.index = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._synced_at = None
+        self._built_at = 0.0
+        self._thread = None
+
+    @staticmethod
+    def _document(row: dict) -> dict:
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'content': row['content_markdown'],
+            'technology_slug': row['technology__slug'],
+            'tier_required': row['tier_required'],
+            'technology_tier_required': row['technology__tier_required'],
+        }
+
+    def rebuild(self):
+        """Build a fresh index from the full catalog and swap it in."""
+        with self._build_lock:
+            self._build()
+
+    def ensure_built(self):
+        """Build the index unless it exists; concurrent callers share one build."""
+        if self.index is not None:
+            return
+        with self._build_lock:
+            if self.index is None:
+                self._build()
+
+    def _build(self):
+        from .database import DatabaseManager
+
+        started = timezone.now()
+        index = BM25Index()
+        for row in DatabaseManager.get_search_corpus():
+            index.upsert(self._document(row), DatabaseManager.protocol_summary(row))
+
+        with self._lock:
+            self.index = index
+            self._synced_at = started
+            self._built_at = time.monotonic()
+        logger.info(f"Search index built with {len(index)} protocols")
+
+    def refresh(self):
+        """Apply protocols changed since the last sync."""
+        from .database import DatabaseManager
+
+        if self.index is None or time.monotonic() - self._built_at >= self.rebuild_interval:
+            self.rebuild()
+            return
+
+        started = timezone.now()
+        self.refresh_rows(DatabaseManager.get_search_corpus(updated_since=self._synced_at))
+        self._synced_at = started
+
+    def upsert_protocol(self, protocol_id: str):
+        """Re-index a single protocol right away (e.g. after an edit)."""
+        from .database import DatabaseManager
+
+        if self.index is None:
+            return
+        rows = DatabaseManager.get_search_corpus(protocol_id=protocol_id)
+        if rows:
+            self.refresh_rows(rows)
+        else:
+            self.index.remove(protocol_id)
+
+    def refresh_rows(self, rows: list[dict]):
+        """Apply corpus rows, removing protocols that are no longer searchable."""
+        from .database import DatabaseManager
+
+        for row in rows:
+            if row['is_active'] and row['published_at'] is not None and row['technology__is_active']:
+                self.index.upsert(self._document(row), DatabaseManager.protocol_summary(row))
+            else:
+                self.index.remove(str(row['id']))
+
+    def start(self):
+        """Build the index if needed and start the refresh thread."""
+        self.ensure_built()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='search-index', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the refresh thread."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                close_old_connections()
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Search index refresh failed: {e}", exc_info=True)
+
+    def search(self, query: str, tier: str = None, technology_slug: str = None,
+               limit: int = 50) -> list[tuple[dict, float]]:
+        """
+        Rank protocols, building the index on first use.
+
+        Returns:
+            [(summary, score)] best first
+        """
+        self.start()
+
+        index = self.index
+        results = []
+        for protocol_id, score in index.search(query, tier, technology_slug, limit):
+            summary = index.payload(protocol_id)
+            if summary is not None:
+                results.append((summary, score))
+        return results
+
+
+# Global search engine instance
+search_engine = SearchEngine()
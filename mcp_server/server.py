@@ -8,7 +8,8 @@ from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 from .tools import mcp_tools
-from .config import MCP_SERVER_NAME, MCP_SERVER_VERSION, MCP_LOG_LEVEL
+from .metrics import metrics
+from .config import MCP_SERVER_NAME, MCP_SERVER_VERSION, MCP_LOG_LEVEL, SEARCH_BACKEND
 
 # Configure logging
 logging.basicConfig(
@@ -55,6 +56,16 @@ async def list_tools() -> list[Tool]:
                     "technology_slug": {
                         "type": "string",
                         "description": "Technology slug (e.g., 'django', 'react')"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum protocols per page (default 50, max 100)",
+                        "minimum": 1,
+                        "maximum": 100
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor from the previous page"
                     }
                 },
                 "required": ["api_key", "technology_slug"]
@@ -121,6 +132,16 @@ async def list_tools() -> list[Tool]:
                     "technology_slug": {
                         "type": "string",
                         "description": "Optional technology filter"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum results per page (default 50, max 100)",
+                        "minimum": 1,
+                        "maximum": 100
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor from the previous page"
                     }
                 },
                 "required": ["api_key", "query"]
@@ -158,7 +179,9 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         elif name == "list_protocols":
             result = mcp_tools.list_protocols(
                 arguments.get("api_key"),
-                arguments.get("technology_slug")
+                arguments.get("technology_slug"),
+                arguments.get("limit"),
+                arguments.get("cursor")
             )
         
         elif name == "get_protocol":
@@ -179,7 +202,9 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             result = mcp_tools.search_protocols(
                 arguments.get("api_key"),
                 arguments.get("query"),
-                arguments.get("technology_slug")
+                arguments.get("technology_slug"),
+                arguments.get("limit"),
+                arguments.get("cursor")
             )
         
         elif name == "get_user_info":
@@ -209,12 +234,38 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
 
 
+def prepare_search():
+    """Check (postgres) or build (bm25) the configured search backend before serving."""
+    if SEARCH_BACKEND == 'bm25':
+        from .search import search_engine
+        try:
+            search_engine.start()
+        except Exception as e:
+            # The first search retries the build
+            logger.error(f"Failed to build search index: {e}", exc_info=True)
+    elif SEARCH_BACKEND == 'postgres':
+        from .database import DatabaseManager
+        try:
+            has_search_document = DatabaseManager.has_search_document()
+        except Exception as e:
+            # Searches check again once the database is reachable
+            logger.error(f"Failed to check the protocol search document: {e}")
+            return
+        if not has_search_document:
+            logger.warning(
+                "Protocol search document is missing; search builds vectors on the fly "
+                "until it is created. Run `python -m mcp_server.migrate` to create it."
+            )
+
+
 async def async_main():
     """
     Main async entry point for MCP server.
     Runs the server using stdio transport.
     """
     logger.info(f"Starting {MCP_SERVER_NAME} v{MCP_SERVER_VERSION}")
+    prepare_search()
+    metrics.start()
     
     async with stdio_server() as (read_stream, write_stream):
         logger.info("MCP server running on stdio")
@@ -229,7 +280,23 @@ def main():
     """
     Synchronous entry point for console script.
     """
-    asyncio.run(async_main())
+    try:
+        asyncio.run(async_main())
+    finally:
+        # Write buffered analytics and usage before exiting
+        from .analytics import analytics
+        from .usage import usage_counters
+        from .spool import access_log_shipper
+        from .rate_limiter import rate_limiter
+        from .connections import redis_connections
+        from .search import search_engine
+        search_engine.stop()
+        metrics.stop()
+        analytics.stop()
+        usage_counters.stop()
+        access_log_shipper.stop()
+        rate_limiter.stop()
+        redis_connections.close()
 
 
 if __name__ == "__main__":
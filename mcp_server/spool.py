@@ -0,0 +1,372 @@
+"""
+Spool Module
+Durable on-disk spool for AccessLog records.
+"""
+import atexit
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from django.db import (
+    DataError,
+    IntegrityError,
+    InterfaceError,
+    OperationalError,
+    close_old_connections,
+    transaction,
+)
+from .database import DatabaseManager
+from .analytics import analytics
+from .config import (
+    SPOOL_DIR,
+    SPOOL_SEGMENT_BYTES,
+    SPOOL_FSYNC_BATCH,
+    SPOOL_FSYNC_INTERVAL,
+    SPOOL_SHIP_INTERVAL,
+    SPOOL_SHIP_BATCH_SIZE,
+    SPOOL_MAX_SHIP_ATTEMPTS,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Record header: payload length and CRC32, both big-endian uint32
+HEADER = struct.Struct('>II')
+
+
+class Spool:
+    """
+    Append-only, segment-rotated record log.
+
+    Records are length-prefixed, checksummed JSON. append() only writes;
+    a background thread calls sync() when `sync_due` is set (after
+    `fsync_batch` records) or every `fsync_interval` seconds, so callers
+    never wait on fsync. Segments are rotated at `segment_bytes` and
+    named "<seq>-<pid>.seg" so several server processes can share a
+    directory. The writer holds an exclusive lock on its active segment,
+    taken before the segment appears under its final name; readers only
+    claim segments they can lock. Records that can never be shipped are
+    set aside in the "dead" subdirectory, in the same format.
+    """
+
+    SUFFIX = '.seg'
+    DEAD_LETTER_DIR = 'dead'
+
+    def __init__(self, directory=SPOOL_DIR, segment_bytes: int = SPOOL_SEGMENT_BYTES,
+                 fsync_batch: int = SPOOL_FSYNC_BATCH,
+                 fsync_interval: float = SPOOL_FSYNC_INTERVAL):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._size = 0
+        self._unsynced = 0
+        # Set when a full fsync batch is pending
+        self.sync_due = threading.Event()
+
+    # Writing
+
+    def append(self, record: dict):
+        """Append a record. Durable once the next sync() completes."""
+        data = self.encode(record)
+
+        with self._lock:
+            if self._file is None or self._size >= self.segment_bytes:
+                self._rotate_locked()
+            self._file.write(data)
+            self._size += len(data)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch:
+                self.sync_due.set()
+
+    def sync(self):
+        """Flush and fsync pending appends."""
+        with self._lock:
+            self._sync_locked()
+
+    def rotate(self):
+        """Close the active segment so it can be shipped."""
+        with self._lock:
+            if self._file is not None and self._size > 0:
+                self._rotate_locked()
+
+    def close(self):
+        """Sync and close the active segment."""
+        with self._lock:
+            self._close_locked()
+
+    def _sync_locked(self):
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self.sync_due.clear()
+
+    def _close_locked(self):
+        if self._file is None:
+            return
+        self._sync_locked()
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+        self._path = None
+        self._size = 0
+
+    def _rotate_locked(self):
+        self._close_locked()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns():020d}-{os.getpid()}"
+        path = self.directory / f"{name}{self.SUFFIX}"
+        # Lock under a temporary name first, so a shipper can never claim
+        # (and delete) the segment before we hold it
+        temp_path = self.directory / f".{name}.tmp"
+        self._file = open(temp_path, 'ab')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        os.rename(temp_path, path)
+        self._path = path
+        self._size = 0
+
+    def write_dead_letters(self, name: str, records: list[dict]) -> Path:
+        """Write records that could not be shipped to a dead-letter segment."""
+        directory = self.directory / self.DEAD_LETTER_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / name
+        with open(path, 'ab') as f:
+            for record in records:
+                f.write(self.encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+        return path
+
+    @staticmethod
+    def encode(record: dict) -> bytes:
+        """Frame a record: header, then JSON payload."""
+        payload = json.dumps(record, default=str).encode()
+        return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    # Reading
+
+    def closed_segments(self) -> list[Path]:
+        """Segments not being written by this process, oldest first."""
+        if not self.directory.exists():
+            return []
+        with self._lock:
+            active = self._path
+        return sorted(
+            path for path in self.directory.glob(f'*{self.SUFFIX}')
+            if path != active
+        )
+
+    def claim(self, path: Path):
+        """
+        Open a segment for shipping.
+        Returns a locked file object, or None if another process holds it.
+        """
+        if fcntl is None:
+            # Without locks, only ship segments written by this process
+            if not path.name.endswith(f"-{os.getpid()}{self.SUFFIX}"):
+                return None
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return None
+            # The segment may have been shipped and removed while we waited
+            if not path.exists():
+                f.close()
+                return None
+        return f
+
+    @staticmethod
+    def read_records(f) -> list[dict]:
+        """Read all records from a segment. A torn or corrupt tail is skipped."""
+        records = []
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            length, checksum = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                logger.warning(f"Skipping corrupt spool tail in {f.name}")
+                break
+            records.append(json.loads(payload))
+        return records
+
+
+class AccessLogShipper:
+    """
+    Spools AccessLog records to disk and drains them into the database.
+
+    get_protocol appends to the spool instead of writing AccessLog rows,
+    so content delivery no longer waits on (or fails with) the database.
+    One background thread fsyncs the spool in batches; another rotates
+    the active segment, bulk-creates its records and deletes it once
+    committed, so neither the request thread nor spool durability waits
+    on the database. Segments left behind by a crashed process are
+    shipped by the next one. Delivery is at-least-once: a crash between
+    commit and delete re-ships a segment.
+
+    A segment that keeps failing (e.g. a record referencing a deleted
+    protocol) does not hold up the others: after `max_attempts` failures
+    its records are inserted one by one, and the ones the database rejects
+    go to a dead-letter segment. While the database is unreachable nothing
+    is counted or set aside.
+    """
+
+    # Errors meaning the database is unavailable, not that a record is bad
+    UNAVAILABLE_ERRORS = (OperationalError, InterfaceError)
+
+    # Errors meaning a record can never be inserted
+    REJECTED_ERRORS = (IntegrityError, DataError, TypeError, ValueError)
+
+    def __init__(self, spool: Spool = None, interval: float = SPOOL_SHIP_INTERVAL,
+                 batch_size: int = SPOOL_SHIP_BATCH_SIZE,
+                 max_attempts: int = SPOOL_MAX_SHIP_ATTEMPTS):
+        self.spool = spool or Spool()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        # Segment name -> failed shipping attempts
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._sync_thread = None
+
+    def append(self, **fields):
+        """
+        Spool an AccessLog row. Takes AccessLog field values (user_id, api_key_id, ...).
+        If the spool cannot be written, the row goes through the in-memory
+        analytics pipeline instead so it is not lost.
+        """
+        self.start()
+        try:
+            self.spool.append(fields)
+        except OSError as e:
+            logger.error(f"Access log spool unavailable, writing behind in memory: {e}")
+            analytics.record_access_log(**fields)
+
+    def _running(self) -> bool:
+        return (self._thread is not None and self._thread.is_alive()
+                and self._sync_thread.is_alive())
+
+    def start(self):
+        """Start the sync and shipper threads if they are not running."""
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            first_start = self._thread is None
+            self._stop.clear()
+            if self._sync_thread is None or not self._sync_thread.is_alive():
+                self._sync_thread = threading.Thread(
+                    target=self._run_sync, name='access-log-sync', daemon=True
+                )
+                self._sync_thread.start()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='access-log-shipper', daemon=True
+                )
+                self._thread.start()
+            if first_start:
+                atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0):
+        """Stop both threads, then ship whatever can be shipped now."""
+        self._stop.set()
+        self.spool.sync_due.set()
+        for thread in (self._sync_thread, self._thread):
+            if thread is not None and thread.is_alive():
+                thread.join(timeout)
+        self.spool.close()
+        self.ship()
+
+    def _run_sync(self):
+        while not self._stop.is_set():
+            self.spool.sync_due.wait(self.spool.fsync_interval)
+            try:
+                self.spool.sync()
+            except OSError as e:
+                logger.error(f"Failed to sync access log spool: {e}")
+                self._stop.wait(self.spool.fsync_interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.spool.rotate()
+            self.ship()
+
+    def ship(self):
+        """Ship every closed segment that can be claimed."""
+        close_old_connections()
+        for path in self.spool.closed_segments():
+            f = self.spool.claim(path)
+            if f is None:
+                continue
+            try:
+                records = Spool.read_records(f)
+                if self._attempts.get(path.name, 0) >= self.max_attempts:
+                    self._salvage(path, records)
+                else:
+                    self._ship_records(records)
+                path.unlink()
+                self._attempts.pop(path.name, None)
+            except self.UNAVAILABLE_ERRORS as e:
+                # Every segment would fail the same way; retry on the next pass
+                logger.error(f"Database unavailable, spool segment {path.name} kept: {e}")
+                return
+            except Exception as e:
+                attempts = self._attempts.get(path.name, 0) + 1
+                self._attempts[path.name] = attempts
+                logger.error(
+                    f"Failed to ship spool segment {path.name} "
+                    f"(attempt {attempts}/{self.max_attempts}): {e}"
+                )
+            finally:
+                f.close()
+
+    def _ship_records(self, records: list[dict]):
+        with transaction.atomic():
+            for i in range(0, len(records), self.batch_size):
+                DatabaseManager.bulk_create_access_logs(records[i:i + self.batch_size])
+
+    def _salvage(self, path: Path, records: list[dict]):
+        """Insert records one by one, setting aside the ones the database rejects."""
+        rejected = []
+        with transaction.atomic():
+            for record in records:
+                try:
+                    with transaction.atomic():
+                        DatabaseManager.bulk_create_access_logs([record])
+                except self.REJECTED_ERRORS:
+                    rejected.append(record)
+
+        if rejected:
+            dead_path = self.spool.write_dead_letters(path.name, rejected)
+            logger.error(
+                f"Moved {len(rejected)} of {len(records)} records from spool segment "
+                f"{path.name} to {dead_path}"
+            )
+
+
+# Global access log shipper instance
+access_log_shipper = AccessLogShipper()
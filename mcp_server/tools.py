@@ -2,12 +2,19 @@
 MCP Tools Implementation
 Implements all MCP tools for protocol delivery.
 """
-from typing import Any
+from typing import Any, Optional
 from .database import DatabaseManager
 from .cache import cache
 from .auth import auth_manager, AuthenticationError, AuthorizationError, RateLimitError
 from .watermark import watermark_manager
 from .rate_limiter import rate_limiter
+from .analytics import analytics
+from .usage import usage_counters
+from .pagination import (
+    InvalidCursorError, encode_cursor, decode_cursor, clamp_limit, after_ranked
+)
+from .config import SEARCH_MAX_RESULTS, RATE_LIMITS, RATE_LIMIT_COSTS
+from .spool import access_log_shipper
 
 
 class MCPTools:
@@ -38,51 +45,29 @@ class MCPTools:
             }
         """
         try:
-            # Authenticate user
-            user, api_key_obj = auth_manager.authenticate(api_key)
-            
-            # Get user subscription
-            subscription = DatabaseManager.get_user_subscription(user)
-            tier = subscription.plan.tier if subscription else 'free'
+            # Authenticate user and resolve subscription once per call
+            context = auth_manager.build_context(api_key)
             
             # Check rate limit
-            auth_manager.check_rate_limit(user, tier)
-            
-            # Check cache first
-            cached = cache.get_technologies()
-            if cached:
-                technologies = cached
-            else:
-                # Get technologies from database
-                tech_objects = DatabaseManager.get_technologies()
-                technologies = [
-                    {
-                        'slug': tech.slug,
-                        'name': tech.name,
-                        'description': tech.description,
-                        'tier_required': tech.tier_required,
-                        'protocol_count': tech.protocol_count,
-                        'icon_url': tech.icon_url,
-                        'color': tech.color
-                    }
-                    for tech in tech_objects
-                ]
-                
-                # Cache the result
-                cache.set_technologies(technologies)
+            auth_manager.check_rate_limit(context, rate_limiter.tool_cost('list_technologies'))
             
-            # Add access info for each technology
-            for tech in technologies:
-                tech_obj = DatabaseManager.get_technology_by_slug(tech['slug'])
-                tech['has_access'] = DatabaseManager.check_user_has_access(user, tech_obj)
+            # Check cache first, loading from the database once on a miss
+            technologies = cache.load_technologies(MCPTools.load_technologies)
             
-            # Increment usage
-            rate_limiter.increment_usage(str(user.id))
+            # Add access info for all technologies in one pass
+            access = DatabaseManager.get_technology_access(
+                technologies,
+                context.tier if context.has_subscription else None
+            )
+            technologies = [
+                {**tech, 'has_access': access[tech['slug']]}
+                for tech in technologies
+            ]
             
             return {
                 'success': True,
                 'technologies': technologies,
-                'user_tier': tier
+                'user_tier': context.tier
             }
             
         except (AuthenticationError, AuthorizationError, RateLimitError) as e:
@@ -97,16 +82,20 @@ class MCPTools:
             }
     
     @staticmethod
-    def list_protocols(api_key: str, technology_slug: str) -> dict[str, Any]:
+    def list_protocols(api_key: str, technology_slug: str, limit: int = None,
+                       cursor: str = None) -> dict[str, Any]:
         """
-        List protocols for a technology.
+        List protocols for a technology, one page at a time.
         
         Args:
             api_key: User's API key
             technology_slug: Technology slug (e.g., "django")
+            limit: Page size (default 50, max 100)
+            cursor: next_cursor from the previous page
         
         Returns:
             {
+                "next_cursor": "opaque token or null",
                 "protocols": [
                     {
                         "id": "uuid",
@@ -121,15 +110,11 @@ class MCPTools:
             }
         """
         try:
-            # Authenticate user
-            user, api_key_obj = auth_manager.authenticate(api_key)
-            
-            # Get user subscription
-            subscription = DatabaseManager.get_user_subscription(user)
-            tier = subscription.plan.tier if subscription else 'free'
+            # Authenticate user and resolve subscription once per call
+            context = auth_manager.build_context(api_key)
             
             # Check rate limit
-            auth_manager.check_rate_limit(user, tier)
+            auth_manager.check_rate_limit(context, rate_limiter.tool_cost('list_protocols'))
             
             # Get technology
             technology = DatabaseManager.get_technology_by_slug(technology_slug)
@@ -140,29 +125,20 @@ class MCPTools:
                 }
             
             # Check technology access
-            auth_manager.authorize_technology_access(user, technology)
-            
-            # Get protocols
-            protocols = DatabaseManager.get_protocols(technology_slug, tier)
-            
-            protocol_list = [
-                {
-                    'id': str(protocol.id),
-                    'slug': protocol.slug,
-                    'title': protocol.title,
-                    'description': protocol.description,
-                    'tier_required': protocol.tier_required,
-                    'difficulty': protocol.difficulty,
-                    'estimated_read_time': protocol.estimated_read_time,
-                    'tags': protocol.tags,
-                    'is_featured': protocol.is_featured,
-                    'view_count': protocol.view_count
-                }
-                for protocol in protocols
-            ]
+            auth_manager.authorize_technology_access(context, technology)
+            
+            # Get one page of protocol listing rows (no content)
+            limit = clamp_limit(limit)
+            after = decode_cursor(cursor, 3) if cursor else None
+            protocol_list = DatabaseManager.get_protocols(
+                technology_slug, context.tier, limit=limit + 1, after=after
+            )
             
-            # Increment usage
-            rate_limiter.increment_usage(str(user.id))
+            next_cursor = None
+            if len(protocol_list) > limit:
+                protocol_list = protocol_list[:limit]
+                last = protocol_list[-1]
+                next_cursor = encode_cursor([last['is_featured'], last['published_at'], last['id']])
             
             return {
                 'success': True,
@@ -171,10 +147,11 @@ class MCPTools:
                     'name': technology.name
                 },
                 'protocols': protocol_list,
-                'count': len(protocol_list)
+                'count': len(protocol_list),
+                'next_cursor': next_cursor
             }
             
-        except (AuthenticationError, AuthorizationError, RateLimitError) as e:
+        except (AuthenticationError, AuthorizationError, RateLimitError, InvalidCursorError) as e:
             return {
                 'success': False,
                 'error': str(e)
@@ -185,6 +162,83 @@ class MCPTools:
                 'error': f'Internal error: {str(e)}'
             }
     
+    @staticmethod
+    def build_protocol_record(protocol) -> dict:
+        """
+        Build the cached representation of a protocol.
+        
+        Holds everything get_protocol needs to authorize, watermark, track
+        and respond without touching the database:
+            {
+                "content": "Unwatermarked markdown",
+                "metadata": {...response fields...},
+                "technology": {"id", "slug", "name", "tier_required"}
+            }
+        """
+        return {
+            'content': protocol.content_markdown,
+            'metadata': {
+                'id': str(protocol.id),
+                'slug': protocol.slug,
+                'title': protocol.title,
+                'description': protocol.description,
+                'technology': {
+                    'slug': protocol.technology.slug,
+                    'name': protocol.technology.name
+                },
+                'tier_required': protocol.tier_required,
+                'difficulty': protocol.difficulty,
+                'estimated_read_time': protocol.estimated_read_time,
+                'tags': protocol.tags,
+                'version': protocol.version,
+                'updated_at': protocol.updated_at.isoformat()
+            },
+            'technology': {
+                'id': str(protocol.technology.id),
+                'slug': protocol.technology.slug,
+                'name': protocol.technology.name,
+                'tier_required': protocol.technology.tier_required
+            }
+        }
+    
+    @staticmethod
+    def load_protocol_record(protocol_id: str = None, technology_slug: str = None,
+                             protocol_slug: str = None) -> Optional[dict]:
+        """Load a protocol record from the database by ID or slugs, or None."""
+        if protocol_id:
+            protocol = DatabaseManager.get_protocol_by_id(protocol_id)
+        else:
+            protocol = DatabaseManager.get_protocol_by_slug(technology_slug, protocol_slug)
+        return MCPTools.build_protocol_record(protocol) if protocol else None
+    
+    @staticmethod
+    def load_technologies() -> list[dict]:
+        """Load the technology list from the database."""
+        return [
+            {
+                'slug': tech.slug,
+                'name': tech.name,
+                'description': tech.description,
+                'tier_required': tech.tier_required,
+                'protocol_count': tech.protocol_count,
+                'icon_url': tech.icon_url,
+                'color': tech.color
+            }
+            for tech in DatabaseManager.get_technologies()
+        ]
+    
+    @staticmethod
+    def load_steering_rules(technology_slug: str, tier: str) -> list[dict]:
+        """Load steering rules for a technology from the database."""
+        return [
+            {
+                'content': rule.content,
+                'category': rule.category,
+                'priority': rule.priority
+            }
+            for rule in DatabaseManager.get_steering_rules(technology_slug, tier)
+        ]
+    
     @staticmethod
     def get_protocol(api_key: str, protocol_id: str = None, 
                     technology_slug: str = None, protocol_slug: str = None) -> dict[str, Any]:
@@ -208,98 +262,93 @@ class MCPTools:
             }
         """
         try:
-            # Authenticate user
-            user, api_key_obj = auth_manager.authenticate(api_key)
-            
-            # Get user subscription
-            subscription = DatabaseManager.get_user_subscription(user)
-            tier = subscription.plan.tier if subscription else 'free'
+            # Authenticate user and resolve subscription once per call
+            context = auth_manager.build_context(api_key)
             
             # Check rate limit
-            auth_manager.check_rate_limit(user, tier)
-            
-            # Get protocol
-            if protocol_id:
-                protocol = DatabaseManager.get_protocol_by_id(protocol_id)
-            elif technology_slug and protocol_slug:
-                protocol = DatabaseManager.get_protocol_by_slug(technology_slug, protocol_slug)
-            else:
+            auth_manager.check_rate_limit(context, rate_limiter.tool_cost('get_protocol'))
+            
+            if not protocol_id and not (technology_slug and protocol_slug):
                 return {
                     'success': False,
                     'error': 'Either protocol_id or (technology_slug + protocol_slug) required'
                 }
             
-            if not protocol:
+            # Resolve slugs through the cached index, loading and caching the
+            # record once if the slug is not indexed yet
+            if not protocol_id:
+                def load_by_slug():
+                    loaded = MCPTools.load_protocol_record(
+                        technology_slug=technology_slug,
+                        protocol_slug=protocol_slug
+                    )
+                    if not loaded:
+                        return None
+                    cache.set_protocol(loaded['metadata']['id'], loaded)
+                    return loaded['metadata']['id']
+                
+                protocol_id = cache.load_protocol_id(technology_slug, protocol_slug, load_by_slug)
+            
+            # Check cache first, loading the full row once on a miss
+            # (the record is cached without watermark)
+            record = cache.load_protocol(
+                protocol_id,
+                lambda: MCPTools.load_protocol_record(protocol_id=protocol_id)
+            ) if protocol_id else None
+            
+            if not record:
                 return {
                     'success': False,
                     'error': 'Protocol not found'
                 }
+            protocol_id = record['metadata']['id']
             
-            # Check protocol access
-            auth_manager.authorize_protocol_access(user, protocol)
+            metadata = record['metadata']
             
-            # Check cache first
-            cached = cache.get_protocol(str(protocol.id))
-            if cached:
-                content = cached['content']
-            else:
-                content = protocol.content_markdown
+            # Check protocol access
+            auth_manager.authorize_protocol_access(context, record)
             
             # Add watermark
             watermarked_content, watermark_id = watermark_manager.add_watermark_to_protocol(
-                content,
-                user.email,
-                api_key_obj.key_prefix,
-                str(protocol.id)
+                record['content'],
+                context.user.email,
+                context.api_key.key_prefix,
+                protocol_id
             )
             
-            # Track protocol view
-            DatabaseManager.track_protocol_view(user, protocol, api_key_obj)
+            # Track protocol view (written behind the response)
+            analytics.record_protocol_view(context.user_id, protocol_id)
             
-            # Track access log
-            DatabaseManager.track_access_log(
-                user=user,
-                api_key=api_key_obj,
+            # Count daily usage (counters in the cache backend)
+            usage_counters.record_protocol_view(
+                context.user_id,
+                protocol_id,
+                record['technology']['slug'],
+                context.api_key.ide_type
+            )
+            
+            # Track access log (spooled to disk, shipped to the database)
+            access_log_shipper.append(
+                user_id=context.user.id,
+                api_key_id=context.api_key.id,
                 content_type='protocol',
-                content_id=str(protocol.id),
-                technology_id=str(protocol.technology.id),
+                content_id=protocol_id,
+                technology_id=record['technology']['id'],
                 watermark_id=watermark_id,
                 ip_address='0.0.0.0',  # Will be set by server
-                user_agent=''
+                user_agent='',
+                ide_type=context.api_key.ide_type,
+                response_time_ms=None
             )
             
-            # Increment usage
-            rate_limiter.increment_usage(str(user.id))
-            
-            result = {
+            return {
                 'success': True,
                 'protocol': {
-                    'id': str(protocol.id),
-                    'slug': protocol.slug,
-                    'title': protocol.title,
-                    'description': protocol.description,
-                    'technology': {
-                        'slug': protocol.technology.slug,
-                        'name': protocol.technology.name
-                    },
-                    'content': watermarked_content,
-                    'tier_required': protocol.tier_required,
-                    'difficulty': protocol.difficulty,
-                    'estimated_read_time': protocol.estimated_read_time,
-                    'tags': protocol.tags,
-                    'version': protocol.version,
-                    'updated_at': protocol.updated_at.isoformat()
+                    **metadata,
+                    'content': watermarked_content
                 }
             }
             
-            # Cache the protocol (without watermark)
-            cache.set_protocol(str(protocol.id), {
-                'content': content,
-                'metadata': result['protocol']
-            })
-            
-            return result
-            
         except (AuthenticationError, AuthorizationError, RateLimitError) as e:
             return {
                 'success': False,
@@ -332,15 +381,11 @@ class MCPTools:
             }
         """
         try:
-            # Authenticate user
-            user, api_key_obj = auth_manager.authenticate(api_key)
-            
-            # Get user subscription
-            subscription = DatabaseManager.get_user_subscription(user)
-            tier = subscription.plan.tier if subscription else 'free'
+            # Authenticate user and resolve subscription once per call
+            context = auth_manager.build_context(api_key)
             
             # Check rate limit
-            auth_manager.check_rate_limit(user, tier)
+            auth_manager.check_rate_limit(context, rate_limiter.tool_cost('get_steering_rules'))
             
             # Get technology
             technology = DatabaseManager.get_technology_by_slug(technology_slug)
@@ -351,37 +396,21 @@ class MCPTools:
                 }
             
             # Check technology access
-            auth_manager.authorize_technology_access(user, technology)
-            
-            # Check cache first
-            cached = cache.get_steering_rules(technology_slug)
-            if cached:
-                rules = cached
-            else:
-                # Get steering rules from database
-                rule_objects = DatabaseManager.get_steering_rules(technology_slug, tier)
-                rules = [
-                    {
-                        'content': rule.content,
-                        'category': rule.category,
-                        'priority': rule.priority
-                    }
-                    for rule in rule_objects
-                ]
-                
-                # Cache the result
-                cache.set_steering_rules(technology_slug, rules)
+            auth_manager.authorize_technology_access(context, technology)
+            
+            # Check cache first, loading from the database once on a miss
+            rules = cache.load_steering_rules(
+                technology_slug,
+                lambda: MCPTools.load_steering_rules(technology_slug, context.tier)
+            )
             
             # Add watermark
             watermarked_rules, watermark_id = watermark_manager.add_watermark_to_steering_rules(
                 rules,
-                user.email,
-                api_key_obj.key_prefix
+                context.user.email,
+                context.api_key.key_prefix
             )
             
-            # Increment usage
-            rate_limiter.increment_usage(str(user.id))
-            
             return {
                 'success': True,
                 'technology': {
@@ -404,7 +433,8 @@ class MCPTools:
             }
     
     @staticmethod
-    def search_protocols(api_key: str, query: str, technology_slug: str = None) -> dict[str, Any]:
+    def search_protocols(api_key: str, query: str, technology_slug: str = None,
+                         limit: int = None, cursor: str = None) -> dict[str, Any]:
         """
         Search protocols across all technologies or within a specific technology.
         
@@ -412,9 +442,12 @@ class MCPTools:
             api_key: User's API key
             query: Search query
             technology_slug: Optional technology filter
+            limit: Page size (default 50, max 100)
+            cursor: next_cursor from the previous page
         
         Returns:
             {
+                "next_cursor": "opaque token or null",
                 "results": [
                     {
                         "id": "uuid",
@@ -427,48 +460,71 @@ class MCPTools:
             }
         """
         try:
-            # Authenticate user
-            user, api_key_obj = auth_manager.authenticate(api_key)
-            
-            # Get user subscription
-            subscription = DatabaseManager.get_user_subscription(user)
-            tier = subscription.plan.tier if subscription else 'free'
+            # Authenticate user and resolve subscription once per call
+            context = auth_manager.build_context(api_key)
             
             # Check rate limit
-            auth_manager.check_rate_limit(user, tier)
-            
-            # Search protocols
-            protocols = DatabaseManager.search_protocols(query, technology_slug, tier)
-            
-            results = [
-                {
-                    'id': str(protocol.id),
-                    'slug': protocol.slug,
-                    'title': protocol.title,
-                    'description': protocol.description,
-                    'technology': {
-                        'slug': protocol.technology.slug,
-                        'name': protocol.technology.name
-                    },
-                    'tier_required': protocol.tier_required,
-                    'difficulty': protocol.difficulty,
-                    'tags': protocol.tags
-                }
-                for protocol in protocols
-            ]
-            
-            # Increment usage
-            rate_limiter.increment_usage(str(user.id))
+            auth_manager.check_rate_limit(context, rate_limiter.tool_cost('search_protocols'))
+            
+            limit = clamp_limit(limit)
+            after = decode_cursor(cursor, 2) if cursor else None
+            
+            # Check cache first (ranked IDs and scores of the first SEARCH_MAX_RESULTS)
+            summaries = {}
+            hits = cache.get_search_results(query, context.tier, technology_slug)
+            if hits is None:
+                # Search protocols
+                generation = cache.get_search_generation(technology_slug)
+                ranked = DatabaseManager.search_protocols(
+                    query, technology_slug, context.tier, limit=SEARCH_MAX_RESULTS
+                )
+                
+                hits = [[summary['id'], float(rank)] for summary, rank in ranked]
+                summaries = {summary['id']: summary for summary, _ in ranked}
+                
+                # Cache the result
+                cache.set_search_results(query, context.tier, technology_slug, hits, generation)
+                cache.set_protocol_summaries(summaries)
+            
+            # Take the page from the cached ranking
+            page = after_ranked(hits, after)[:limit + 1]
+            if len(page) <= limit and len(hits) >= SEARCH_MAX_RESULTS:
+                # Past the cached ranking: continue with a keyset query
+                last = [page[-1][1], page[-1][0]] if page else after
+                ranked = DatabaseManager.search_protocols(
+                    query, technology_slug, context.tier,
+                    limit=limit + 1 - len(page), after=last
+                )
+                page += [[summary['id'], float(rank)] for summary, rank in ranked]
+                summaries.update({summary['id']: summary for summary, _ in ranked})
+            
+            next_cursor = None
+            if len(page) > limit:
+                page = page[:limit]
+                next_cursor = encode_cursor([page[-1][1], page[-1][0]])
+            
+            # Hydrate metadata from the protocol summary cache
+            missing = [protocol_id for protocol_id, _ in page if protocol_id not in summaries]
+            if missing:
+                summaries.update(cache.get_protocol_summaries(missing))
+                missing = [protocol_id for protocol_id in missing if protocol_id not in summaries]
+            if missing:
+                loaded = DatabaseManager.get_protocol_summaries(missing)
+                cache.set_protocol_summaries(loaded)
+                summaries.update(loaded)
+            
+            results = [summaries[protocol_id] for protocol_id, _ in page if protocol_id in summaries]
             
             return {
                 'success': True,
                 'query': query,
                 'technology_filter': technology_slug,
                 'results': results,
-                'count': len(results)
+                'count': len(results),
+                'next_cursor': next_cursor
             }
             
-        except (AuthenticationError, AuthorizationError, RateLimitError) as e:
+        except (AuthenticationError, AuthorizationError, RateLimitError, InvalidCursorError) as e:
             return {
                 'success': False,
                 'error': str(e)
@@ -498,19 +554,21 @@ class MCPTools:
             }
         """
         try:
-            # Authenticate user
-            user, api_key_obj = auth_manager.authenticate(api_key)
+            # Authenticate user and resolve subscription once per call
+            context = auth_manager.build_context(api_key)
             
             # Get user context
-            user_context = auth_manager.get_user_context(user)
+            user_context = auth_manager.get_user_context(context)
             
             # Get usage info
-            usage = DatabaseManager.get_user_daily_usage(user)
-            
-            # Get rate limit info
-            subscription = DatabaseManager.get_user_subscription(user)
-            tier = subscription.plan.tier if subscription else 'free'
-            _, rate_info = rate_limiter.check_rate_limit(str(user.id), tier)
+            usage = DatabaseManager.get_user_daily_usage(context.user)
+            
+            # Get rate limit info in cost units (peek, consumes nothing)
+            _, rate_info = rate_limiter.check_rate_limit(context.user_id, context.tier, cost=0)
+            limits = RATE_LIMITS.get(context.tier, RATE_LIMITS['free'])
+            rate_info['limit_minute'] = limits['per_minute']
+            rate_info['limit_day'] = limits['per_day']
+            rate_info['tool_costs'] = {**RATE_LIMIT_COSTS, 'get_user_info': 0}
             
             return {
                 'success': True,
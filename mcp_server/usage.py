@@ -0,0 +1,196 @@
+"""
+Usage Counters Module
+Per-user daily usage counters kept in the cache backend (Redis by default)
+and rolled up into DailyUsage.
+"""
+import atexit
+import logging
+import threading
+from datetime import date as Date
+from django.db import close_old_connections
+from django.utils import timezone
+from .backends import CacheBackend
+from .breaker import CircuitBreakerOpen
+from .config import USAGE_COUNTER_TTL, USAGE_ROLLUP_INTERVAL, USAGE_ROLLUP_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class UsageCounters:
+    """
+    Daily usage counters per user, technology and IDE.
+
+    Counters live in the cache backend (CACHE_BACKEND), so they are shared
+    through Redis or kept in process with the memory backend. Each tracked
+    call is one update_counters() round trip (HINCRBY/SADD), so there is no
+    row-lock contention on DailyUsage. A periodic rollup copies the day's
+    totals into DailyUsage in bulk for reporting.
+
+    Keys:
+        usage:{date}:{user_id}            hash: protocol_views, api_requests,
+                                          tech:<slug>, ide:<ide_type>
+        usage:{date}:{user_id}:protocols  set of viewed protocol IDs
+        usage:dirty                       set of "{date}|{user_id}" awaiting rollup
+    """
+
+    DIRTY_KEY = 'usage:dirty'
+
+    def __init__(self, backend: CacheBackend = None, ttl: int = USAGE_COUNTER_TTL,
+                 rollup_interval: float = USAGE_ROLLUP_INTERVAL,
+                 batch_size: int = USAGE_ROLLUP_BATCH_SIZE):
+        self._backend = backend
+        self.ttl = ttl
+        self.rollup_interval = rollup_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def backend(self) -> CacheBackend:
+        """The cache's backend unless one was given."""
+        if self._backend is None:
+            from .cache import cache
+            self._backend = cache.backend
+        return self._backend
+
+    @staticmethod
+    def _key(user_id: str, date) -> str:
+        """Counter hash key for a user and day."""
+        return f"usage:{date.isoformat()}:{user_id}"
+
+    def record_protocol_view(self, user_id: str, protocol_id: str,
+                             technology_slug: str, ide_type: str = None):
+        """
+        Count a protocol view for today in one round trip.
+        Failures are logged rather than raised so delivery never depends on them.
+        """
+        date = timezone.now().date()
+        key = self._key(user_id, date)
+        protocols_key = f"{key}:protocols"
+
+        counters = {'protocol_views': 1, 'api_requests': 1, f'tech:{technology_slug}': 1}
+        if ide_type:
+            counters[f'ide:{ide_type}'] = 1
+        try:
+            self.start()
+            self.backend.update_counters(
+                increments={key: counters},
+                members={
+                    protocols_key: [protocol_id],
+                    self.DIRTY_KEY: [f"{date.isoformat()}|{user_id}"]
+                },
+                expire={key: self.ttl, protocols_key: self.ttl}
+            )
+        except CircuitBreakerOpen:
+            # Redis is known to be down (the breaker logged it); the view is not counted
+            pass
+        except Exception as e:
+            logger.error(f"Failed to record usage for user {user_id}: {e}")
+
+    def get_daily_usage(self, user_id: str, date=None) -> dict | None:
+        """
+        Get live usage for a day from the counters.
+        Returns None if no counters exist (e.g. expired or never recorded).
+        """
+        date = date or timezone.now().date()
+        key = self._key(user_id, date)
+
+        (counters,), (unique_protocols,) = self.backend.get_counters(
+            [key], [f"{key}:protocols"]
+        )
+        if not counters:
+            return None
+        return self._to_usage(counters, unique_protocols)
+
+    @staticmethod
+    def _to_usage(counters: dict, unique_protocols: int) -> dict:
+        """Convert a counter hash into the DailyUsage dict shape."""
+        usage = {
+            'api_requests': int(counters.get('api_requests', 0)),
+            'protocol_views': int(counters.get('protocol_views', 0)),
+            'steering_rule_views': int(counters.get('steering_rule_views', 0)),
+            'unique_protocols': unique_protocols,
+            'usage_by_technology': {},
+            'usage_by_ide': {}
+        }
+        for field, value in counters.items():
+            if field.startswith('tech:'):
+                usage['usage_by_technology'][field[len('tech:'):]] = int(value)
+            elif field.startswith('ide:'):
+                usage['usage_by_ide'][field[len('ide:'):]] = int(value)
+        return usage
+
+    # Rollup
+
+    def start(self):
+        """Start the periodic rollup thread if it is not running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            first_start = self._thread is None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='usage-rollup', daemon=True)
+            self._thread.start()
+            if first_start:
+                atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the rollup thread and run a final rollup."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.rollup()
+
+    def _run(self):
+        while not self._stop.wait(self.rollup_interval):
+            self.rollup()
+
+    def rollup(self):
+        """Copy the totals of every dirty user/day into DailyUsage."""
+        from .database import DatabaseManager
+
+        while True:
+            try:
+                members = self.backend.spop(self.DIRTY_KEY, self.batch_size)
+            except CircuitBreakerOpen:
+                return
+            except Exception as e:
+                logger.error(f"Usage rollup failed to read dirty set: {e}")
+                return
+            if not members:
+                return
+
+            entries = []
+            for member in members:
+                date_str, user_id = member.split('|', 1)
+                entries.append((user_id, Date.fromisoformat(date_str)))
+            keys = [self._key(user_id, date) for user_id, date in entries]
+
+            try:
+                hashes, sizes = self.backend.get_counters(
+                    keys, [f"{key}:protocols" for key in keys]
+                )
+                totals = {}
+                for entry, counters, unique_protocols in zip(entries, hashes, sizes):
+                    if counters:
+                        totals[entry] = self._to_usage(counters, unique_protocols)
+                close_old_connections()
+                DatabaseManager.set_daily_usage_totals(totals)
+            except Exception as e:
+                logger.error(f"Usage rollup failed, will retry: {e}", exc_info=True)
+                try:
+                    self.backend.update_counters(members={self.DIRTY_KEY: members})
+                except Exception:
+                    pass
+                return
+
+            if len(members) < self.batch_size:
+                return
+
+
+# Global usage counters instance
+usage_counters = UsageCounters()
@@ -10,6 +10,12 @@ setup(
     install_requires=[
         "requests>=2.31.0",
     ],
+    extras_require={
+        'cache': [
+            "msgpack>=1.0.0",
+            "zstandard>=0.22.0",
+        ],
+    },
     entry_points={
         'console_scripts': [
             'vizpilot-mcp=vizpilot_mcp.server:main',
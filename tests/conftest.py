@@ -0,0 +1,82 @@
+"""
+Shared test fixtures.
+
+Tests run without Redis or the Django project: the backends default to
+memory, and Redis-backed tests use fakeredis (with lupa for the Lua
+scripts) when it is installed and are skipped otherwise. When Django is
+installed but the project's settings module is not importable, Django is
+configured with minimal settings and an in-memory SQLite database, so
+timezone and transaction helpers work. Set TEST_POSTGRES_NAME (and
+TEST_POSTGRES_HOST/PORT/USER/PASSWORD) to also run the tests that need
+PostgreSQL against a 'postgres' database alias.
+"""
+import importlib.util
+import os
+
+os.environ.setdefault('CACHE_BACKEND', 'memory')
+os.environ.setdefault('RATE_LIMIT_BACKEND', 'memory')
+
+try:
+    import django
+    from django.conf import settings
+except ImportError:
+    django = None
+
+
+def _has_project_settings() -> bool:
+    module = os.environ.get('DJANGO_SETTINGS_MODULE', 'vizpilot_config.settings')
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ImportError:
+        return False
+
+
+if django is not None and not settings.configured and not _has_project_settings():
+    databases = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+    if os.environ.get('TEST_POSTGRES_NAME'):
+        databases['postgres'] = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['TEST_POSTGRES_NAME'],
+            'HOST': os.environ.get('TEST_POSTGRES_HOST', ''),
+            'PORT': os.environ.get('TEST_POSTGRES_PORT', ''),
+            'USER': os.environ.get('TEST_POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('TEST_POSTGRES_PASSWORD', ''),
+        }
+    settings.configure(
+        DATABASES=databases,
+        USE_TZ=True,
+        TIME_ZONE='UTC',
+    )
+    django.setup()
+
+import pytest
+
+from mcp_server.backends import (
+    MemoryCacheBackend,
+    MemoryRateLimitBackend,
+    RedisCacheBackend,
+    RedisRateLimitBackend,
+)
+
+
+def fake_redis_client():
+    """A fakeredis client that can run Lua scripts, or skip the test."""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def rate_limit_backend(request):
+    """Each rate limit backend, so both implementations pass the same tests."""
+    if request.param == 'memory':
+        return MemoryRateLimitBackend()
+    return RedisRateLimitBackend(client=fake_redis_client())
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache_backend(request):
+    """Each cache backend, so both implementations pass the same tests."""
+    if request.param == 'memory':
+        return MemoryCacheBackend()
+    return RedisCacheBackend(client=fake_redis_client())
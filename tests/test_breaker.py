@@ -0,0 +1,208 @@
+"""
+CircuitBreaker state machine tests.
+"""
+import threading
+import types
+
+import pytest
+
+from mcp_server import breaker as breaker_module
+from mcp_server.breaker import CircuitBreaker, CircuitBreakerOpen
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker_module, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+class Overloaded(ConnectionError):
+    """Like PoolExhaustedError: a failure type subclass that is a rejection."""
+
+
+@pytest.fixture
+def breaker(clock):
+    breaker = CircuitBreaker(
+        'test', failure_threshold=3, reset_timeout=5, failure_types=(ConnectionError,),
+        rejection_types=(Overloaded,)
+    )
+    breaker.transitions = []
+    breaker.add_listener(lambda old, new: breaker.transitions.append((old, new)))
+    return breaker
+
+
+def ok():
+    return 'ok'
+
+
+def fail():
+    raise ConnectionError('down')
+
+
+def overloaded():
+    raise Overloaded('no connection available')
+
+
+def trip(breaker, failures=3):
+    for _ in range(failures):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+
+def test_passes_calls_through_while_closed(breaker):
+    assert breaker.call(ok) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert not breaker.is_open
+
+
+def test_opens_after_consecutive_failures(breaker):
+    trip(breaker, failures=2)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    trip(breaker, failures=1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open
+    assert breaker.transitions == [(CircuitBreaker.CLOSED, CircuitBreaker.OPEN)]
+
+
+def test_success_resets_failure_count(breaker):
+    trip(breaker, failures=2)
+    breaker.call(ok)
+    trip(breaker, failures=2)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_other_errors_are_not_failures(breaker):
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            breaker.call(lambda: int('x'))
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_rejections_do_not_open(breaker):
+    for _ in range(5):
+        with pytest.raises(Overloaded):
+            breaker.call(overloaded)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    stats = breaker.stats()
+    assert stats['overloaded'] == 5
+    assert stats['failures'] == 0
+
+
+def test_rejections_do_not_reset_failures(breaker):
+    trip(breaker, failures=2)
+    with pytest.raises(Overloaded):
+        breaker.call(overloaded)
+    trip(breaker, failures=1)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_rejected_probe_lets_the_next_call_probe(breaker, clock):
+    trip(breaker)
+    clock.now += 5
+
+    with pytest.raises(Overloaded):
+        breaker.call(overloaded)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.is_open
+
+    assert breaker.call(ok) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_fails_fast(breaker):
+    trip(breaker)
+    calls = []
+
+    with pytest.raises(CircuitBreakerOpen):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+    assert breaker.stats()['rejected'] == 1
+    assert breaker.retry_in() == 5
+
+
+def test_half_open_probe_success_closes(breaker, clock):
+    trip(breaker)
+    clock.now += 5
+    assert not breaker.is_open
+
+    assert breaker.call(ok) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.transitions == [
+        (CircuitBreaker.CLOSED, CircuitBreaker.OPEN),
+        (CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN),
+        (CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED),
+    ]
+
+
+def test_half_open_probe_failure_reopens(breaker, clock):
+    trip(breaker)
+    clock.now += 5
+
+    trip(breaker, failures=1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_in() == 5
+    assert breaker.stats()['opened'] == 2
+
+
+def test_half_open_allows_a_single_probe(breaker, clock):
+    trip(breaker)
+    clock.now += 5
+    probing = threading.Event()
+    release = threading.Event()
+
+    def slow_probe():
+        probing.set()
+        release.wait(5)
+        return 'ok'
+
+    thread = threading.Thread(target=breaker.call, args=(slow_probe,))
+    thread.start()
+    probing.wait(5)
+    try:
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.is_open
+        with pytest.raises(CircuitBreakerOpen):
+            breaker.call(ok)
+    finally:
+        release.set()
+        thread.join()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_listener_errors_do_not_break_calls(breaker):
+    def broken_listener(old, new):
+        raise RuntimeError('listener bug')
+
+    breaker.add_listener(broken_listener)
+    trip(breaker)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_stats(breaker, clock):
+    breaker.call(ok)
+    trip(breaker)
+    clock.now += 2
+
+    stats = breaker.stats()
+    assert stats['state'] == CircuitBreaker.OPEN
+    assert stats['calls'] == 4
+    assert stats['failures'] == 3
+    assert stats['opened'] == 1
+    assert stats['open_for'] == 2
+    assert stats['last_error'] == 'down'
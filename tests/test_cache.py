@@ -0,0 +1,236 @@
+"""
+CacheManager tests: single-flight fills, stale-while-revalidate, degraded
+(L1-only) mode and search keys.
+"""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('django')
+
+from mcp_server.backends import MemoryCacheBackend
+from mcp_server.breaker import CircuitBreaker
+from mcp_server.cache import CacheManager
+from mcp_server.config import CACHE_DEGRADED_L1_TTL
+
+
+class FlakyCacheBackend(MemoryCacheBackend):
+    """Memory backend behind a circuit breaker that can be taken down."""
+
+    name = 'flaky'
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.breaker = CircuitBreaker(
+            'flaky', failure_threshold=2, reset_timeout=60, failure_types=(ConnectionError,)
+        )
+
+    def _guard(self, fn, *args, **kwargs):
+        def call():
+            if self.down:
+                raise ConnectionError('backend down')
+            return fn(*args, **kwargs)
+        return self.breaker.call(call)
+
+    def get(self, *args):
+        return self._guard(super().get, *args)
+
+    def get_with_ttl(self, *args):
+        return self._guard(super().get_with_ttl, *args)
+
+    def get_many(self, *args):
+        return self._guard(super().get_many, *args)
+
+    def set_many(self, *args, **kwargs):
+        return self._guard(super().set_many, *args, **kwargs)
+
+    def acquire_lock(self, *args):
+        return self._guard(super().acquire_lock, *args)
+
+    def release_lock(self, *args):
+        return self._guard(super().release_lock, *args)
+
+    def delete(self, *args):
+        return self._guard(super().delete, *args)
+
+
+@pytest.fixture
+def backend():
+    return FlakyCacheBackend()
+
+
+@pytest.fixture
+def cache(backend):
+    return CacheManager(backend=backend)
+
+
+def concurrent_loads(cache, count=8):
+    """Call load_technologies from several threads with a slow loader."""
+    calls = []
+    results = []
+    start = threading.Barrier(count)
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return [{'slug': 'django'}]
+
+    def worker():
+        start.wait()
+        results.append(cache.load_technologies(loader))
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return calls, results
+
+
+class TestSingleFlight:
+
+    def test_concurrent_misses_load_once(self, cache, backend):
+        calls, results = concurrent_loads(cache)
+
+        assert len(calls) == 1
+        assert results == [[{'slug': 'django'}]] * 8
+        assert backend.exists('technologies:all')
+
+    def test_loader_errors_reach_every_waiter(self, cache):
+        errors = []
+        start = threading.Barrier(4)
+
+        def loader():
+            time.sleep(0.1)
+            raise RuntimeError('database down')
+
+        def worker():
+            start.wait()
+            try:
+                cache.load_technologies(loader)
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(errors) == 4
+
+
+def wait_for_refresh(cache, key, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while key in cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert key not in cache._refreshing
+
+
+class TestStaleWhileRevalidate:
+
+    def set_stale(self, cache, value):
+        # Less than the grace period (hard - soft TTL) left: stale
+        cache.set('technologies:all', value, ttl=5)
+
+    def test_stale_entry_is_served_and_refreshed(self, cache, backend):
+        self.set_stale(cache, [{'slug': 'django'}])
+
+        value = cache.load_technologies(lambda: [{'slug': 'flask'}])
+        assert value == [{'slug': 'django'}]
+
+        wait_for_refresh(cache, 'technologies:all')
+        assert cache.get('technologies:all') == [{'slug': 'flask'}]
+
+    def test_refresh_to_none_evicts_the_entry(self, cache, backend):
+        self.set_stale(cache, [{'slug': 'django'}])
+
+        assert cache.load_technologies(lambda: None) == [{'slug': 'django'}]
+        wait_for_refresh(cache, 'technologies:all')
+
+        assert not backend.exists('technologies:all')
+        assert 'technologies:all' not in cache.local._entries
+        assert cache.load_technologies(lambda: None) is None
+
+
+class TestDegradedMode:
+
+    def test_backend_errors_never_raise(self, cache, backend):
+        backend.down = True
+
+        assert cache.get('technologies:all') is None
+        cache.set('technologies:all', [1])
+        cache.delete('technologies:all')
+        assert cache.stats()['l2']['errors'] == 3
+
+    def test_l1_only_fill_loads_once(self, cache, backend):
+        backend.down = True
+
+        calls, results = concurrent_loads(cache)
+        assert len(calls) == 1
+        assert len(results) == 8
+
+        # Later reads are served from L1
+        assert cache.load_technologies(lambda: calls.append(1)) == [{'slug': 'django'}]
+        assert len(calls) == 1
+
+    def test_degraded_l1_entries_are_short_lived(self, cache, backend):
+        backend.down = True
+
+        cache.set('technologies:all', [1])
+        expires_at = cache.local._entries['technologies:all'][0]
+        assert expires_at - time.monotonic() <= CACHE_DEGRADED_L1_TTL
+
+    def test_breaker_opens(self, cache, backend):
+        backend.down = True
+        for _ in range(3):
+            cache.get('technologies:all')
+
+        stats = cache.stats()
+        assert stats['breaker']['state'] == CircuitBreaker.OPEN
+        assert stats['breaker']['rejected'] == 1
+
+    def test_recovery_clears_l1(self, cache, backend):
+        backend.breaker.reset_timeout = 0
+        backend.down = True
+        cache.set('technologies:all', [1])
+        cache.set('technologies:all', [1])
+        assert backend.breaker.state == CircuitBreaker.OPEN
+
+        # A backend read (not served from L1) probes and closes the breaker
+        backend.down = False
+        assert cache.get('uncached:key') is None
+        assert backend.breaker.state == CircuitBreaker.CLOSED
+        assert cache.local.stats()['entries'] == 0
+
+
+class TestSearchKeys:
+
+    @pytest.mark.parametrize('first, second', [
+        ('缓存', '认证'),
+        ('routing', 'routers'),
+        ('how to', 'how to deploy'),
+        ('C++', 'C#'),
+    ])
+    def test_queries_with_different_results_get_different_keys(self, first, second):
+        assert CacheManager._search_key(first, 'free') != CacheManager._search_key(second, 'free')
+
+    def test_case_and_whitespace_are_ignored(self):
+        assert (CacheManager._search_key('  Django   Caching ', 'free')
+                == CacheManager._search_key('django caching', 'free'))
+
+    def test_cached_per_query(self, cache):
+        cache.set_search_results('缓存', 'free', None, [['1', 0.5]], 0)
+        cache.set_search_results('认证', 'free', None, [['2', 0.4]], 0)
+        assert cache.get_search_results('缓存', 'free') == [['1', 0.5]]
+        assert cache.get_search_results('认证', 'free') == [['2', 0.4]]
+
+    @pytest.mark.parametrize('query', ['', '   ', None])
+    def test_blank_queries_are_not_cached(self, cache, monkeypatch, query):
+        writes = []
+        monkeypatch.setattr(cache, 'set', lambda *args, **kwargs: writes.append(args))
+        cache.set_search_results(query, 'free', None, [['1', 0.5]], 0)
+        assert writes == []
+        assert cache.get_search_results(query, 'free') is None
@@ -0,0 +1,149 @@
+"""
+Cache backend tests, run against both the memory and Redis backends.
+"""
+import threading
+import time
+
+
+class TestValues:
+
+    def test_set_and_get(self, cache_backend):
+        cache_backend.set_many({'a': b'1', 'b': b'2'})
+
+        assert cache_backend.get('a') == b'1'
+        assert cache_backend.get('missing') is None
+        assert cache_backend.get_many(['a', 'missing', 'b']) == [b'1', None, b'2']
+
+    def test_ttl(self, cache_backend):
+        cache_backend.set_many({'a': b'1'}, ttl=60)
+        cache_backend.set_many({'b': b'2'})
+
+        value, remaining = cache_backend.get_with_ttl('a')
+        assert value == b'1'
+        assert 59 <= remaining <= 60
+        assert cache_backend.get_with_ttl('b') == (b'2', None)
+        assert cache_backend.get_with_ttl('missing') == (None, None)
+
+    def test_expiry(self, cache_backend):
+        cache_backend.set_many({'a': b'1'}, ttl=1)
+        time.sleep(1.1)
+
+        assert cache_backend.get('a') is None
+        assert not cache_backend.exists('a')
+
+    def test_incr(self, cache_backend):
+        assert cache_backend.incr('counter') == 1
+        assert cache_backend.incr('counter') == 2
+        assert cache_backend.get('counter') == b'2'
+
+    def test_delete(self, cache_backend):
+        cache_backend.set_many({'a': b'1', 'b': b'2', 'c': b'3'})
+
+        cache_backend.delete('a', 'b')
+        assert not cache_backend.exists('a')
+        assert cache_backend.exists('c')
+
+    def test_delete_pattern(self, cache_backend):
+        cache_backend.set_many({'protocol:1': b'1', 'protocol:2': b'2', 'steering:x': b'3'})
+
+        cache_backend.delete_pattern('protocol:*')
+        assert cache_backend.get_many(['protocol:1', 'protocol:2', 'steering:x']) == [
+            None, None, b'3'
+        ]
+
+
+class TestTags:
+
+    def test_pop_tag_deletes_members(self, cache_backend):
+        cache_backend.set_many(
+            {'protocol:1': b'1', 'protocol:2': b'2', 'protocol:3': b'3'},
+            ttl=60,
+            tags={'tag:tech:django': ['protocol:1', 'protocol:2']}
+        )
+
+        assert sorted(cache_backend.pop_tag('tag:tech:django')) == ['protocol:1', 'protocol:2']
+        assert cache_backend.get_many(['protocol:1', 'protocol:2', 'protocol:3']) == [
+            None, None, b'3'
+        ]
+        assert cache_backend.pop_tag('tag:tech:django') == []
+
+    def test_tags_accumulate(self, cache_backend):
+        cache_backend.set_many({'a': b'1'}, tags={'tag:t': ['a']})
+        cache_backend.set_many({'b': b'2'}, tags={'tag:t': ['b']})
+
+        assert sorted(cache_backend.pop_tag('tag:t')) == ['a', 'b']
+
+
+class TestLocks:
+
+    def test_only_one_holder(self, cache_backend):
+        assert cache_backend.acquire_lock('lock:a', 'token-1', 5)
+        assert not cache_backend.acquire_lock('lock:a', 'token-2', 5)
+
+    def test_release_requires_token(self, cache_backend):
+        cache_backend.acquire_lock('lock:a', 'token-1', 5)
+
+        cache_backend.release_lock('lock:a', 'token-2')
+        assert not cache_backend.acquire_lock('lock:a', 'token-2', 5)
+
+        cache_backend.release_lock('lock:a', 'token-1')
+        assert cache_backend.acquire_lock('lock:a', 'token-2', 5)
+
+    def test_lock_expires(self, cache_backend):
+        cache_backend.acquire_lock('lock:a', 'token-1', 0.2)
+        time.sleep(0.3)
+
+        assert cache_backend.acquire_lock('lock:a', 'token-2', 5)
+
+
+class TestCounters:
+
+    def test_update_and_read(self, cache_backend):
+        cache_backend.update_counters(
+            increments={'usage:u1': {'views': 1, 'tech:django': 2}},
+            members={'usage:u1:protocols': ['p1', 'p2']},
+            expire={'usage:u1': 60, 'usage:u1:protocols': 60}
+        )
+        cache_backend.update_counters(
+            increments={'usage:u1': {'views': 1}},
+            members={'usage:u1:protocols': ['p1']}
+        )
+
+        hashes, sizes = cache_backend.get_counters(
+            ['usage:u1', 'usage:u2'], ['usage:u1:protocols', 'usage:u2:protocols']
+        )
+        assert hashes == [{'views': 2, 'tech:django': 2}, {}]
+        assert sizes == [2, 0]
+
+    def test_spop(self, cache_backend):
+        cache_backend.update_counters(members={'dirty': ['a', 'b', 'c']})
+
+        first = cache_backend.spop('dirty', 2)
+        rest = cache_backend.spop('dirty', 2)
+        assert len(first) == 2 and len(rest) == 1
+        assert sorted(first + rest) == ['a', 'b', 'c']
+        assert cache_backend.spop('dirty', 2) == []
+
+
+class TestPubSub:
+
+    def test_subscribers_receive_messages(self, cache_backend):
+        received = threading.Event()
+        messages = []
+
+        def handler(message):
+            messages.append(message['data'])
+            received.set()
+
+        listener = cache_backend.subscribe('invalidation', handler)
+        try:
+            # Redis subscribes from a background thread; retry until it is listening
+            deadline = time.monotonic() + 5
+            while not received.is_set() and time.monotonic() < deadline:
+                cache_backend.publish('invalidation', 'key:a')
+                received.wait(0.05)
+        finally:
+            listener.stop()
+
+        assert messages
+        assert messages[0] in ('key:a', b'key:a')
@@ -0,0 +1,140 @@
+"""
+Cache codec tests: round trips for every body format and compression,
+legacy untagged JSON, and the fallback when msgpack or zstandard is
+missing. Formats whose package is not installed are skipped.
+"""
+import json
+import logging
+
+import pytest
+
+from mcp_server import codec as codec_module
+from mcp_server.codec import Codec, CodecError
+
+VALUE = {
+    'id': '0b1c6f1e-4c89-4a0e-9d57-5f0e3b4f3b51',
+    'title': 'Caching querysets',
+    'tags': ['cache', 'orm'],
+    'view_count': 42,
+    'score': 0.125,
+    'published': True,
+    'technology': None,
+    'content': '# Caching\n\n' + 'Use select_related and cache the result. ' * 100,
+}
+
+
+def requires(body_format, compression):
+    if body_format == 'msgpack':
+        pytest.importorskip('msgpack')
+    if compression.startswith('zstd'):
+        pytest.importorskip('zstandard')
+
+
+@pytest.fixture
+def dictionary_path(tmp_path):
+    pytest.importorskip('zstandard')
+    samples = [
+        json.dumps(dict(VALUE, id=str(i), content=VALUE['content'] * (i % 3 + 1))).encode()
+        for i in range(200)
+    ]
+    path = tmp_path / 'protocols.dict'
+    path.write_bytes(Codec.train_dictionary(samples, size=4096))
+    return str(path)
+
+
+class TestRoundTrip:
+
+    @pytest.mark.parametrize('body_format', ['json', 'msgpack'])
+    @pytest.mark.parametrize('compression', ['none', 'zlib', 'zstd'])
+    def test_round_trip(self, body_format, compression):
+        requires(body_format, compression)
+        codec = Codec(body_format, compression, threshold=64)
+
+        encoded = codec.encode(VALUE)
+        assert encoded[0] == Codec.MAGIC
+        assert codec.decode(encoded) == VALUE
+        assert codec.size(encoded) >= len(VALUE['content'])
+
+    @pytest.mark.parametrize('compression', ['zlib', 'zstd'])
+    def test_small_values_are_not_compressed(self, compression):
+        requires('json', compression)
+        codec = Codec('json', compression, threshold=1024)
+        encoded = codec.encode([1, 2, 3])
+        assert encoded[2] >> 4 == Codec.COMPRESSION_NONE
+        assert codec.decode(encoded) == [1, 2, 3]
+
+    @pytest.mark.parametrize('body_format', ['json', 'msgpack'])
+    def test_zstd_dictionary(self, body_format, dictionary_path):
+        requires(body_format, 'zstd')
+        codec = Codec(body_format, 'zstd', threshold=64, dictionary_path=dictionary_path)
+
+        encoded = codec.encode(VALUE)
+        assert encoded[2] >> 4 == Codec.COMPRESSION_ZSTD_DICT
+        assert codec.decode(encoded) == VALUE
+
+        # A node without the dictionary cannot read it, and says so
+        with pytest.raises(CodecError):
+            Codec(body_format, 'zstd').decode(encoded)
+
+    def test_any_codec_reads_any_supported_encoding(self):
+        writer = Codec('json', 'zlib', threshold=64)
+        reader = Codec('json', 'none')
+        assert reader.decode(writer.encode(VALUE)) == VALUE
+
+
+class TestLegacyJSON:
+
+    @pytest.mark.parametrize('legacy', [
+        json.dumps(VALUE),
+        json.dumps(VALUE).encode(),
+        b'[1, 2, 3]',
+        b'"text"',
+        b'7',
+    ])
+    def test_untagged_json_is_decoded(self, legacy):
+        assert Codec('json', 'none').decode(legacy) == json.loads(legacy)
+
+    def test_size_of_legacy_value(self):
+        assert Codec().size(b'[1, 2, 3]') == 9
+
+
+class TestCorruptValues:
+
+    @pytest.mark.parametrize('data', [
+        b'',
+        b'{"unterminated',
+        bytes([Codec.MAGIC, Codec.VERSION]),
+        bytes([Codec.MAGIC, 99, 0, 0, 0, 0, 2]) + b'{}',
+        Codec.HEADER.pack(Codec.MAGIC, Codec.VERSION, 0x0F, 2) + b'{}',
+        Codec.HEADER.pack(Codec.MAGIC, Codec.VERSION, Codec.COMPRESSION_ZLIB << 4, 9) + b'junk',
+    ])
+    def test_raises_codec_error(self, data):
+        with pytest.raises(CodecError):
+            Codec('json', 'none').decode(data)
+
+
+class TestFallback:
+
+    def test_missing_packages_fall_back_and_log_once(self, monkeypatch, caplog):
+        monkeypatch.setattr(codec_module, 'msgpack', None)
+        monkeypatch.setattr(codec_module, 'zstandard', None)
+
+        codec = Codec('msgpack', 'zstd', threshold=64)
+        assert caplog.records == []
+
+        with caplog.at_level(logging.WARNING, logger='mcp_server.codec'):
+            encoded = codec.encode(VALUE)
+            codec.encode(VALUE)
+
+        assert [record.getMessage() for record in caplog.records] == [
+            "msgpack is not installed, encoding cache values as JSON",
+            "zstandard is not installed, compressing cache values with zlib",
+        ]
+        assert encoded[2] == (Codec.COMPRESSION_ZLIB << 4) | Codec.FORMAT_JSON
+        assert codec.decode(encoded) == VALUE
+
+    def test_no_warning_when_packages_are_installed(self, caplog):
+        requires('msgpack', 'zstd')
+        with caplog.at_level(logging.WARNING, logger='mcp_server.codec'):
+            Codec('msgpack', 'zstd').encode(VALUE)
+        assert caplog.records == []
@@ -0,0 +1,84 @@
+"""
+Shared Redis connection tests: pool exhaustion is a rejection, not an
+outage, for the circuit breaker.
+"""
+import pytest
+
+redis = pytest.importorskip('redis')
+fakeredis = pytest.importorskip('fakeredis')
+
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+from mcp_server.breaker import CircuitBreaker, CircuitBreakerOpen
+from mcp_server.connections import (
+    GuardedConnectionPool,
+    GuardedRedis,
+    PoolExhaustedError,
+    RedisConnections,
+)
+
+
+# FakeConnection was renamed in newer fakeredis releases
+FakeConnection = getattr(fakeredis, 'FakeRedisConnection', None) or fakeredis.FakeConnection
+
+
+@pytest.fixture
+def breaker():
+    return RedisConnections().breaker
+
+
+@pytest.fixture
+def client(breaker):
+    pool = GuardedConnectionPool(
+        connection_class=FakeConnection, server=fakeredis.FakeServer(),
+        max_connections=1, timeout=0.01
+    )
+    yield GuardedRedis(connection_pool=pool, breaker=breaker)
+    pool.disconnect()
+
+
+class TestPoolExhaustion:
+
+    def test_exhausted_pool_does_not_open_the_breaker(self, client, breaker):
+        held = client.connection_pool.get_connection()
+        try:
+            for _ in range(breaker.failure_threshold + 2):
+                with pytest.raises(PoolExhaustedError):
+                    client.get('key')
+                with pytest.raises(PoolExhaustedError):
+                    client.pipeline().get('key').execute()
+        finally:
+            client.connection_pool.release(held)
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        stats = breaker.stats()
+        assert stats['overloaded'] == 2 * (breaker.failure_threshold + 2)
+        assert stats['failures'] == 0
+
+        client.set('key', 'value')
+        assert client.get('key') == b'value'
+
+    def test_exhaustion_is_still_a_connection_error(self, client):
+        held = client.connection_pool.get_connection()
+        try:
+            with pytest.raises(redis.ConnectionError):
+                client.get('key')
+        finally:
+            client.connection_pool.release(held)
+
+    def test_unreachable_redis_opens_the_breaker(self, breaker):
+        pool = GuardedConnectionPool(
+            host='127.0.0.1', port=1, max_connections=1, timeout=0.01,
+            socket_connect_timeout=0.5, retry=Retry(NoBackoff(), 0)
+        )
+        client = GuardedRedis(connection_pool=pool, breaker=breaker)
+
+        for _ in range(breaker.failure_threshold):
+            with pytest.raises(redis.ConnectionError) as excinfo:
+                client.get('key')
+            assert not isinstance(excinfo.value, PoolExhaustedError)
+
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitBreakerOpen):
+            client.get('key')
@@ -0,0 +1,119 @@
+"""
+Pagination tests: cursors, and walking ranked results page by page
+without repeating or skipping a row. The keyset query tests need
+PostgreSQL (see conftest) and are skipped otherwise.
+"""
+import uuid
+
+import pytest
+
+pytest.importorskip('django')
+
+from django.db import connections, models
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+from mcp_server.pagination import (
+    InvalidCursorError,
+    after_rank_filter,
+    after_ranked,
+    decode_cursor,
+    encode_cursor,
+    exact_rank,
+)
+
+
+class TestCursor:
+
+    def test_round_trip(self):
+        values = [0.07599088549613953, '0b1c6f1e-4c89-4a0e-9d57-5f0e3b4f3b51']
+        assert decode_cursor(encode_cursor(values), 2) == values
+
+    @pytest.mark.parametrize('cursor', ['not base64!', encode_cursor({'rank': 1}),
+                                        encode_cursor([1, 2, 3])])
+    def test_invalid(self, cursor):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor, 2)
+
+
+def walk(fetch_page):
+    """Follow next cursors with limit=1, returning the IDs in order."""
+    seen = []
+    after = None
+    while True:
+        page = fetch_page(after)
+        if not page:
+            return seen
+        protocol_id, rank = page[0]
+        seen.append(protocol_id)
+        assert len(seen) <= 100, "pagination does not advance"
+        after = decode_cursor(encode_cursor([rank, protocol_id]), 2)
+
+
+class TestAfterRanked:
+
+    def test_walk_with_ties(self):
+        hits = sorted(
+            ([str(uuid.uuid4()), rank] for rank in [0.5, 0.25, 0.25, 0.25, 0.1, 1 / 3, 1 / 3]),
+            key=lambda hit: (-hit[1], hit[0])
+        )
+        seen = walk(lambda after: after_ranked(hits, after)[:1])
+        assert seen == [protocol_id for protocol_id, _ in hits]
+
+
+class SearchRow(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    title = models.TextField()
+
+    class Meta:
+        app_label = 'mcp_server_tests'
+        db_table = 'mcp_server_tests_search_row'
+
+
+@pytest.fixture
+def postgres():
+    from django.conf import settings
+    if 'postgres' not in settings.DATABASES:
+        pytest.skip('PostgreSQL not configured (set TEST_POSTGRES_NAME)')
+    pytest.importorskip('psycopg2')
+
+    connection = connections['postgres']
+    with connection.schema_editor() as editor:
+        editor.create_model(SearchRow)
+    try:
+        yield connection
+    finally:
+        with connection.schema_editor() as editor:
+            editor.delete_model(SearchRow)
+        connection.close()
+
+
+class TestRankKeyset:
+
+    TITLES = [
+        'Caching querysets', 'Caching views with caching headers', 'Caching',
+        'Per-site caching and template fragment caching', 'Testing cached views',
+        'Caching querysets', 'Caching querysets', 'Low-level caching for caching layers',
+    ]
+
+    def ranked(self):
+        query = SearchQuery('caching', config='english')
+        vector = SearchVector('title', config='english')
+        return SearchRow.objects.using('postgres').annotate(
+            rank=exact_rank(SearchRank(vector, query))
+        ).filter(rank__gt=0)
+
+    def test_walk_every_page(self, postgres):
+        SearchRow.objects.using('postgres').bulk_create(
+            [SearchRow(title=title) for title in self.TITLES]
+        )
+
+        def fetch_page(after):
+            rows = self.ranked()
+            if after is not None:
+                rows = rows.filter(after_rank_filter(after))
+            return [(str(row.id), row.rank) for row in rows.order_by('-rank', 'id')[:1]]
+
+        seen = walk(fetch_page)
+        expected = [str(row.id) for row in self.ranked().order_by('-rank', 'id')]
+        assert len(seen) == len(set(seen)) == len(self.TITLES)
+        assert seen == expected
@@ -0,0 +1,192 @@
+"""
+Rate limit backend tests, run against both the memory and Redis backends.
+"""
+import threading
+
+
+MINUTE_KEY = 'ratelimit:minute:u1:202601010000'
+DAY_KEY = 'ratelimit:day:u1:20260101'
+
+
+def check(backend, cost=1, minute_limit=5, day_limit=20):
+    return backend.check_fixed_window(
+        MINUTE_KEY, DAY_KEY, minute_limit, day_limit, cost, 60, 3600
+    )
+
+
+class TestFixedWindow:
+
+    def test_consumes_both_windows(self, rate_limit_backend):
+        assert check(rate_limit_backend) == (True, 1, 1)
+        assert check(rate_limit_backend, cost=3) == (True, 4, 4)
+        assert rate_limit_backend.get_count(MINUTE_KEY) == 4
+        assert rate_limit_backend.get_count(DAY_KEY) == 4
+
+    def test_rejects_over_limit_without_counting(self, rate_limit_backend):
+        for _ in range(5):
+            assert check(rate_limit_backend)[0]
+
+        assert check(rate_limit_backend) == (False, 5, 5)
+        assert rate_limit_backend.get_count(MINUTE_KEY) == 5
+        assert rate_limit_backend.get_count(DAY_KEY) == 5
+
+    def test_cost_must_fit_in_every_window(self, rate_limit_backend):
+        assert check(rate_limit_backend, cost=3, day_limit=4)[0]
+
+        # Fits the minute window (3 + 2 <= 5) but not the day window
+        assert check(rate_limit_backend, cost=2, day_limit=4) == (False, 3, 3)
+        assert check(rate_limit_backend, cost=1, day_limit=4) == (True, 4, 4)
+
+    def test_unlimited_windows(self, rate_limit_backend):
+        for _ in range(50):
+            assert check(rate_limit_backend, minute_limit=None, day_limit=None)[0]
+        assert rate_limit_backend.get_count(DAY_KEY) == 50
+
+    def test_zero_cost_only_peeks(self, rate_limit_backend):
+        check(rate_limit_backend, cost=2)
+
+        assert check(rate_limit_backend, cost=0) == (True, 2, 2)
+        assert rate_limit_backend.get_count(MINUTE_KEY) == 2
+
+    def test_zero_cost_reports_exhausted_window(self, rate_limit_backend):
+        check(rate_limit_backend, cost=5)
+
+        assert check(rate_limit_backend, cost=0) == (False, 5, 5)
+
+    def test_negative_cost_returns_requests(self, rate_limit_backend):
+        check(rate_limit_backend, cost=5)
+
+        check(rate_limit_backend, cost=-3)
+        assert rate_limit_backend.get_count(MINUTE_KEY) == 2
+        assert rate_limit_backend.get_count(DAY_KEY) == 2
+
+        # Never below zero
+        check(rate_limit_backend, cost=-10)
+        assert rate_limit_backend.get_count(MINUTE_KEY) == 0
+
+    def test_negative_cost_does_not_create_windows(self, rate_limit_backend):
+        check(rate_limit_backend, cost=-3)
+
+        assert rate_limit_backend.get_count(MINUTE_KEY) == 0
+        assert check(rate_limit_backend, cost=0) == (True, 0, 0)
+
+    def test_concurrent_calls_never_exceed_limit(self, rate_limit_backend):
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(10):
+                allowed = check(rate_limit_backend, minute_limit=25, day_limit=None)[0]
+                with lock:
+                    results.append(allowed)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results.count(True) == 25
+        assert rate_limit_backend.get_count(MINUTE_KEY) == 25
+
+    def test_delete(self, rate_limit_backend):
+        check(rate_limit_backend, cost=5)
+
+        rate_limit_backend.delete(MINUTE_KEY, DAY_KEY)
+        assert check(rate_limit_backend) == (True, 1, 1)
+
+
+GCRA_KEY = 'ratelimit:gcra:u1'
+# 5 per minute: one request every 12 seconds, bursts of up to 5
+MINUTE = ('minute', 60, 5)
+
+
+class TestGCRA:
+
+    def test_allows_burst_up_to_limit(self, rate_limit_backend):
+        remaining = []
+        for _ in range(5):
+            allowed, retry_after_ms, [(left, _)] = rate_limit_backend.check_gcra(
+                GCRA_KEY, 1, [MINUTE]
+            )
+            assert allowed and retry_after_ms == 0
+            remaining.append(left)
+        assert remaining == [4, 3, 2, 1, 0]
+
+    def test_rejects_with_exact_retry_after(self, rate_limit_backend):
+        for _ in range(5):
+            rate_limit_backend.check_gcra(GCRA_KEY, 1, [MINUTE])
+
+        allowed, retry_after_ms, [(remaining, reset_ms)] = rate_limit_backend.check_gcra(
+            GCRA_KEY, 1, [MINUTE]
+        )
+        assert not allowed
+        assert 11_000 <= retry_after_ms <= 12_000
+        assert remaining == 0
+        assert 59_000 <= reset_ms <= 60_000
+
+    def test_rejected_calls_are_not_counted(self, rate_limit_backend):
+        for _ in range(5):
+            rate_limit_backend.check_gcra(GCRA_KEY, 1, [MINUTE])
+        for _ in range(3):
+            rate_limit_backend.check_gcra(GCRA_KEY, 1, [MINUTE])
+
+        _, retry_after_ms, _ = rate_limit_backend.check_gcra(GCRA_KEY, 1, [MINUTE])
+        assert retry_after_ms <= 12_000
+
+    def test_cost_consumes_several_cells(self, rate_limit_backend):
+        allowed, _, [(remaining, _)] = rate_limit_backend.check_gcra(GCRA_KEY, 3, [MINUTE])
+        assert allowed and remaining == 2
+
+        allowed, retry_after_ms, _ = rate_limit_backend.check_gcra(GCRA_KEY, 3, [MINUTE])
+        assert not allowed
+        assert 11_000 <= retry_after_ms <= 12_000
+
+        allowed, _, [(remaining, _)] = rate_limit_backend.check_gcra(GCRA_KEY, 2, [MINUTE])
+        assert allowed and remaining == 0
+
+    def test_zero_cost_only_peeks(self, rate_limit_backend):
+        rate_limit_backend.check_gcra(GCRA_KEY, 2, [MINUTE])
+
+        for _ in range(3):
+            allowed, _, [(remaining, _)] = rate_limit_backend.check_gcra(GCRA_KEY, 0, [MINUTE])
+            assert allowed and remaining == 3
+
+    def test_every_window_must_allow(self, rate_limit_backend):
+        windows = [MINUTE, ('day', 86400, 3)]
+        for _ in range(3):
+            assert rate_limit_backend.check_gcra(GCRA_KEY, 1, windows)[0]
+
+        allowed, retry_after_ms, [(minute_left, _), (day_left, _)] = (
+            rate_limit_backend.check_gcra(GCRA_KEY, 1, windows)
+        )
+        assert not allowed
+        assert (minute_left, day_left) == (2, 0)
+        # The day window spaces requests 8 hours apart
+        assert 28_790_000 <= retry_after_ms <= 28_800_000
+
+    def test_negative_cost_returns_cells(self, rate_limit_backend):
+        for _ in range(5):
+            rate_limit_backend.check_gcra(GCRA_KEY, 1, [MINUTE])
+
+        rate_limit_backend.check_gcra(GCRA_KEY, -2, [MINUTE])
+        allowed, _, [(remaining, _)] = rate_limit_backend.check_gcra(GCRA_KEY, 0, [MINUTE])
+        assert allowed and remaining == 2
+
+        # Returning more than was consumed never banks extra burst
+        rate_limit_backend.check_gcra(GCRA_KEY, -50, [MINUTE])
+        _, _, [(remaining, _)] = rate_limit_backend.check_gcra(GCRA_KEY, 0, [MINUTE])
+        assert remaining == 5
+
+    def test_refund_batch(self, rate_limit_backend):
+        for _ in range(5):
+            rate_limit_backend.check_gcra(GCRA_KEY, 1, [MINUTE])
+        check(rate_limit_backend, cost=5)
+
+        rate_limit_backend.refund(
+            [(MINUTE_KEY, DAY_KEY, 4)],
+            [(GCRA_KEY, 3, [MINUTE])]
+        )
+        assert rate_limit_backend.get_count(MINUTE_KEY) == 1
+        _, _, [(remaining, _)] = rate_limit_backend.check_gcra(GCRA_KEY, 0, [MINUTE])
+        assert remaining == 3
@@ -0,0 +1,246 @@
+"""
+RateLimiter tests: quota leases, their reconciliation, degraded mode and
+per-tool costs.
+"""
+import time
+
+import pytest
+
+from mcp_server import rate_limiter as rate_limiter_module
+from mcp_server.backends import MemoryRateLimitBackend
+from mcp_server.breaker import CircuitBreaker
+from mcp_server.config import RATE_LIMITS
+from mcp_server.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def limiter(rate_limit_backend):
+    limiter = RateLimiter(backend=rate_limit_backend)
+    yield limiter
+    limiter.stop()
+
+
+@pytest.fixture
+def leased_tier(monkeypatch):
+    """Fixed-window tier leasing 5 units at a time (day window only, so no minute rollover)."""
+    monkeypatch.setitem(RATE_LIMITS, 'leased', {
+        'per_minute': None, 'per_day': 12, 'lease_size': 5
+    })
+    return 'leased'
+
+
+@pytest.fixture
+def leased_gcra_tier(monkeypatch):
+    monkeypatch.setitem(RATE_LIMITS, 'leased_gcra', {
+        'per_minute': 10, 'per_day': None, 'algorithm': 'gcra', 'lease_size': 4
+    })
+    return 'leased_gcra'
+
+
+class TestLeases:
+
+    def test_lease_is_consumed_in_process(self, limiter, leased_tier):
+        allowed, info = limiter.check_rate_limit('u1', leased_tier)
+        assert allowed
+        assert limiter.get_usage('u1')['day_count'] == 5
+        # Unused leased units still count as remaining
+        assert info['remaining_day'] == 11
+
+        for _ in range(4):
+            assert limiter.check_rate_limit('u1', leased_tier)[0]
+        assert limiter.get_usage('u1')['day_count'] == 5
+
+        assert limiter.check_rate_limit('u1', leased_tier)[0]
+        assert limiter.get_usage('u1')['day_count'] == 10
+
+    def test_reconcile_returns_unused_units(self, limiter, leased_tier):
+        for _ in range(2):
+            limiter.check_rate_limit('u1', leased_tier)
+
+        limiter.reconcile(expire_all=True)
+        assert limiter.get_usage('u1')['day_count'] == 2
+
+    def test_expired_leases_are_returned(self, limiter, leased_tier, monkeypatch):
+        monkeypatch.setattr(rate_limiter_module, 'RATE_LIMIT_LEASE_TTL', 0)
+
+        # Each call finds the previous lease expired and leases again
+        limiter.check_rate_limit('u1', leased_tier)
+        limiter.check_rate_limit('u1', leased_tier)
+        assert limiter.get_usage('u1')['day_count'] == 10
+
+        limiter.reconcile()
+        assert limiter.get_usage('u1')['day_count'] == 2
+
+    def test_near_limit_falls_back_to_strict_checks(self, limiter, leased_tier):
+        results = [limiter.check_rate_limit('u1', leased_tier)[0] for _ in range(15)]
+
+        # Two full slices, then single units until the limit
+        assert results == [True] * 12 + [False] * 3
+        assert limiter.get_usage('u1')['day_count'] == 12
+
+    def test_cost_larger_than_slice(self, limiter, leased_tier):
+        assert limiter.check_rate_limit('u1', leased_tier, cost=7)[0]
+        assert limiter.get_usage('u1')['day_count'] == 7
+
+        limiter.reconcile(expire_all=True)
+        assert limiter.get_usage('u1')['day_count'] == 7
+
+    def test_peek_counts_leased_units(self, limiter, leased_tier):
+        limiter.check_rate_limit('u1', leased_tier, cost=2)
+
+        allowed, info = limiter.check_rate_limit('u1', leased_tier, cost=0)
+        assert allowed
+        assert info['remaining_day'] == 10
+        assert limiter.get_usage('u1')['day_count'] == 5
+
+    def test_gcra_lease_and_reconcile(self, limiter, leased_gcra_tier):
+        for _ in range(3):
+            assert limiter.check_rate_limit('u1', leased_gcra_tier)[0]
+
+        limiter.reconcile(expire_all=True)
+        _, info = limiter.check_rate_limit('u1', leased_gcra_tier, cost=0)
+        assert info['remaining_minute'] == 7
+
+    def test_strict_tiers_do_not_lease(self, limiter):
+        limiter.check_rate_limit('u1', 'free')
+
+        assert limiter.stats()['leases'] == 0
+        assert limiter.get_usage('u1')['day_count'] == 1
+
+
+class FlakyRateLimitBackend(MemoryRateLimitBackend):
+    """Memory backend behind a circuit breaker that can be taken down."""
+
+    name = 'flaky'
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.breaker = CircuitBreaker(
+            'flaky', failure_threshold=2, reset_timeout=60, failure_types=(ConnectionError,)
+        )
+
+    def _guard(self, fn, *args):
+        def call():
+            if self.down:
+                raise ConnectionError('backend down')
+            return fn(*args)
+        return self.breaker.call(call)
+
+    def check_fixed_window(self, *args):
+        return self._guard(super().check_fixed_window, *args)
+
+    def check_gcra(self, *args):
+        return self._guard(super().check_gcra, *args)
+
+    def refund(self, *args):
+        return self._guard(super().refund, *args)
+
+
+@pytest.fixture
+def flaky_backend():
+    return FlakyRateLimitBackend()
+
+
+@pytest.fixture
+def flaky_limiter(flaky_backend):
+    limiter = RateLimiter(backend=flaky_backend)
+    yield limiter
+    flaky_backend.down = False
+    limiter.stop()
+
+
+class TestDegradedMode:
+
+    def test_backend_failure_never_raises(self, flaky_limiter, flaky_backend):
+        flaky_backend.down = True
+
+        allowed, info = flaky_limiter.check_rate_limit('u1', 'free')
+        assert allowed
+        assert info['degraded']
+
+    def test_breaker_opens_and_checks_fail_fast(self, flaky_limiter, flaky_backend):
+        flaky_backend.down = True
+        for _ in range(3):
+            flaky_limiter.check_rate_limit('u1', 'free')
+
+        assert flaky_backend.breaker.state == CircuitBreaker.OPEN
+        stats = flaky_limiter.stats()
+        assert stats['degraded']
+        assert stats['degraded_checks'] == 3
+        assert stats['breaker']['rejected'] == 1
+
+    def test_local_mode_enforces_limits(self, flaky_limiter, flaky_backend):
+        flaky_backend.down = True
+        limit = RATE_LIMITS['free']['per_minute']
+
+        results = [flaky_limiter.check_rate_limit('u1', 'free')[0] for _ in range(limit + 5)]
+        assert results.count(True) == limit
+
+    @pytest.mark.parametrize('mode, allowed', [('allow', True), ('deny', False)])
+    def test_allow_and_deny_modes(self, flaky_limiter, flaky_backend, monkeypatch, mode, allowed):
+        monkeypatch.setattr(rate_limiter_module, 'RATE_LIMIT_DEGRADED_MODE', mode)
+        flaky_backend.down = True
+
+        for _ in range(3):
+            result, info = flaky_limiter.check_rate_limit('u1', 'free')
+            assert result is allowed
+            assert info['degraded']
+        if not allowed:
+            assert info['retry_after'] >= 1
+
+    def test_no_leases_while_degraded(self, flaky_limiter, flaky_backend, leased_tier):
+        flaky_backend.down = True
+        for _ in range(3):
+            assert flaky_limiter.check_rate_limit('u1', leased_tier)[0]
+
+        assert flaky_limiter.stats()['leases'] == 0
+
+    def test_recovery_drops_local_state(self, flaky_limiter, flaky_backend):
+        flaky_backend.breaker.reset_timeout = 0
+        flaky_backend.down = True
+        for _ in range(3):
+            flaky_limiter.check_rate_limit('u1', 'free')
+        assert flaky_limiter._fallback is not None
+
+        flaky_backend.down = False
+        allowed, info = flaky_limiter.check_rate_limit('u1', 'free')
+        assert allowed
+        assert 'degraded' not in info
+        assert flaky_backend.breaker.state == CircuitBreaker.CLOSED
+        assert flaky_limiter._fallback is None
+
+
+# get_protocol calls each plan allowed before limits were charged by cost
+GET_PROTOCOL_CAPACITY = {
+    'free': {'per_minute': 5, 'per_day': 100},
+    'starter': {'per_minute': 20, 'per_day': 1000},
+    'pro': {'per_minute': 100, 'per_day': None},
+    'enterprise': {'per_minute': None, 'per_day': None},
+}
+
+
+class TestToolCosts:
+
+    @pytest.mark.parametrize('tier', sorted(GET_PROTOCOL_CAPACITY))
+    def test_get_protocol_capacity_is_unchanged(self, tier):
+        cost = RateLimiter.tool_cost('get_protocol')
+        for window, calls in GET_PROTOCOL_CAPACITY[tier].items():
+            limit = RATE_LIMITS[tier][window]
+            if calls is None:
+                assert limit is None
+            else:
+                assert limit == calls * cost
+
+    @pytest.mark.parametrize('tier', ['free', 'starter', 'pro'])
+    def test_get_protocol_calls_per_minute(self, limiter, tier):
+        cost = RateLimiter.tool_cost('get_protocol')
+        calls = GET_PROTOCOL_CAPACITY[tier]['per_minute']
+
+        # Retry with a new user if the calls straddled a minute boundary
+        for user_id in ('u1', 'u2'):
+            minute = time.time() // 60
+            results = [limiter.check_rate_limit(user_id, tier, cost)[0] for _ in range(calls + 1)]
+            if time.time() // 60 == minute:
+                break
+        assert results == [True] * calls + [False]
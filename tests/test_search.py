@@ -0,0 +1,198 @@
+"""
+BM25 search tests: ranking, tier and technology filters, incremental
+updates and the single-flight index build. Runs without a database.
+"""
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('django')
+
+from mcp_server.search import BM25Index, SearchEngine, stem, tokenize
+
+
+def doc(protocol_id, title, description='', content='', technology='django',
+        tier='free', technology_tier='free'):
+    return {
+        'id': protocol_id,
+        'title': title,
+        'description': description,
+        'content': content,
+        'technology_slug': technology,
+        'tier_required': tier,
+        'technology_tier_required': technology_tier,
+    }
+
+
+def ids(results):
+    return [protocol_id for protocol_id, _ in results]
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.upsert(doc('1', 'Caching querysets', content='Querysets are cached per request.'))
+    index.upsert(doc('2', 'Testing views', content='Cached headers in tests.'))
+    index.upsert(doc('3', 'Deploying workers', content='Celery workers and queues.',
+                     technology='celery', tier='pro'))
+    index.upsert(doc('4', 'Scaling caches', technology='redis', technology_tier='enterprise'))
+    return index
+
+
+class TestTokenize:
+
+    def test_stopwords_and_stems(self):
+        assert tokenize('How to cache the Queries') == ['cache', 'query']
+
+    def test_inflections_share_a_stem(self):
+        assert {stem(word) for word in ('caching', 'caches', 'cached')} == {'cach'}
+
+    def test_short_stems_are_kept(self):
+        assert stem('uses') == 'use'
+        assert stem('bed') == 'bed'
+
+
+class TestBM25Index:
+
+    def test_title_outranks_content(self, index):
+        # The short title-only document edges out the longer one
+        assert ids(index.search('caching')) == ['4', '1', '2']
+
+    def test_no_match(self, index):
+        assert index.search('kubernetes') == []
+        assert index.search('the and of') == []
+
+    def test_limit(self, index):
+        assert ids(index.search('caching', limit=1)) == ['4']
+
+    def test_tier_filter_covers_technology_tier(self, index):
+        assert ids(index.search('caching workers', tier='free')) == ['1', '2']
+        assert ids(index.search('caching workers', tier='pro')) == ['3', '1', '2']
+        assert '4' in ids(index.search('caching', tier='enterprise'))
+
+    def test_technology_filter(self, index):
+        assert ids(index.search('caching workers', technology_slug='celery')) == ['3']
+
+    def test_upsert_replaces(self, index):
+        index.upsert(doc('2', 'Testing views', content='Signals in tests.'))
+        assert ids(index.search('caching')) == ['4', '1']
+        assert len(index) == 4
+
+    def test_remove_and_reuse_slot(self, index):
+        index.remove('1')
+        assert '1' not in ids(index.search('caching'))
+        assert index.payload('1') is None
+
+        index.upsert(doc('5', 'Caching templates'), payload={'id': '5'})
+        assert ids(index.search('caching templates')) == ['5', '4', '2']
+        assert index.payload('5') == {'id': '5'}
+        assert len(index) == 4
+
+    def test_filters_follow_changes(self, index):
+        assert ids(index.search('workers', technology_slug='celery')) == ['3']
+        index.upsert(doc('3', 'Deploying workers', technology='django', tier='pro'))
+        assert index.search('workers', technology_slug='celery') == []
+        assert ids(index.search('workers', technology_slug='django', tier='pro')) == ['3']
+
+
+def corpus_row(protocol_id, title, technology='django'):
+    return {
+        'id': protocol_id,
+        'slug': f'protocol-{protocol_id}',
+        'title': title,
+        'description': '',
+        'content_markdown': '',
+        'tier_required': 'free',
+        'difficulty': 'beginner',
+        'tags': [],
+        'is_active': True,
+        'published_at': '2024-01-01',
+        'technology__slug': technology,
+        'technology__name': technology.title(),
+        'technology__tier_required': 'free',
+        'technology__is_active': True,
+    }
+
+
+class FakeDatabaseManager:
+    """Stands in for DatabaseManager's search corpus queries."""
+
+    rows = {}
+    loads = 0
+
+    @classmethod
+    def get_search_corpus(cls, updated_since=None, protocol_id=None):
+        if protocol_id is not None:
+            return [row for row in cls.rows.values() if str(row['id']) == protocol_id]
+        cls.loads += 1
+        time.sleep(0.05)
+        return list(cls.rows.values())
+
+    @staticmethod
+    def protocol_summary(row):
+        return {'id': str(row['id']), 'title': row['title']}
+
+
+@pytest.fixture
+def database(monkeypatch):
+    monkeypatch.setattr(FakeDatabaseManager, 'rows', {
+        '1': corpus_row('1', 'Caching querysets'),
+        '2': corpus_row('2', 'Testing views'),
+    })
+    monkeypatch.setattr(FakeDatabaseManager, 'loads', 0)
+    monkeypatch.setitem(
+        sys.modules, 'mcp_server.database',
+        types.SimpleNamespace(DatabaseManager=FakeDatabaseManager)
+    )
+    return FakeDatabaseManager
+
+
+@pytest.fixture
+def engine(database):
+    engine = SearchEngine(refresh_interval=60, rebuild_interval=3600)
+    yield engine
+    engine.stop()
+
+
+class TestSearchEngine:
+
+    def test_concurrent_first_searches_share_one_build(self, engine, database):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(engine.search('caching')))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert database.loads == 1
+        assert len(results) == 8
+        assert all(result[0][0] == {'id': '1', 'title': 'Caching querysets'} for result in results)
+
+    def test_upsert_protocol(self, engine, database):
+        engine.start()
+
+        database.rows['2'] = corpus_row('2', 'Caching views')
+        engine.upsert_protocol('2')
+        assert [summary['id'] for summary, _ in engine.search('caching')] == ['1', '2']
+
+        database.rows['2']['is_active'] = False
+        engine.upsert_protocol('2')
+        assert [summary['id'] for summary, _ in engine.search('caching')] == ['1']
+
+        del database.rows['1']
+        engine.upsert_protocol('1')
+        assert engine.search('caching') == []
+        assert database.loads == 1
+
+    def test_stop(self, engine):
+        engine.start()
+        thread = engine._thread
+        engine.stop()
+        assert not thread.is_alive()
@@ -0,0 +1,201 @@
+"""
+Access log spool tests: appends, rotation, replay after a crash and
+poison segments. DatabaseManager is replaced by an in-memory recorder.
+"""
+import importlib
+import sys
+import types
+
+import pytest
+
+pytest.importorskip('django')
+
+from django.db import IntegrityError, OperationalError
+
+
+class FakeDatabaseManager:
+    """Records shipped access logs; rejects ones for deleted protocols."""
+
+    def __init__(self):
+        self.rows = []
+        self.down = False
+
+    def bulk_create_access_logs(self, records):
+        if self.down:
+            raise OperationalError('connection refused')
+        if any(record.get('protocol_id') == 'deleted' for record in records):
+            raise IntegrityError('FOREIGN KEY constraint failed')
+        self.rows.extend(records)
+
+
+@pytest.fixture
+def spool_module(monkeypatch):
+    monkeypatch.setitem(
+        sys.modules, 'mcp_server.database', types.SimpleNamespace(DatabaseManager=None)
+    )
+    return importlib.import_module('mcp_server.spool')
+
+
+@pytest.fixture
+def database(spool_module, monkeypatch):
+    database = FakeDatabaseManager()
+    monkeypatch.setattr(spool_module, 'DatabaseManager', database)
+    return database
+
+
+@pytest.fixture
+def spool(spool_module, tmp_path):
+    spool = spool_module.Spool(tmp_path, segment_bytes=1024 * 1024, fsync_batch=3)
+    yield spool
+    spool.close()
+
+
+@pytest.fixture
+def shipper(spool_module, spool, database):
+    return spool_module.AccessLogShipper(spool, max_attempts=3)
+
+
+def record(i, protocol_id='p1'):
+    return {'user_id': 'u1', 'protocol_id': protocol_id, 'status_code': 200, 'seq': i}
+
+
+def read_segment(spool_module, path):
+    with open(path, 'rb') as f:
+        return spool_module.Spool.read_records(f)
+
+
+class TestSpool:
+
+    def test_append_and_read_back(self, spool_module, spool):
+        for i in range(5):
+            spool.append(record(i))
+        spool.rotate()
+
+        [path] = spool.closed_segments()
+        assert read_segment(spool_module, path) == [record(i) for i in range(5)]
+
+    def test_sync_due_after_a_batch(self, spool):
+        spool.append(record(0))
+        spool.append(record(1))
+        assert not spool.sync_due.is_set()
+
+        spool.append(record(2))
+        assert spool.sync_due.is_set()
+
+        spool.sync()
+        assert not spool.sync_due.is_set()
+
+    def test_rotation_by_size(self, spool_module, tmp_path):
+        spool = spool_module.Spool(tmp_path, segment_bytes=200)
+        for i in range(10):
+            spool.append(record(i))
+
+        closed = spool.closed_segments()
+        assert len(closed) >= 2
+        assert spool._path not in closed
+
+        spool.close()
+        shipped = [r for path in spool.closed_segments() for r in read_segment(spool_module, path)]
+        assert shipped == [record(i) for i in range(10)]
+
+    def test_active_segment_cannot_be_claimed(self, spool_module, spool, tmp_path):
+        spool.append(record(0))
+        other = spool_module.Spool(tmp_path)
+        [path] = other.closed_segments()
+        assert other.claim(path) is None
+
+    def test_no_temporary_files_left(self, spool, tmp_path):
+        spool.append(record(0))
+        spool.rotate()
+        spool.append(record(1))
+        assert not list(tmp_path.glob('*.tmp'))
+
+
+class TestShipper:
+
+    def test_ship_closed_segments(self, spool, shipper, database):
+        for i in range(4):
+            spool.append(record(i))
+        spool.rotate()
+        spool.append(record(4))
+
+        shipper.ship()
+        assert database.rows == [record(i) for i in range(4)]
+        assert spool.closed_segments() == []
+
+        spool.rotate()
+        shipper.ship()
+        assert database.rows == [record(i) for i in range(5)]
+
+    def test_replay_after_crash(self, spool_module, spool, database, tmp_path):
+        for i in range(3):
+            spool.append(record(i))
+        spool.sync()
+        path = spool._path
+
+        # The process dies mid-append: its lock goes away and the last
+        # record is torn
+        spool._file.write(spool_module.Spool.encode(record(3))[:-4])
+        spool._file.close()
+        spool._file = None
+        spool._path = None
+
+        restarted = spool_module.Spool(tmp_path)
+        assert restarted.closed_segments() == [path]
+
+        spool_module.AccessLogShipper(restarted).ship()
+        assert database.rows == [record(i) for i in range(3)]
+        assert not path.exists()
+
+    def test_database_outage_keeps_segments(self, spool, shipper, database):
+        spool.append(record(0))
+        spool.rotate()
+        database.down = True
+
+        for _ in range(shipper.max_attempts + 1):
+            shipper.ship()
+        assert len(spool.closed_segments()) == 1
+        assert shipper._attempts == {}
+
+        database.down = False
+        shipper.ship()
+        assert database.rows == [record(0)]
+        assert spool.closed_segments() == []
+
+    def test_poison_segment_does_not_block_others(self, spool_module, spool, shipper,
+                                                   database, tmp_path):
+        spool.append(record(0))
+        spool.append(record(1, protocol_id='deleted'))
+        spool.append(record(2))
+        spool.rotate()
+        [poison] = spool.closed_segments()
+        spool.append(record(3))
+        spool.rotate()
+
+        shipper.ship()
+        assert database.rows == [record(3)]
+        assert spool.closed_segments() == [poison]
+
+        for _ in range(shipper.max_attempts - 1):
+            shipper.ship()
+        assert spool.closed_segments() == [poison]
+
+        # Out of attempts: good records are inserted one by one, the bad
+        # one is set aside
+        shipper.ship()
+        assert database.rows == [record(3), record(0), record(2)]
+        assert spool.closed_segments() == []
+        assert shipper._attempts == {}
+
+        dead = tmp_path / spool_module.Spool.DEAD_LETTER_DIR / poison.name
+        assert read_segment(spool_module, dead) == [record(1, protocol_id='deleted')]
+
+    def test_salvage_keeps_segment_if_database_goes_down(self, spool, shipper, database):
+        spool.append(record(0, protocol_id='deleted'))
+        spool.rotate()
+        for _ in range(shipper.max_attempts):
+            shipper.ship()
+
+        database.down = True
+        shipper.ship()
+        assert len(spool.closed_segments()) == 1